@@ -0,0 +1,155 @@
+"""
+Benchmarks of the result parsers on a synthetic job_results tree.
+
+Every parser runs over all files of its category in this process (best of
+REPEATS), and reports files/s and MB/s. parse_model runs over all model names
+with an empty cache. merge_results runs end to end twice, with empty manifests
+(cold) and with the manifests of the first run (warm). Each run is appended as
+one JSON line to the history file and compared with the previous line, so a
+slowdown shows up as a ratio below 1.
+
+    python benchmark_parsers.py [--test] [--root /tmp/synthetic_job_results] [--history benchmarks.jsonl]
+
+The tree is generated with synthetic_results.py unless root already holds one.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import create_runtime_csv
+import merge_all_data
+from model_parser import parse_model, parse_stem
+from synthetic_results import SWEEP, TEST_SWEEP, generate
+
+REPEATS = 3
+
+
+def best_time(function, repeats=REPEATS):
+    """Shortest wall time [s] of repeats calls."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def parser_cases(root):
+    """(name, parser, files the parser is called with, files it reads)"""
+    model_dirs = f"{root}/Meta-Llama-*"
+    performance = sorted({str(Path(f).with_suffix("")) for f in glob.glob(f"{model_dirs}/model_performance/*")})
+    return [
+        ("parse_file_quantization", merge_all_data.parse_file_quantization,
+         sorted(glob.glob(f"{model_dirs}/quantization/*.out")), None),
+        ("parse_file_tf_difference", merge_all_data.parse_file_tf_difference,
+         sorted(glob.glob(f"{model_dirs}/tensor_comparison/*.out")), None),
+        ("parse_file_model_performance", merge_all_data.parse_file_model_performance,
+         performance, merge_all_data.model_performance_sources),
+        ("parse_info", create_runtime_csv.parse_file_model_performance,
+         sorted(glob.glob(f"{model_dirs}/runtime_performance/*.out")), None),
+    ]
+
+
+def benchmark_parsers(root) -> dict:
+    results = {}
+    for name, parser, files, sources in parser_cases(root):
+        read = [path for f in files for path in (sources(f) if sources else [f])]
+        megabytes = sum(os.path.getsize(path) for path in read) / 1e6
+        seconds = best_time(lambda: [parser(f) for f in files])
+        results[name] = {"files": len(files), "mb": megabytes, "seconds": seconds,
+                         "files_per_s": len(files) / seconds, "mb_per_s": megabytes / seconds}
+
+    names = [Path(f).stem for f in glob.glob(f"{root}/Meta-Llama-*/*/*")]
+
+    def parse_names():
+        parse_stem.cache_clear()
+        for stem in names:
+            try:
+                parse_model(stem + ".out")
+            except ValueError:
+                # Runtime results carry _n<N>_i<i>, parse_file_model_performance strips it
+                parse_model("_".join(stem.split("_")[:-2]) + ".out")
+
+    seconds = best_time(parse_names)
+    results["parse_model"] = {"files": len(names), "mb": 0.0, "seconds": seconds,
+                              "files_per_s": len(names) / seconds, "mb_per_s": 0.0}
+    return results
+
+
+def benchmark_merge(root) -> dict:
+    """End-to-end merge_results in a scratch directory, with cold and warm manifests."""
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="benchmark_merge_")
+    try:
+        os.chdir(scratch)
+        model_dirs = f"{os.path.abspath(root)}/Meta-Llama-*"
+        start = time.perf_counter()
+        merge_all_data.merge_results(model_dirs)
+        cold = time.perf_counter() - start
+        warm = best_time(lambda: merge_all_data.merge_results(model_dirs), repeats=1)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {"cold_s": cold, "warm_s": warm}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_run(history, sweep_name):
+    try:
+        with open(history) as f:
+            runs = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+    runs = [run for run in runs if run.get("sweep") == sweep_name]
+    return runs[-1] if runs else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the result parsers on synthetic job_results.")
+    parser.add_argument("--test", action="store_true", help="the small tree of the test sweep")
+    parser.add_argument("--root", default=None, help="tree to benchmark on, generated if missing")
+    parser.add_argument("--history", default="benchmarks.jsonl")
+    args = parser.parse_args()
+
+    sweep_name = "test" if args.test else "full"
+    root = args.root or os.path.join(tempfile.gettempdir(), f"synthetic_job_results_{sweep_name}")
+    if not glob.glob(f"{root}/Meta-Llama-*"):
+        print(f"Generating {sweep_name} sweep in {root}")
+        generate(root, TEST_SWEEP if args.test else SWEEP)
+
+    run = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "sweep": sweep_name,
+        "parsers": benchmark_parsers(root),
+        "merge": benchmark_merge(root),
+    }
+    previous = previous_run(args.history, sweep_name)
+    with open(args.history, "a") as f:
+        f.write(json.dumps(run) + "\n")
+
+    print(f"{'parser':30s} {'files':>6s} {'MB':>8s} {'files/s':>10s} {'MB/s':>8s} {'vs. last':>8s}")
+    for name, result in run["parsers"].items():
+        ratio = ""
+        if previous and name in previous["parsers"]:
+            ratio = f"{result['files_per_s'] / previous['parsers'][name]['files_per_s']:.2f}x"
+        print(f"{name:30s} {result['files']:6d} {result['mb']:8.1f} {result['files_per_s']:10.1f} "
+              f"{result['mb_per_s']:8.1f} {ratio:>8s}")
+    merge = run["merge"]
+    print(f"merge_results: {merge['cold_s']:.2f} s cold, {merge['warm_s']:.2f} s warm")
+    if previous:
+        print(f"previous run ({previous['revision']}): {previous['merge']['cold_s']:.2f} s cold, "
+              f"{previous['merge']['warm_s']:.2f} s warm")
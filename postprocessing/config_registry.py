@@ -0,0 +1,107 @@
+"""
+Canonical integer IDs of the configurations.
+
+A configuration is one set of weights: the model (llama_version, num_parameter),
+quant_type, ZFP dim and thresholds and the importance matrix, i.e. CONFIG_COLUMNS.
+Results on the F16 conversion of the weights (processing_type "F16") belong to the
+same configuration, and so do names written with "_NOI" or "+NOI". Every result table
+carries config_id, so tables are joined with integer merges instead of on
+model_name strings, the runtimes included:
+
+    configs = ConfigRegistry()
+    df["config_id"] = configs.assign(df)
+    configs.save()
+
+The registry is kept as the "configs" table of the result store and looked up
+through a dict keyed by the normalized configuration. IDs are never renumbered,
+new configurations get the next free ID. Only one process should add
+configurations at a time.
+
+    python config_registry.py     # writes the runtime_quality table, runtimes with bpw, size, ppl and hellaswag
+"""
+import pandas as pd
+
+from model_parser import CONFIG_COLUMNS
+from result_store import STORE_DIR, load_table, table_path, write_table
+
+REGISTRY_TABLE = "configs"
+
+# Thresholds are parsed from strings like "4.00", rounding makes 4.0 and 4.00000001 the same key
+THRESHOLD_DIGITS = 6
+
+
+def _missing(value):
+    return value is None or value is pd.NA or (isinstance(value, float) and value != value)
+
+
+def config_key(llama_version, num_parameter, quant_type, dim, threshold_low, threshold_high, imat) -> tuple:
+    """Normalized, hashable key of a configuration, in the order of CONFIG_COLUMNS."""
+    return (
+        str(llama_version),
+        str(num_parameter),
+        str(quant_type),
+        None if _missing(dim) else int(dim),
+        None if _missing(threshold_low) else round(float(threshold_low), THRESHOLD_DIGITS),
+        None if _missing(threshold_high) else round(float(threshold_high), THRESHOLD_DIGITS),
+        False if _missing(imat) else bool(imat),
+    )
+
+
+class ConfigRegistry:
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        self.index = {}
+        self.added = False
+        if table_path(REGISTRY_TABLE, store_dir).exists():
+            configs = load_table(REGISTRY_TABLE, columns=["config_id"] + CONFIG_COLUMNS, store_dir=store_dir)
+            for row in configs.astype(object).itertuples(index=False, name=None):
+                self.index[config_key(*row[1:])] = int(row[0])
+        self.next_id = max(self.index.values(), default=-1) + 1
+
+    def __len__(self):
+        return len(self.index)
+
+    def id_of(self, key: tuple) -> int:
+        """ID of the configuration key (see config_key), a new one if it is not registered yet."""
+        config_id = self.index.get(key)
+        if config_id is None:
+            config_id = self.index[key] = self.next_id
+            self.next_id += 1
+            self.added = True
+        return config_id
+
+    def assign(self, df) -> pd.Series:
+        """config_id of every row of df, which needs the CONFIG_COLUMNS."""
+        if df.empty:
+            return pd.Series(index=df.index, dtype="Int64")
+        # Rows of one configuration are many (layers, ncore, iterations), each key is built once
+        unique = df[CONFIG_COLUMNS].astype(object).drop_duplicates()
+        ids = [self.id_of(config_key(*row)) for row in unique.itertuples(index=False, name=None)]
+        lookup = unique.assign(config_id=ids)
+        merged = df[CONFIG_COLUMNS].astype(object).merge(lookup, on=CONFIG_COLUMNS, how="left")
+        return pd.Series(merged["config_id"].to_numpy(), index=df.index, dtype="Int64")
+
+    def frame(self) -> pd.DataFrame:
+        """config_id and the CONFIG_COLUMNS of every registered configuration."""
+        rows = [(config_id, *key) for key, config_id in self.index.items()]
+        return pd.DataFrame(rows, columns=["config_id"] + CONFIG_COLUMNS).sort_values("config_id", ignore_index=True)
+
+    def save(self):
+        """Writes the registry if configurations were added."""
+        if self.added:
+            write_table(self.frame(), REGISTRY_TABLE, self.store_dir)
+            self.added = False
+
+
+def join_configs(left, right, columns) -> pd.DataFrame:
+    """left with the columns of right added on config_id, one row of right per configuration."""
+    return left.merge(right[["config_id", *columns]].drop_duplicates("config_id"), on="config_id", how="left")
+
+
+if __name__ == "__main__":
+    runtimes = load_table("runtimes")
+    quality = load_table("all_data", columns=["config_id", "n_elements", "bits_per_weight", "size", "ppl", "hellaswag"])
+    joined = join_configs(runtimes, quality, ["n_elements", "bits_per_weight", "size", "ppl", "hellaswag"])
+    write_table(joined, "runtime_quality")
+    print(f"runtime_quality: {len(joined)} runs, {joined['ppl'].notna().sum()} with ppl, "
+          f"{joined['bits_per_weight'].notna().sum()} with bits_per_weight")
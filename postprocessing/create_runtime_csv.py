@@ -1,150 +1,136 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 import glob
 import re
-from pathlib import Path
-def parse_model(filename: str):
-    """
-    Meta-Llama-3.1-8B-F16_Q4_1_no_imat
-    Meta-Llama-3.1-8B-F16_from_ZFP-acc_0.01-0.13_wi_imat_dim_1
-    """
+import sys
+
+from config_registry import ConfigRegistry
+from ingest import ingest
+from model_parser import parse_model
+from profiling import span
+from result_store import write_table
+
+# Bump whenever the parsers change, cached records of older versions are discarded
+PARSER_VERSION = 4
+
+# Meta-Llama-3.1-8B-Q4_0+NOI,ncores,24,iteration,1,node,n1310[,build,3f2a9c1d0b7e]
+META_PATTERN = re.compile(
+    r'^(?P<name>[^,\s]+),ncores,(?P<ncore>[^,]*),iteration,(?P<iteration>[^,]*),node,(?P<node>[^,\s]*)'
+    r'(?P<extra>(?:,[^,\s]+,[^,\s]*)*)\s*$',
+    re.MULTILINE)
+
+# llama_perf_context_print: prompt eval time =  2789,96 ms /   154 tokens (   18,12 ms per token,    55,20 tokens per second)
+# llama_perf_context_print:        load time =  1834,01 ms
+# llama_perf_sampler_print:    sampling time =    12,34 ms /   353 runs   (     0,03 ms per token, 28603,57 tokens per second)
+PERF_PATTERN = re.compile(
+    r'llama_perf_(?:context|sampler)_print:\s*(?P<name>[a-z ]+?) time\s*=\s*(?P<ms>[\d.,]+) ms'
+    r'(?:\s*/\s*(?P<count>\d+) (?:tokens|runs))?'
+    r'(?:\s*\(\s*(?P<per_token>[\d.,]+) ms per token,\s*(?P<throughput>[\d.,]+) tokens per second\))?')
+
+# load_tensors:          CPU model buffer size =  4437,80 MiB
+# llama_kv_cache_init:        CPU KV buffer size =   512,00 MiB
+# llama_new_context_with_model:        CPU compute buffer size =   258,50 MiB
+BUFFER_PATTERN = re.compile(r'\S+\s+(?P<kind>model|KV|output|compute) buffer size\s*=\s*(?P<mib>[\d.,]+) MiB')
+
+# llama_new_context_with_model: graph nodes  = 1030
+GRAPH_PATTERN = re.compile(r'graph (?P<kind>nodes|splits)\s*=\s*(?P<value>\d+)')
+
+# llama_perf line name: prefix of its columns
+PERF_NAMES = {"load": "load", "prompt eval": "prompt_eval", "eval": "eval", "sampling": "sample", "total": "total"}
+BUFFER_KINDS = ["model", "KV", "output", "compute"]
+
+PERF_COLUMNS = ["load_time",
+                "prompt_eval_time", "prompt_eval_throughput", "prompt_eval_total_time", "prompt_eval_tokens",
+                "eval_time", "eval_throughput", "eval_total_time", "eval_tokens",
+                "sample_time", "sample_throughput", "sample_total_time", "sample_tokens",
+                "total_time", "total_tokens"]
+
+
+def parse_number(num_str: str) -> float:
+    # The nodes print comma decimals
+    return float(num_str.replace(',', '.'))
 
-    modelname = Path(filename).stem
-
-    model_name = modelname.strip().removeprefix("Meta-Llama-")
-
-    llama_version = model_name.split("-", 1)[0]  # 3
-    num_parameter = model_name.split("-", 2)[1]  # 8B
-    try:
-        processing_type, source_type = model_name.split("-", 2)[2].split("@", 1)
-    except ValueError:
-        processing_type =  source_type = model_name.split("-", 2)[2].split("@", 1)[0]
-
-    if "ZFP" in source_type:
-        source_type_tmp = source_type[3:]
-        quant_type = source_type_tmp[:4]
-
-        source_type_tmp2 = source_type_tmp[4:].split("_", 1)[0]
-        threshold_low, threshold_high = source_type_tmp2.split(":")
-
-        imat_tmp = source_type_tmp.split("_")[-1]
-        dim = source_type_tmp.split("_")[-2]
-    else:
-        dim = None
-        threshold_low = None
-        threshold_high = None
-
-        quant_type, imat_tmp = source_type.split("+")
-
-    if imat_tmp == "NOI":
-        imat = False
-    elif imat_tmp == "WII":
-        imat = True
-    else:
-        raise ValueError(f"Imhat has wrong value: {imat}")
-
-    print(
-        f"{model_name=} {llama_version=} {num_parameter=} {processing_type=} {quant_type=} {dim=} {threshold_low=} {threshold_high=} {imat=}")
-
-    return {
-        "model_name": model_name,
-        "llama_version": llama_version,
-        "num_parameter": num_parameter,
-        "processing_type": processing_type,
-        "quant_type": quant_type,
-        "dim": dim,
-        "threshold_low": threshold_low,
-        "threshold_high": threshold_high,
-        "imat": imat
-    }
 
 def parse_info(text: str) -> dict:
     """
-    Parses a given multiline string containing metadata and performance information into a dictionary.
-
-    Expected text format:
-        Meta-Llama-3.1-8B-Q4_0+NOI,ncores,24,iteration,1,node,n1310
+    Parses a runtime result file: the metadata line written by the job script, followed by
+    the llama-cli log. Lines are found by their content, not their position, so the
+    complete log and the files with only the two "eval time" lines are both read.
+
+    Expected text format (any other lines are skipped):
+        Meta-Llama-3.1-8B-Q4_0+NOI,ncores,24,iteration,1,node,n1310,build,3f2a9c1d0b7e
+        load_tensors:          CPU model buffer size =  4437,80 MiB
+        llama_kv_cache_init:        CPU KV buffer size =   512,00 MiB
+        llama_new_context_with_model:        CPU compute buffer size =   258,50 MiB
+        llama_perf_sampler_print:    sampling time =      12,34 ms /   353 runs   (    0,03 ms per token, 28603,57 tokens per second)
+        llama_perf_context_print:        load time =    1834,01 ms
         llama_perf_context_print: prompt eval time =    2789,96 ms /   154 tokens (   18,12 ms per token,    55,20 tokens per second)
         llama_perf_context_print:        eval time =   18947,69 ms /   199 runs   (   95,21 ms per token,    10,50 tokens per second)
+        llama_perf_context_print:       total time =   21912,08 ms /   353 tokens
 
-    The output dict will have the following keys:
+    The output dict will have the following keys, None where the log has no value:
         - name
-        - ncode            (extracted from the value paired with the "ncores" label)
+        - ncore
         - iteration
         - node
-        - prompt_eval_time [ms]
+        - build                         (fingerprint of the llama-cli binary, None for results written without it)
+        - prompt_eval_time [ms]         (per token)
         - prompt_eval_throughput [token/s]
-        - eval_time [ms]
+        - prompt_eval_total_time [ms], prompt_eval_tokens
+        - eval_time [ms]                (per token)
         - eval_throughput [tokens/s]
+        - eval_total_time [ms], eval_tokens
+        - sample_time [ms]              (per token), sample_throughput [tokens/s], sample_total_time [ms], sample_tokens
+        - load_time [ms]
+        - total_time [ms], total_tokens
+        - model_buffer_mib, kv_buffer_mib, output_buffer_mib, compute_buffer_mib   (summed over the devices)
+        - graph_nodes, graph_splits
 
     Returns:
         A dictionary with the parsed data.
     """
-    # Split input text into non-empty lines
-    lines = [line.strip() for line in text.strip().splitlines() if line.strip()]
-    result = {}
-
-    # Process the first line for metadata: name, ncode, iteration, node
-    # The assumption: the first token is the name, then key/value pairs follow.
-    # Example tokens: ["Meta-Llama-3.1-8B-Q4_0+NOI", "ncores", "24", "iteration", "1", "node", "n1310"]
-    meta_tokens = lines[0].split(',')
-    if len(meta_tokens) < 7:
-        raise ValueError("Metadata line does not contain enough tokens")
-
-    result["name"] = meta_tokens[0]
-    # Here we ignore the labels (meta_tokens[1], meta_tokens[3], meta_tokens[5])
-    # and map the values to the expected fields.
-    try:
-        # Convert to integer if possible.
-        result["ncore"] = int(meta_tokens[2])
-    except ValueError:
-        result["ncore"] = meta_tokens[2]
-
-    try:
-        result["iteration"] = int(meta_tokens[4])
-    except ValueError:
-        result["iteration"] = meta_tokens[4]
-
-    result["node"] = meta_tokens[6]
-
-    # Define a helper to convert comma-decimal numbers to float.
-    def parse_number(num_str: str) -> float:
-        # Replace comma with dot and convert to float.
-        return float(num_str.replace(',', '.'))
-
-    # Process the prompt eval performance line (assumed to be the second non-empty line)
-    if len(lines) > 1:
-        prompt_line = lines[1]
-        # Extract prompt eval time
-        prompt_time_match = re.search(r'([\d,]+) ms per token', prompt_line)
-        if prompt_time_match:
-            result["prompt_eval_time"] = parse_number(prompt_time_match.group(1))
-        else:
-            result["prompt_eval_time"] = None
-
-        # Extract prompt throughput (tokens per second)
-        prompt_throughput_match = re.search(r'([\d,]+) tokens per second', prompt_line)
-        if prompt_throughput_match:
-            result["prompt_eval_throughput"] = parse_number(prompt_throughput_match.group(1))
-        else:
-            result["prompt_eval_throughput"] = None
-
-    # Process the eval performance line (assumed to be the third non-empty line)
-    if len(lines) > 2:
-        eval_line = lines[2]
-        # Extract eval time
-        eval_time_match = re.search(r'([\d,]+) ms per token', eval_line)
-        if eval_time_match:
-            result["eval_time"] = parse_number(eval_time_match.group(1))
-        else:
-            result["eval_time"] = None
+    meta = META_PATTERN.search(text)
+    if meta is None:
+        raise ValueError("Metadata line not found")
 
-        # Extract eval throughput (tokens per second)
-        eval_throughput_match = re.search(r'([\d,]+) tokens per second', eval_line)
-        if eval_throughput_match:
-            result["eval_throughput"] = parse_number(eval_throughput_match.group(1))
+    result = {"name": meta.group("name")}
+    for key in ["ncore", "iteration"]:
+        try:
+            # Convert to integer if possible.
+            result[key] = int(meta.group(key))
+        except ValueError:
+            result[key] = meta.group(key)
+    result["node"] = meta.group("node")
+
+    # Optional key/value pairs after the node, e.g. the build fingerprint
+    extra = meta.group("extra").split(',')[1:]
+    result["build"] = dict(zip(extra[0::2], extra[1::2])).get("build")
+
+    result.update(dict.fromkeys(PERF_COLUMNS))
+    for match in PERF_PATTERN.finditer(text):
+        prefix = PERF_NAMES.get(match.group("name").strip())
+        if prefix is None:
+            continue
+        milliseconds = parse_number(match.group("ms"))
+        # The load and total time have no per token value, their time is the total
+        if prefix in ("load", "total"):
+            result[f"{prefix}_time"] = milliseconds
         else:
-            result["eval_throughput"] = None
+            result[f"{prefix}_total_time"] = milliseconds
+            if match.group("per_token"):
+                result[f"{prefix}_time"] = parse_number(match.group("per_token"))
+                result[f"{prefix}_throughput"] = parse_number(match.group("throughput"))
+        if match.group("count") and prefix != "load":
+            result[f"{prefix}_tokens"] = int(match.group("count"))
+
+    for kind in BUFFER_KINDS:
+        result[f"{kind.lower()}_buffer_mib"] = None
+    for match in BUFFER_PATTERN.finditer(text):
+        key = f"{match.group('kind').lower()}_buffer_mib"
+        result[key] = (result[key] or 0.0) + parse_number(match.group("mib"))
+
+    result["graph_nodes"] = result["graph_splits"] = None
+    for match in GRAPH_PATTERN.finditer(text):
+        result[f"graph_{match.group('kind')}"] = int(match.group("value"))
 
     return result
 
@@ -160,22 +146,22 @@ def parse_file_model_performance(filename):
 
 
 def collect_runtime_info(pattern="*.out"):
-    files = glob.glob(pattern)
+    with span("runtime_performance", "discover", pattern=pattern):
+        files = sorted(glob.glob(pattern))
 
-    results = []
-    for filename in files:
-        try:
-            data = parse_file_model_performance(filename)
-            #data['filename'] = filename
-            results.append(data)
-        except Exception as e:
-            print(f"Error processing {filename}: {e}")
-
-    return results
+    records = ingest(files, parse_file_model_performance, "runtime_performance", PARSER_VERSION)
 
-if __name__ == "__main__":
-    search_dir = "../job_results/Meta-Llama-3.1-8B/runtime_performance/*"
+    return list(records.values())
 
+def create_runtime_table(search_dir="../job_results/Meta-Llama-3.1-8B/runtime_performance/*"):
     data = collect_runtime_info(search_dir)
-    df = pd.DataFrame(data)
-    df.to_csv("runtimes.csv",index=False)
+    with span("runtimes", "normalize"):
+        df = pd.DataFrame(data)
+        configs = ConfigRegistry()
+        df["config_id"] = configs.assign(df)
+    configs.save()
+    write_table(df, "runtimes")
+    return df
+
+if __name__ == "__main__":
+    create_runtime_table(*sys.argv[1:2])
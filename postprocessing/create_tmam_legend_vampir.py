@@ -1,9 +1,6 @@
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-plt.style.use("default")
-plt.rcParams.update({'figure.facecolor': 'white','axes.facecolor': 'white'})
-plt.rc('font', family='serif')
-plt.rcParams["font.serif"] = ["Times New Roman", "DejaVu Serif", "Bitstream Vera Serif"]
+import sys
+
+from style import apply_style
 
 # Labels and corresponding colors
 labels = [
@@ -22,33 +19,40 @@ colors = [
     "#9467bd", "#8c564b", "#e377c2", "#7f7f7f"
 ]
 
-# 80% opacity on each color bar
-handles = [plt.Line2D([0], [0], color=color, lw=10, alpha=0.60) for color in colors]
 
-# Optional: Nimbus Roman font
+def write_legend(output="topdown_l2_legend.svg"):
+    """Legend-only figure of the Topdown L2 metrics, matching the Vampir colors."""
+    import matplotlib.pyplot as plt
+
+    # 80% opacity on each color bar
+    handles = [plt.Line2D([0], [0], color=color, lw=10, alpha=0.60) for color in colors]
+
+    # Create your legend-only figure
+    fig_legend = plt.figure(figsize=(5, 3))
 
-# Create your legend-only figure
-fig_legend = plt.figure(figsize=(5, 3))
+    # Set a border on the figure patch (the background)
+    fig_legend.patch.set_edgecolor('black')  # Set the border color
+    fig_legend.patch.set_linewidth(2)          # Set the border width
 
-# Set a border on the figure patch (the background)
-fig_legend.patch.set_edgecolor('black')  # Set the border color
-fig_legend.patch.set_linewidth(2)          # Set the border width
+    # Create the legend as before
+    fig_legend.legend(
+        handles,
+        labels,
+        loc="center",
+        frameon=False,  # This is for the legend box; the figure border is set separately.
+        ncol=1,
+        handlelength=2.5,
+        title="Topdown L2 Metrics",
+    )
 
-# Create the legend as before
-fig_legend.legend(
-    handles,
-    labels,
-    loc="center",
-    frameon=False,  # This is for the legend box; the figure border is set separately.
-    ncol=1,
-    handlelength=2.5,
-    title="Topdown L2 Metrics",
-)
+    fig_legend.tight_layout()
+    fig_legend.savefig(output,
+                       format="svg",
+                       bbox_inches='tight',
+                       transparent=False)
+    plt.close(fig_legend)
 
-fig_legend.tight_layout()
-fig_legend.show()
-fig_legend.savefig("topdown_l2_legend.svg",
-                   format="svg",
-                   bbox_inches='tight',
-                   transparent=False)
 
+if __name__ == "__main__":
+    apply_style()
+    write_legend(*sys.argv[1:2])
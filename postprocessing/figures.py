@@ -0,0 +1,146 @@
+"""
+Incremental, parallel build of the paper figures.
+
+Every figure is a registered target: the table it is drawn from, the spec of
+the rows and columns it needs (see query.py) and the plot function. The key of
+a target is a hash of the exact data slice, the spec and the source of the module with
+the plot function and of the postprocessing modules it uses (style, pareto, query, ...).
+Only targets whose key changed, or whose output is missing, are rendered, in worker
+processes with the Agg backend.
+
+    python figures.py                      # renders the stale figures
+    python figures.py overview_8B.pdf      # renders the given figures if they are stale
+"""
+import hashlib
+import inspect
+import json
+import os
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import matplotlib
+
+# Set before pyplot is imported by the plot modules, workers only ever write files
+matplotlib.use("Agg")
+
+import pandas as pd
+
+import plot_runtimes
+import plotting
+from ingest import MANIFEST_DIR, load_manifest, run_pool, save_manifest
+from profiling import span
+from query import ResultSet
+from style import apply_style
+
+# Changing it re-renders every figure
+CACHE_VERSION = 1
+
+SOURCE_DIR = Path(__file__).resolve().parent
+
+# output: (table, spec, plot function)
+FIGURES = {
+    "overview_8B_70B.pdf": ("all_data", plotting.PLOT_SPECS["summary_ppl"], plotting.plot_summary_ppl),
+    "overview_8B.pdf": ("all_data", plotting.PLOT_SPECS["zfp_8b"], plotting.plot_zfp_8b),
+    "overview_8B_zfp_chunksize.pdf": ("all_data", plotting.PLOT_SPECS["zfp_8b_chunk"], plotting.plot_zfp_8b_chunk),
+    "overview_8B_hellaswag.pdf": ("all_data", plotting.PLOT_SPECS["hellaswag_imatrix"], plotting.plt_8b_hellaswag_imatrix),
+    "throughput-8B.pdf": ("runtimes", plot_runtimes.RUNTIME_SPEC, plot_runtimes.plot_throughput),
+    "runtime_decode-8B.pdf": ("runtimes", plot_runtimes.RUNTIME_SPEC, plot_runtimes.plot_runtime_decode),
+}
+
+
+def local_modules(module) -> list:
+    """module and the postprocessing modules it uses, directly or through other local modules."""
+    found = {}
+    pending = [module]
+    while pending:
+        current = pending.pop()
+        if current is None or current.__name__ in found:
+            continue
+        path = getattr(current, "__file__", None)
+        if path is None or Path(path).resolve().parent != SOURCE_DIR:
+            continue
+        found[current.__name__] = current
+        for value in vars(current).values():
+            pending.append(value if inspect.ismodule(value) else inspect.getmodule(value))
+    return [found[name] for name in sorted(found)]
+
+
+@lru_cache(maxsize=None)
+def source_hash(module_name: str) -> bytes:
+    h = hashlib.sha256()
+    for module in local_modules(sys.modules[module_name]):
+        h.update(module.__name__.encode())
+        h.update(inspect.getsource(module).encode())
+    return h.digest()
+
+
+def figure_key(df: pd.DataFrame, spec, function) -> str:
+    """Hash of the data slice, the spec and the source of the plot function's module and its local dependencies."""
+    h = hashlib.sha256()
+    h.update(json.dumps(spec, sort_keys=True, default=str).encode())
+    h.update(json.dumps([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    # The whole module, the plot functions depend on its mappings and helpers, and the
+    # modules they use. _render_one applies the style of style.py to every figure.
+    h.update(function.__name__.encode())
+    h.update(source_hash(function.__module__))
+    h.update(source_hash(apply_style.__module__))
+    return h.hexdigest()
+
+
+def _render_one(task):
+    function, df, output = task
+    apply_style()
+    with span(os.path.basename(output), "render", function=function.__name__, rows=len(df)):
+        function(df, output=output)
+
+
+def build(targets=None, output_dir=".", manifest_dir=MANIFEST_DIR, max_workers=None, force=False) -> list:
+    """
+    Renders the stale figures among targets (default: all of FIGURES) to output_dir
+    and returns the list of rendered outputs.
+    """
+    targets = list(targets or FIGURES)
+    unknown = [t for t in targets if t not in FIGURES]
+    if unknown:
+        raise ValueError(f"Unknown figures: {', '.join(unknown)}")
+
+    # One scan per table, shared by all figures drawn from it
+    specs = {}
+    for target in targets:
+        table, spec, _ = FIGURES[target]
+        specs.setdefault(table, []).append(spec)
+    result_sets = {table: ResultSet(table, table_specs) for table, table_specs in specs.items()}
+
+    manifest_path = Path(manifest_dir) / "figures.pkl"
+    entries = load_manifest(manifest_path, CACHE_VERSION)
+
+    stale = []
+    for target in targets:
+        table, spec, function = FIGURES[target]
+        df = result_sets[table].select(spec)
+        key = figure_key(df, spec, function)
+        output = os.path.join(output_dir, target)
+        if force or entries.get(output) != key or not os.path.exists(output):
+            stale.append((output, key, function, df))
+
+    if stale:
+        results = run_pool([(function, df, output) for output, _, function, df in stale], _render_one,
+                           max_workers=max_workers)
+        for (output, key, _, _), (ok, error) in zip(stale, results):
+            if ok:
+                entries[output] = key
+            else:
+                print(f"Error rendering {output}: {error}")
+                entries.pop(output, None)
+
+        save_manifest(manifest_path, CACHE_VERSION, entries)
+
+    print(f"figures: {len(targets)} targets, {len(stale)} rendered, {len(targets) - len(stale)} up to date")
+
+    return [output for output, *_ in stale if output in entries]
+
+
+if __name__ == "__main__":
+    build(sys.argv[1:] or None)
@@ -0,0 +1,263 @@
+"""
+Tensor comparison of two GGUF files without llama-compare-tensors.
+
+Both files are memory-mapped and every tensor is compared in bounded chunks
+with NumPy, tensors are spread over a process pool. Per tensor and for all
+tensors together ("global") it reports rmse and maxerr of the absolute
+difference, its 95th percentile and median, and a histogram. The output is
+written in the format of llama-compare-tensors --histogram --per-layer-stats,
+so parse_file_tf_difference and the whole postprocessing pick it up unchanged:
+
+    python gguf_compare.py <reference F16 gguf> <F16@... gguf> [output .out] [workers]
+
+F32, F16 and BF16 tensors are supported, which covers the reference weights
+and the F16@ conversions that 16_evaluate_tensor_derivation.sh compares.
+Like in llama-compare-tensors, the percentiles are the upper edge of the
+histogram bin that contains them ("95pct<").
+"""
+import os
+import struct
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from ingest import run_pool
+
+GGUF_MAGIC = b"GGUF"
+GGUF_DEFAULT_ALIGNMENT = 32
+
+# ggml type id: numpy dtype of the stored values
+GGML_TYPES = {
+    0: np.dtype("<f4"),  # F32
+    1: np.dtype("<f2"),  # F16
+    30: np.dtype("<u2"),  # BF16, widened to float32 on read
+}
+GGML_BF16 = 30
+
+# GGUF metadata value type: struct format, arrays (9) and strings (8) are handled separately
+GGUF_VALUE_FORMATS = {0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i", 6: "<f", 7: "<?", 10: "<Q", 11: "<q", 12: "<d"}
+GGUF_STRING = 8
+GGUF_ARRAY = 9
+
+# Histogram of the absolute difference: N_BINS bins of BIN_WIDTH and one open bin [N_BINS * BIN_WIDTH, inf)
+BIN_WIDTH = 2e-4
+N_BINS = 150
+
+# Elements per chunk, bounds the memory of every worker to a few hundred MB
+CHUNK_ELEMENTS = 1 << 23
+
+
+class GGUFReader:
+    """Tensor directory of a GGUF file (version 2 or 3) and zero-copy views of its tensors."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.buffer = np.memmap(self.path, dtype=np.uint8, mode="r")
+        self.offset = 0
+
+        if bytes(self.buffer[:4]) != GGUF_MAGIC:
+            raise ValueError(f"{self.path} is not a GGUF file")
+        self.offset = 4
+        self.version = self._read("<I")
+        if self.version < 2:
+            raise ValueError(f"GGUF version {self.version} of {self.path} is not supported")
+
+        n_tensors = self._read("<Q")
+        n_metadata = self._read("<Q")
+
+        self.metadata = {}
+        for _ in range(n_metadata):
+            key = self._read_string()
+            self.metadata[key] = self._read_value(self._read("<I"))
+
+        self.tensors = {}
+        for _ in range(n_tensors):
+            name = self._read_string()
+            n_dims = self._read("<I")
+            dims = [self._read("<Q") for _ in range(n_dims)]
+            self.tensors[name] = {"type": self._read("<I"), "shape": tuple(reversed(dims)),
+                                  "n_elements": int(np.prod(dims)), "offset": self._read("<Q")}
+
+        alignment = int(self.metadata.get("general.alignment", GGUF_DEFAULT_ALIGNMENT))
+        self.data_offset = -(-self.offset // alignment) * alignment
+
+    def _read(self, fmt):
+        size = struct.calcsize(fmt)
+        (value,) = struct.unpack_from(fmt, self.buffer, self.offset)
+        self.offset += size
+        return value
+
+    def _read_string(self):
+        length = self._read("<Q")
+        value = bytes(self.buffer[self.offset:self.offset + length]).decode("utf-8", errors="replace")
+        self.offset += length
+        return value
+
+    def _read_value(self, value_type):
+        if value_type == GGUF_STRING:
+            return self._read_string()
+        if value_type == GGUF_ARRAY:
+            item_type = self._read("<I")
+            count = self._read("<Q")
+            if item_type in GGUF_VALUE_FORMATS:
+                # Numeric arrays (e.g. token scores) are skipped in one step
+                fmt = GGUF_VALUE_FORMATS[item_type]
+                values = np.frombuffer(self.buffer, dtype=np.dtype(fmt), count=count, offset=self.offset)
+                self.offset += count * struct.calcsize(fmt)
+                return values
+            return [self._read_value(item_type) for _ in range(count)]
+        return self._read(GGUF_VALUE_FORMATS[value_type])
+
+    def raw(self, name, start=0, stop=None):
+        """Elements [start, stop) of tensor name as flat array of the stored type, without a copy."""
+        tensor = self.tensors[name]
+        if tensor["type"] not in GGML_TYPES:
+            raise ValueError(f"Tensor {name} of {self.path} has unsupported ggml type {tensor['type']}")
+        dtype = GGML_TYPES[tensor["type"]]
+        stop = tensor["n_elements"] if stop is None else stop
+        return np.frombuffer(self.buffer, dtype=dtype, count=stop - start,
+                             offset=self.data_offset + tensor["offset"] + start * dtype.itemsize)
+
+    def view(self, name, start=0, stop=None):
+        """Elements [start, stop) of tensor name as flat float32 array, a copy only for F16 and BF16."""
+        return to_float32(self.raw(name, start, stop), self.tensors[name]["type"])
+
+
+def to_float32(values, ggml_type):
+    """Stored values of a tensor as float32."""
+    if ggml_type == GGML_BF16:
+        return (values.astype(np.uint32) << 16).view(np.float32)
+    return values.astype(np.float32, copy=False)
+
+
+@lru_cache(maxsize=4)
+def open_gguf(path) -> GGUFReader:
+    """Reader of path, cached so that every worker parses the metadata of a file once."""
+    return GGUFReader(path)
+
+
+def histogram_edges(bin_width=BIN_WIDTH, n_bins=N_BINS):
+    return np.append(np.arange(n_bins + 1) * bin_width, np.inf)
+
+
+def compare_tensor(path_a, path_b, name, bin_width=BIN_WIDTH, n_bins=N_BINS, chunk=CHUNK_ELEMENTS):
+    """(sum of squared differences, maxerr, n_elements, histogram counts) of tensor name."""
+    a, b = open_gguf(path_a), open_gguf(path_b)
+    n = a.tensors[name]["n_elements"]
+    if b.tensors[name]["n_elements"] != n:
+        raise ValueError(f"Tensor {name} has {n} elements in {path_a} but {b.tensors[name]['n_elements']} in {path_b}")
+
+    sum_squares = 0.0
+    maxerr = 0.0
+    counts = np.zeros(n_bins + 1, dtype=np.int64)
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        difference = np.abs(a.view(name, start, stop) - b.view(name, start, stop)).astype(np.float64)
+        sum_squares += float(np.dot(difference, difference))
+        maxerr = max(maxerr, float(difference.max()))
+        # Uniform bins, the index is computed instead of searched; the last bin is open
+        index = np.minimum((difference / bin_width).astype(np.int64), n_bins)
+        counts += np.bincount(index, minlength=n_bins + 1)
+    return sum_squares, maxerr, n, counts
+
+
+def _compare_one(args):
+    return compare_tensor(*args)
+
+
+def histogram_quantile(edges, counts, q, maxerr):
+    """Upper edge of the bin holding quantile q, maxerr if that is the open last bin."""
+    cumulative = np.cumsum(counts)
+    if cumulative[-1] == 0:
+        return 0.0
+    index = int(np.searchsorted(cumulative, q * cumulative[-1]))
+    return float(edges[index + 1]) if np.isfinite(edges[index + 1]) else maxerr
+
+
+def compare(path_a, path_b, max_workers=None, bin_width=BIN_WIDTH, n_bins=N_BINS):
+    """
+    Compares all tensors of path_b with the same tensors of path_a.
+
+    Returns (layer names, stats (n, 4) of rmse, maxerr, 95pct and median, edges, counts (n, bins)),
+    the first layer is "global", the others follow the tensor order of path_a.
+    """
+    reference, other = GGUFReader(path_a), GGUFReader(path_b)
+    names = [name for name in reference.tensors if name in other.tensors]
+    missing = set(reference.tensors) ^ set(other.tensors)
+    if missing:
+        print(f"Skipping {len(missing)} tensors not present in both files: {', '.join(sorted(missing)[:5])} ...")
+
+    tasks = [(str(path_a), str(path_b), name, bin_width, n_bins) for name in names]
+    results = dict(zip(names, run_pool(tasks, _compare_one, weight=lambda task: reference.tensors[task[2]]["n_elements"],
+                                       max_workers=max_workers)))
+
+    edges = histogram_edges(bin_width, n_bins)
+    layer_names, stats, counts = [], [], []
+    total_squares, total_max, total_n = 0.0, 0.0, 0
+    total_counts = np.zeros(n_bins + 1, dtype=np.int64)
+
+    for name in names:
+        ok, result = results[name]
+        if not ok:
+            print(f"Error comparing {name}: {result}")
+            continue
+        sum_squares, maxerr, n, tensor_counts = result
+        total_squares += sum_squares
+        total_max = max(total_max, maxerr)
+        total_n += n
+        total_counts += tensor_counts
+
+        layer_names.append(name)
+        stats.append([np.sqrt(sum_squares / n), maxerr,
+                      histogram_quantile(edges, tensor_counts, 0.95, maxerr),
+                      histogram_quantile(edges, tensor_counts, 0.5, maxerr)])
+        counts.append(tensor_counts)
+
+    global_stats = [np.sqrt(total_squares / total_n) if total_n else 0.0, total_max,
+                    histogram_quantile(edges, total_counts, 0.95, total_max),
+                    histogram_quantile(edges, total_counts, 0.5, total_max)]
+
+    return (np.array(["global", *layer_names], dtype=str),
+            np.array([global_stats, *stats], dtype=np.float64),
+            edges,
+            np.array([total_counts, *counts], dtype=np.int64))
+
+
+def format_result(layer_names, stats, edges, counts) -> str:
+    """The comparison in the text format of llama-compare-tensors --histogram --per-layer-stats."""
+    lines = []
+    for name, (rmse, maxerr, pct95, median), layer_counts in zip(layer_names, stats, counts):
+        lines.append(f"{name} : rmse {rmse:.8f}, maxerr {maxerr:.8f}, 95pct<{pct95:.4f}, median<{median:.4f}")
+        for start, end, count in zip(edges[:-1], edges[1:], layer_counts):
+            lines.append(f"    [{start:.4f}, {'inf' if np.isinf(end) else f'{end:.4f}'}): {count:10d}")
+    return "\n".join(lines) + "\n"
+
+
+def compare_to_record(path_a, path_b, max_workers=None) -> dict:
+    """The comparison as record in the format of merge_all_data.parse_file_tf_difference."""
+    from model_parser import parse_model
+
+    layer_names, stats, edges, counts = compare(path_a, path_b, max_workers)
+    return {
+        **parse_model(path_b),
+        'layer': layer_names,
+        'stats': stats,
+        'histogram_edges': edges,
+        'histogram_counts': counts,
+    }
+
+
+if __name__ == "__main__":
+    path_a, path_b = sys.argv[1], sys.argv[2]
+    output = sys.argv[3] if len(sys.argv) > 3 else f"{Path(path_b).stem}.out"
+    max_workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    result = format_result(*compare(path_a, path_b, max_workers))
+
+    # Written at once, a watcher must never ingest a half written comparison
+    tmp_output = f"{output}.tmp"
+    with open(tmp_output, "w") as f:
+        f.write(result)
+    os.replace(tmp_output, output)
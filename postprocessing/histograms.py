@@ -0,0 +1,137 @@
+"""
+Dense per-layer histograms of the tensor comparison (llama-compare-tensors --histogram).
+
+All histograms share one array of bin edges, the counts are kept in a single
+matrix of shape (models, layers, bins). Normalisation, CDFs and overlays are
+then plain NumPy operations over all layer histograms at once, and the whole
+set is stored as one binary .npz file:
+
+    hist = HistogramSet.from_table(df)   # columns model_name, layer, histogram
+    hist.save("histograms.npz")
+
+    hist = HistogramSet.load("histograms.npz")
+    fractions = hist.select(layers=["global"]).fractions()[:, 0, :]
+"""
+import json
+
+import numpy as np
+
+
+def parse_histogram_string(data_str: str):
+    """
+    Converts the histogram column of the CSV tables,
+    "[{'bin_start': 0.0, 'bin_end': 0.001, 'count': 42}, ...]", to (edges, counts).
+    """
+    data_tmp = data_str.strip('"').replace("'", '"').replace("inf", "Infinity")
+    bins = json.loads(data_tmp)
+    return bins_to_arrays(bins)
+
+
+def bins_to_arrays(bins):
+    """Converts a list of {bin_start, bin_end, count} dicts to (edges, counts)."""
+    edges = np.array([b["bin_start"] for b in bins] + [bins[-1]["bin_end"]], dtype=np.float64)
+    counts = np.array([b["count"] for b in bins], dtype=np.int64)
+    return edges, counts
+
+
+class HistogramSet:
+    def __init__(self, edges, counts, models, layers):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.models = list(models)
+        self.layers = list(layers)
+
+        if self.counts.shape != (len(self.models), len(self.layers), len(self.edges) - 1):
+            raise ValueError(f"counts has shape {self.counts.shape}, expected "
+                             f"{(len(self.models), len(self.layers), len(self.edges) - 1)}")
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Builds the set from (model_name, layer, edges, counts) tuples.
+        Layers missing for a model are left at zero counts. The edges are parsed from
+        printed text, they are compared with np.allclose against the edges of the first
+        record. Records with other edges (e.g. from another producer) are skipped.
+        """
+        records = list(records)
+        if not records:
+            raise ValueError("No histograms given")
+
+        edges = np.asarray(records[0][2], dtype=np.float64)
+        skipped = set()
+        matching = []
+        for record in records:
+            record_edges = np.asarray(record[2], dtype=np.float64)
+            if record_edges.shape == edges.shape and np.allclose(record_edges, edges):
+                matching.append(record)
+            else:
+                skipped.add(record[0])
+        if skipped:
+            print(f"Skipping histograms of {len(skipped)} models with different bin edges: "
+                  f"{', '.join(sorted(map(str, skipped))[:5])}")
+        records = matching
+
+        models = list(dict.fromkeys(r[0] for r in records))
+        layers = list(dict.fromkeys(r[1] for r in records))
+        model_index = {m: i for i, m in enumerate(models)}
+        layer_index = {l: i for i, l in enumerate(layers)}
+
+        counts = np.zeros((len(models), len(layers), len(edges) - 1), dtype=np.int64)
+        for model, layer, _, record_counts in records:
+            counts[model_index[model], layer_index[layer]] = record_counts
+
+        return cls(edges, counts, models, layers)
+
+    @classmethod
+    def from_table(cls, df):
+        """Builds the set from a table with the columns model_name, layer and histogram (string)."""
+        records = []
+        for model, layer, histogram in zip(df["model_name"], df["layer"], df["histogram"]):
+            if not isinstance(histogram, str):
+                continue
+            edges, counts = parse_histogram_string(histogram)
+            records.append((model, layer, edges, counts))
+        return cls.from_records(records)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["edges"], data["counts"], data["models"].tolist(), data["layers"].tolist())
+
+    def save(self, path):
+        np.savez(path, edges=self.edges, counts=self.counts,
+                 models=np.array(self.models, dtype=str), layers=np.array(self.layers, dtype=str))
+
+    def select(self, models=None, layers=None):
+        """Subset in the given order of models and layers."""
+        models = self.models if models is None else list(models)
+        layers = self.layers if layers is None else list(layers)
+        for kind, wanted, known in [("model", models, self.models), ("layer", layers, self.layers)]:
+            missing = [str(name) for name in wanted if name not in known]
+            if missing:
+                raise ValueError(f"No histograms for {kind} {', '.join(missing)}")
+        model_index = [self.models.index(m) for m in models]
+        layer_index = [self.layers.index(l) for l in layers]
+        counts = self.counts[np.ix_(model_index, layer_index)]
+        return HistogramSet(self.edges, counts, models, layers)
+
+    def fractions(self):
+        """Counts normalised to a sum of one per histogram, empty histograms stay zero."""
+        totals = self.counts.sum(axis=-1, keepdims=True)
+        return np.divide(self.counts, totals, out=np.zeros(self.counts.shape), where=totals > 0)
+
+    def cdf(self):
+        return np.cumsum(self.fractions(), axis=-1)
+
+    def finite_edges(self):
+        """Bin edges with an infinite last edge replaced by the largest finite edge."""
+        edges = self.edges.copy()
+        edges[np.isinf(edges)] = edges[np.isfinite(edges)].max()
+        return edges
+
+    def bin_mids(self):
+        edges = self.finite_edges()
+        return (edges[:-1] + edges[1:]) / 2
+
+    def bin_widths(self):
+        return np.diff(self.finite_edges())
@@ -0,0 +1,159 @@
+"""
+Parallel, incremental ingestion of the files below job_results.
+
+Parsed records are kept in a manifest (one per result type) keyed by the path
+of the file. Next to every record the manifest stores the size and mtime of
+the files it was parsed from, and the whole manifest carries the version of
+the parser that produced it. A rerun only parses files that are new or have
+changed since the last run; everything else is taken from the manifest.
+Entries are only dropped once the files they were parsed from are gone, so
+callers with different globs can share a manifest.
+
+    files = glob.glob("../job_results/Meta-Llama-3.1-*B/quantization/*.out")
+    records = ingest(files, parse_file_quantization, "quantization", version=1)
+"""
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from profiling import drain, merge, span
+
+MANIFEST_DIR = ".ingest_cache"
+
+
+def fingerprint(paths) -> tuple:
+    """
+    (size, mtime) of every path. Missing files are recorded as None, so a file
+    that appears later invalidates the cached record.
+    """
+    result = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            result.append(None)
+            continue
+        result.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(result)
+
+
+def load_manifest(path, version) -> dict:
+    """Entries of the manifest at path, or an empty dict if missing or outdated."""
+    try:
+        with open(path, "rb") as f:
+            manifest = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return {}
+
+    if manifest.get("version") != version:
+        return {}
+    return manifest["entries"]
+
+
+def save_manifest(path, version, entries):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Write to a temporary file first, an interrupted run must not leave a broken manifest behind
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"version": version, "entries": entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _call(worker, item):
+    # Exceptions are returned instead of raised, one broken item must not stop the pool.
+    # The spans of the worker travel back with the result.
+    try:
+        return True, worker(item), drain()
+    except Exception as e:
+        return False, e, drain()
+
+
+def run_pool(items, worker, weight=None, max_workers=None) -> list:
+    """
+    Calls worker(item) for every item, in a process pool when there is more than one
+    worker and item, and returns [(ok, result or exception)] in the order of items.
+    worker has to be picklable (module level function or partial of one).
+
+    weight(item) submits the heaviest items first, so the pool does not end on one big
+    item. The spans recorded by the workers are merged into this process.
+    """
+    items = list(items)
+    order = sorted(range(len(items)), key=lambda i: -weight(items[i])) if weight else list(range(len(items)))
+    ordered = [items[i] for i in order]
+    call = partial(_call, worker)
+
+    workers = min(max_workers or os.cpu_count() or 1, len(items))
+    if workers <= 1:
+        outcomes = list(map(call, ordered))
+    else:
+        # Weighted items are handed out one by one, otherwise in chunks to cut the IPC
+        chunksize = 1 if weight else max(1, len(items) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(call, ordered, chunksize=chunksize))
+
+    results = [None] * len(items)
+    for index, (ok, result, events) in zip(order, outcomes):
+        merge(events)
+        results[index] = (ok, result)
+    return results
+
+
+def _parse_one(parser, filename):
+    with span(os.path.basename(filename), "parse", parser=parser.__name__):
+        return parser(filename)
+
+
+def ingest(files, parser, name: str, version, sources=None, manifest_dir=MANIFEST_DIR, max_workers=None) -> dict:
+    """
+    Parses all files with parser and returns {filename: record} in the order of files.
+
+    Arguments:
+        files:        Files (or file stems) to parse.
+        parser:       Module level function taking a single filename, it is sent to worker processes.
+        name:         Name of the manifest, e.g. "quantization".
+        version:      Version of the parser. Changing it invalidates every cached record.
+        sources:      Optional function mapping a filename to the files it reads from.
+                      Defaults to the file itself.
+        manifest_dir: Directory holding the manifests.
+        max_workers:  Size of the process pool, defaults to the number of CPUs.
+
+    Files that fail to parse are reported and skipped, they are retried on the next run.
+    """
+    manifest_path = Path(manifest_dir) / f"{name}.pkl"
+    with span(name, "read", manifest=manifest_path):
+        entries = load_manifest(manifest_path, version)
+
+    keys = {}
+    with span(name, "discover", files=len(files)):
+        for filename in files:
+            keys[filename] = fingerprint(sources(filename) if sources else [filename])
+
+    stale = [filename for filename in keys if filename not in entries or entries[filename][0] != keys[filename]]
+
+    if stale:
+        results = run_pool(stale, partial(_parse_one, parser), max_workers=max_workers)
+        for filename, (ok, record) in zip(stale, results):
+            if ok:
+                entries[filename] = (keys[filename], record)
+            else:
+                print(f"Error processing {filename}: {record}")
+                entries.pop(filename, None)
+
+    # Forget files that no longer exist. Entries of files outside this call's list are kept,
+    # callers with different globs share one manifest.
+    removed = [filename for filename in entries if filename not in keys
+               and all(key is None for key in fingerprint(sources(filename) if sources else [filename]))]
+    for filename in removed:
+        del entries[filename]
+    if stale or removed:
+        with span(name, "write", manifest=manifest_path):
+            save_manifest(manifest_path, version, entries)
+
+    records = {filename: entries[filename][1] for filename in keys if filename in entries}
+    print(f"{name}: {len(records)} records, {len(stale)} parsed, {len(keys) - len(stale)} cached")
+
+    return records
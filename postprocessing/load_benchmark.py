@@ -0,0 +1,157 @@
+"""
+Cold and warm model load of 18_evaluate_model_load.sh.
+
+Every result file holds one llama-cli run with or without mmap ("mmap"/"nommap"),
+started with the GGUF evicted from the page cache ("cold") or read before ("warm"),
+followed by the resource usage of /usr/bin/time -v. The time to first token is
+load_time + prompt_eval_total_time + eval_time (one decode step). The ZFP weights
+are compared against the Q4_0, Q6_K and Q8_0 baselines of the same model in the
+same mmap and cache state: a ratio above 1 means the ZFP weights load slower.
+
+    python load_benchmark.py ["../job_results/Meta-Llama-3.1-*B/load_performance/*.out"]
+
+Writes the tables load_performance (one row per run), load_summary (medians per
+configuration, mmap and cache) and load_comparison (ZFP / baseline ratios).
+"""
+import glob
+import re
+import sys
+
+import pandas as pd
+
+from config_registry import ConfigRegistry
+from create_runtime_csv import META_PATTERN, parse_info, parse_number
+from ingest import ingest
+from model_parser import parse_model
+from result_store import write_table
+
+# Bump whenever the parser changes, cached records of older versions are discarded
+PARSER_VERSION = 1
+
+BASELINES = ["Q4_0", "Q6_K", "Q8_0"]
+SUMMARY_COLUMNS = ["config_id", "llama_version", "num_parameter", "quant_type", "model_name", "mmap", "cache"]
+METRICS = ["time_to_first_token", "load_time", "prompt_eval_total_time", "wall_time",
+           "max_rss_mib", "major_faults", "minor_faults", "cached_fraction"]
+
+# 	Maximum resident set size (kbytes): 4711234
+# 	Elapsed (wall clock) time (h:mm:ss or m:ss): 0:12.34
+# 	Major (requiring I/O) page faults: 12
+TIME_FIELDS = {
+    "Maximum resident set size (kbytes)": "max_rss_mib",
+    "Elapsed (wall clock) time (h:mm:ss or m:ss)": "wall_time",
+    "Major (requiring I/O) page faults": "major_faults",
+    "Minor (reclaiming a frame) page faults": "minor_faults",
+    "File system inputs": "fs_inputs",
+}
+# The field names contain colons themselves, every field has its own pattern
+TIME_PATTERNS = {key: re.compile(rf'^\s*{re.escape(name)}:\s*(\S+)\s*$', re.MULTILINE)
+                 for name, key in TIME_FIELDS.items()}
+
+
+def parse_elapsed(value: str) -> float:
+    """[h:]m:ss.ss of /usr/bin/time in ms."""
+    seconds = 0.0
+    for part in value.split(':'):
+        seconds = seconds * 60 + parse_number(part)
+    return seconds * 1000
+
+
+def parse_load(text: str) -> dict:
+    """
+    Parses a load result file: the runtime metadata line extended by
+    ",mmap,<mmap|nommap>,cache,<cold|warm>,cached,<fraction>", the llama-cli log
+    (see create_runtime_csv.parse_info) and the output of /usr/bin/time -v.
+
+    Adds to the keys of parse_info, None where the file has no value:
+        - mmap, cache
+        - cached_fraction               (of the GGUF in the page cache before the run)
+        - max_rss_mib, wall_time [ms], major_faults, minor_faults, fs_inputs
+        - time_to_first_token [ms]
+    """
+    result = parse_info(text)
+    extra = META_PATTERN.search(text).group("extra").split(',')[1:]
+    pairs = dict(zip(extra[0::2], extra[1::2]))
+    result["mmap"] = pairs.get("mmap")
+    result["cache"] = pairs.get("cache")
+    cached = pairs.get("cached")
+    result["cached_fraction"] = parse_number(cached) if cached not in (None, "", "nan") else None
+
+    result.update(dict.fromkeys(TIME_FIELDS.values()))
+    for key, pattern in TIME_PATTERNS.items():
+        match = pattern.search(text)
+        if match is None:
+            continue
+        value = match.group(1)
+        if key == "wall_time":
+            result[key] = parse_elapsed(value)
+        elif key == "max_rss_mib":
+            result[key] = int(value) / 1024
+        else:
+            result[key] = int(value)
+
+    parts = [result["load_time"], result["prompt_eval_total_time"], result["eval_time"]]
+    result["time_to_first_token"] = None if None in parts else sum(parts)
+    return result
+
+
+def parse_file_load(filename):
+    with open(filename, 'r') as f:
+        parsed_info = parse_load(f.read())
+    # The file name carries mmap, cache, ncore and iteration, the metadata line has the plain name
+    setup = parse_model(parsed_info["name"] + ".gguf")
+    return {**setup, **parsed_info}
+
+
+def create_load_table(pattern="../job_results/Meta-Llama-3.1-*B/load_performance/*.out") -> pd.DataFrame:
+    files = sorted(glob.glob(pattern))
+    records = ingest(files, parse_file_load, "load_performance", PARSER_VERSION)
+    df = pd.DataFrame(list(records.values()))
+    if df.empty:
+        return df
+    configs = ConfigRegistry()
+    df["config_id"] = configs.assign(df)
+    configs.save()
+    write_table(df, "load_performance")
+    return df
+
+
+def summarize(df) -> pd.DataFrame:
+    """Median and number of runs of the METRICS per configuration, mmap and cache."""
+    metrics = [metric for metric in METRICS if metric in df.columns]
+    grouped = df.groupby(SUMMARY_COLUMNS, observed=True, dropna=False)
+    summary = grouped[metrics].median()
+    summary["runs"] = grouped.size()
+    return summary.reset_index()
+
+
+def compare(summary, metrics=("time_to_first_token", "load_time", "max_rss_mib", "major_faults")) -> pd.DataFrame:
+    """
+    Ratio of every metric of the ZFP configurations to each baseline of BASELINES with
+    the same model, mmap and cache state.
+    """
+    keys = ["llama_version", "num_parameter", "mmap", "cache"]
+    metrics = list(metrics)
+    candidates = summary[~summary["quant_type"].isin(BASELINES)]
+    baselines = summary[summary["quant_type"].isin(BASELINES)][keys + ["quant_type"] + metrics]
+    baselines = baselines.rename(columns={"quant_type": "baseline", **{m: f"{m}_baseline" for m in metrics}})
+
+    merged = candidates[keys + ["config_id", "model_name"] + metrics].merge(baselines, on=keys)
+    for metric in metrics:
+        merged[f"{metric}_ratio"] = merged[metric] / merged[f"{metric}_baseline"]
+    return merged
+
+
+if __name__ == "__main__":
+    df = create_load_table(*sys.argv[1:2])
+    if df.empty:
+        raise SystemExit("No load results found")
+    summary = summarize(df)
+    write_table(summary, "load_summary")
+    comparison = compare(summary)
+    if not comparison.empty:
+        write_table(comparison, "load_comparison")
+
+    pivot = summary.pivot_table(index="model_name", columns=["mmap", "cache"], values="time_to_first_token",
+                                observed=True)
+    print("Median time to first token [ms]")
+    print(pivot.round(1).to_string())
@@ -1,144 +1,139 @@
 import glob
-
-import pandas as pd
-import glob
+import mmap
 import os
-from pathlib import Path
-# Patterns for capturing layer statistics
 import re
-import math
-
-layer_pattern = re.compile(
-    r'(\S+)\s+: rmse ([\d\.eE+-]+), maxerr ([\d\.eE+-]+), 95pct<([\d\.eE+-]+), median<([\d\.eE+-]+)')
-histogram_bin_pattern = re.compile(r'\[([\d\.]+), ([\d\.inf]+)\):\s+(\d+)')
-
-
-def parse_filename(filename):
-    stem = Path(filename).stem
-    parts = stem.split('_')
+import sys
 
-    model = parts[0]
-    idx = 1
-
-    compression_type = None
-    param_min = None
-    param_max = None
-
-    if parts[idx] == 'from':
-        compression_type = parts[idx + 1].split('-')[1]
-        param_min, param_max = parts[idx + 2].split('-')
-        idx += 3
+import numpy as np
+import pandas as pd
 
-    quantization = parts[idx]
-    idx += 1
+from config_registry import ConfigRegistry
+from histograms import HistogramSet
+from ingest import ingest
+from model_parser import parse_model
+from perplexity_log import HellaswagTracker, PerplexityTracker
+from profiling import profiled, span
+from result_store import write_table
 
-    imat = parts[idx]
-    idx += 1
+# Bump whenever the parsers change, cached records of older versions are discarded
+PARSER_VERSION = 4
 
-    dim = None
-    if idx < len(parts) and parts[idx].startswith('dim'):
-        dim = parts[idx].split('dim')[1]
+# Layer statistics and histogram bins in one pattern, so a comparison log is scanned once.
+# Histogram bins belong to the layer line above them.
+tf_difference_pattern = re.compile(
+    rb'^(?:(?P<layer>\S+)\s+: rmse (?P<rmse>[\d\.eE+-]+), maxerr (?P<maxerr>[\d\.eE+-]+), '
+    rb'95pct<(?P<pct95>[\d\.eE+-]+), median<(?P<median>[\d\.eE+-]+)'
+    rb'|[ \t]*\[(?P<bin_start>[\d\.eE+-]+), (?P<bin_end>[\d\.eE+-]+|inf)\):\s+(?P<count>\d+))',
+    re.MULTILINE)
 
-    return {
-        'model': model,
-        'compression_type': compression_type,
-        'param_min': param_min,
-        'param_max': param_max,
-        'quantization': quantization,
-        'imat': imat,
-        'dim': dim
-    }
+STAT_COLUMNS = ['rmse', 'maxerr', '95pct', 'median']
+SETUP_COLUMNS = ['llama_version', 'num_parameter', 'processing_type', 'quant_type', 'dim',
+                 'threshold_low', 'threshold_high', 'imat', 'model_name']
 
 
-def parse_model(filename: str):
+def scan_tf_difference(buffer):
     """
-    Meta-Llama-3.1-8B-F16_Q4_1_no_imat
-    Meta-Llama-3.1-8B-F16_from_ZFP-acc_0.01-0.13_wi_imat_dim_1
-    """
-
-    modelname = Path(filename).stem
-
-    model_name = modelname.strip().removeprefix("Meta-Llama-")
-
-    llama_version = model_name.split("-", 1)[0]  # 3
-    num_parameter = model_name.split("-", 2)[1]  # 8B
-    try:
-        processing_type, source_type = model_name.split("-", 2)[2].split("@", 1)
-    except ValueError:
-        processing_type =  source_type = model_name.split("-", 2)[2].split("@", 1)[0]
-
-    if "ZFP" in source_type:
-        source_type_tmp = source_type[3:]
-        quant_type = source_type_tmp[:4]
+    Single pass over the output of llama-compare-tensors --per-layer-stats --histogram.
 
-        source_type_tmp2 = source_type_tmp[4:].split("_", 1)[0]
-        threshold_low, threshold_high = source_type_tmp2.split(":")
-
-        imat_tmp = source_type_tmp.split("_")[-1]
-        dim = source_type_tmp.split("_")[-2]
-    else:
-        dim = None
-        threshold_low = None
-        threshold_high = None
-
-        quant_type, imat_tmp = source_type.split("+")
+    Returns (layer_names, stats, edges, counts):
+        layer_names: array of n layer names
+        stats:       (n, 4) array of rmse, maxerr, 95pct and median
+        edges:       bin edges shared by all layers, None without histograms
+        counts:      (n, bins) array of histogram counts, None without histograms
+    """
+    layer_names = []
+    stats = []
+    edges = None
+    counts = {}
+    bins = []
+
+    def close_layer():
+        nonlocal edges
+        if not bins:
+            return
+        layer_edges = [b[0] for b in bins] + [bins[-1][1]]
+        if edges is None:
+            edges = layer_edges
+        elif layer_edges != edges:
+            raise ValueError(f"Histogram of layer {layer_names[-1]} uses different bin edges")
+        counts[len(layer_names) - 1] = [b[2] for b in bins]
+        bins.clear()
+
+    for match in tf_difference_pattern.finditer(buffer):
+        layer = match.group('layer')
+        if layer is not None:
+            close_layer()
+            layer_names.append(layer.decode())
+            stats.append([float(v) for v in match.group('rmse', 'maxerr', 'pct95', 'median')])
+        elif layer_names:
+            bins.append((float(match.group('bin_start')), float(match.group('bin_end')), int(match.group('count'))))
+    close_layer()
+
+    if edges is None:
+        return layer_names_array(layer_names), stats_array(stats), None, None
+
+    # Layers printed without histogram keep zero counts
+    counts_matrix = np.zeros((len(layer_names), len(edges) - 1), dtype=np.int64)
+    for index, layer_counts in counts.items():
+        counts_matrix[index] = layer_counts
+
+    return layer_names_array(layer_names), stats_array(stats), np.array(edges, dtype=np.float64), counts_matrix
+
+def layer_names_array(layer_names):
+    return np.array(layer_names, dtype=str)
+
+def stats_array(stats):
+    return np.array(stats, dtype=np.float64).reshape(-1, len(STAT_COLUMNS))
 
-    if imat_tmp == "NOI":
-        imat = False
-    elif imat_tmp == "WII":
-        imat = True
-    else:
-        raise ValueError(f"Imhat has wrong value: {imat}")
+def parse_file_tf_difference(filename):
+    setup = parse_model(filename)
 
-    print(
-        f"{model_name=} {llama_version=} {num_parameter=} {processing_type=} {quant_type=} {dim=} {threshold_low=} {threshold_high=} {imat=}")
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap cannot map empty files
+            parsed = scan_tf_difference(b'')
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                parsed = scan_tf_difference(buffer)
+    layer_names, stats, edges, counts = parsed
 
     return {
-        "model_name": model_name,
-        "llama_version": llama_version,
-        "num_parameter": num_parameter,
-        "processing_type": processing_type,
-        "quant_type": quant_type,
-        "dim": dim,
-        "threshold_low": threshold_low,
-        "threshold_high": threshold_high,
-        "imat": imat
+        **setup,
+        'layer': layer_names,
+        'stats': stats,
+        'histogram_edges': edges,
+        'histogram_counts': counts,
     }
 
-def parse_file_tf_difference(filename):
-    with open(filename, 'r') as f:
-        lines = f.readlines()
-
-    setup = parse_model(filename)
-
-    layers_data = []
-    current_layer = None
-
-    for line in lines:
-        layer_match = layer_pattern.match(line)
-        if layer_match:
-            current_layer = {
-                'layer': layer_match.group(1),
-                'rmse': float(layer_match.group(2)),
-                'maxerr': float(layer_match.group(3)),
-                '95pct': float(layer_match.group(4)),
-                'median': float(layer_match.group(5)),
-            }
-            layers_data.append(current_layer)
-    return {**setup, 'layers': layers_data}
+@profiled("normalize")
+def tf_difference_table(records):
+    """Per-layer statistics of all parsed comparison logs as one DataFrame."""
+    frames = []
+    for record in records:
+        frame = pd.DataFrame(record['stats'], columns=STAT_COLUMNS)
+        frame.insert(0, 'layer', record['layer'])
+        for key in SETUP_COLUMNS:
+            frame[key] = record[key]
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=['layer', *STAT_COLUMNS, *SETUP_COLUMNS])
+    return pd.concat(frames, ignore_index=True)
+
+def tf_difference_histograms(records):
+    """Per-layer histograms of all parsed comparison logs as a HistogramSet."""
+    return HistogramSet.from_records(
+        (record['model_name'], layer, record['histogram_edges'], counts)
+        for record in records if record['histogram_counts'] is not None
+        for layer, counts in zip(record['layer'], record['histogram_counts'])
+    )
 
 def process_all_files_tf_difference(pattern="*.out"):
-    files = glob.glob(pattern)
-    results = []
-    for filename in files:
-        try:
-            data = parse_file_tf_difference(filename)
-            data['filename'] = filename
-            results.append(data)
-        except Exception as e:
-            print(f"Error processing {filename}: {e}")
+    with span("tf_difference", "discover", pattern=pattern):
+        files = sorted(glob.glob(pattern))
+    records = ingest(files, parse_file_tf_difference, "tensor_comparison", PARSER_VERSION)
 
-    return results
+    return [{**data, 'filename': filename} for filename, data in records.items()]
 
 def parse_file_quantization(filename):
     def convert_value(s):
@@ -196,7 +191,6 @@ def parse_file_quantization(filename):
     setup = parse_model(filename)
 
     #layers_data = []
-    current_layer = None
     # Parse the line
     parsed = parse_line(lines[0])
 
@@ -214,108 +208,99 @@ def parse_file_quantization(filename):
     return {**setup, **layers_data}
 
 def process_all_files_quantization(pattern="*.out"):
-    files = glob.glob(pattern)
-    results = []
-    for filename in files:
-        try:
-            data = parse_file_quantization(filename)
-            data['filename'] = filename
-            results.append(data)
-        except Exception as e:
-            print(f"Error processing {filename}: {e}")
+    with span("quantization", "discover", pattern=pattern):
+        files = sorted(glob.glob(pattern))
+    records = ingest(files, parse_file_quantization, "quantization", PARSER_VERSION)
 
-    return results
+    return [{**data, 'filename': filename} for filename, data in records.items()]
 
-# ToDo. Extrace PPL + Hellaswag Values
 def parse_file_model_performance(filename):
+    setup = parse_model(f"{filename}.ppl")
+
+    ppl = PerplexityTracker(f"{filename}.ppl")
+    ppl.update()
+
+    hellaswag = HellaswagTracker(f"{filename}.hellaswag")
+    hellaswag.update()
+
+    return {
+        **setup,
+        "ppl": ppl.final,
+        "hellaswag": hellaswag.final,
+        "ppl_curve": ppl.curve,
+        "hellaswag_curve": hellaswag.curve,
+    }
+
+def model_performance_sources(filename):
+    return [f"{filename}.ppl", f"{filename}.hellaswag"]
 
-    def parse_ppl(lines: list[str]) -> float | None:
-        for line in lines:
-            if "- ETA" in line:
-                try:
-                    return_value = float(line.split("=")[1].split("+")[0])
-                except:
-                    return_value = None
-                return return_value
-        return None
-    def parse_hellaswag(lines: list[str]) -> float | None :
-        for line in lines:
-            if line.startswith("4000"):
-                return float(line.split()[-1])
-        return None
-
-
-    data={}
-    endings = ["ppl", "hellaswag"]
-    for end in endings:
-        source_file = f"{filename}.{end}"
-        with open(source_file, 'r') as f:
-            lines = f.readlines()
-
-            setup = parse_model(source_file)
-            if source_file.endswith(".ppl"):
-                value = parse_ppl(lines)
-                data["ppl"] = value
-
-            if source_file.endswith(".hellaswag"):
-                value = parse_hellaswag(lines)
-                data["hellaswag"] = value
-
-    return {**setup, **data}
 def process_all_files_model_performance(pattern="*.out"):
-    files = glob.glob(pattern)
+    with span("model_performance", "discover", pattern=pattern):
+        files = glob.glob(pattern)
 
     files = [".".join(f.split(".")[:-1]) for f in files]
     files = sorted((set(files)))
-    results = []
-    for filename in files:
-        try:
-            data = parse_file_model_performance(filename)
-            data['filename'] = filename
-            results.append(data)
-        except Exception as e:
-            print(f"Error processing {filename}: {e}")
+    records = ingest(files, parse_file_model_performance, "model_performance", PARSER_VERSION,
+                     sources=model_performance_sources)
 
-    return results
+    return [{**data, 'filename': filename} for filename, data in records.items()]
 
-if __name__ == "__main__":
-    # Example usage:
-    if True:
-        search_dir = "../job_results/Meta-Llama-3.1-*B/tensor_comparison/"
-        # Example usage:
-        data1 = process_all_files_tf_difference(f"{search_dir}*.out")
-
-        # Convert to DataFrame for summary
-        df_pointwise_difference = pd.json_normalize(data1, 'layers',
-                               ['llama_version', 'num_parameter', 'processing_type', 'quant_type', 'dim', 'threshold_low',
-                                'threshold_high', 'imat', 'model_name'], errors='ignore')
-        df_pointwise_difference = df_pointwise_difference[df_pointwise_difference["layer"] == "global"]
-        df_pointwise_difference["model_name"] = df_pointwise_difference["model_name"].str.replace("F16@", "", regex=False)
-
-    if True:
-        search_dir = "../job_results/Meta-Llama-3.1-*B/quantization/"
-        data2 = process_all_files_quantization(f"{search_dir}*.out")
-        df_quantization = pd.DataFrame(data2)
-
-
-    if True:
-        search_dir = "../job_results/Meta-Llama-3.1-*B/model_performance/*"
-        data3 = process_all_files_model_performance(f"{search_dir}")
-        df_model_performance = pd.DataFrame(data3)
-        df_model_performance["model_name"] = df_model_performance["model_name"].str.replace("F16@", "",
-                                                                                                  regex=False)
-
-
-    merged_df1 = pd.merge(df_pointwise_difference, df_quantization[["model_name","n_elements","bits_per_weight","size"]], on="model_name", how="outer")
-    merged_df2 = pd.merge(merged_df1, df_model_performance[["model_name","ppl","hellaswag"]], on="model_name", how="outer")
-    # Save full summary to CSV
-    merged_df2.to_csv("all_data.csv", index=False)
-
-    # Create second DataFrame without histogram column
-    # df_no_hist = df.drop(columns=['histogram'])
-    # df_no_hist = df_no_hist[df_no_hist['layer'] == 'global']
-    # print(df_no_hist)
-    #
-    # # Save second summary to CSV
-    # df_no_hist.to_csv("summary_no_histogram.csv", index=False)
+def tf_difference_records(model_dirs="../job_results/Meta-Llama-3.1-*B"):
+    """Parsed comparison logs of model_dirs, named like the weights they compare (without "F16@")."""
+    records = process_all_files_tf_difference(f"{model_dirs}/tensor_comparison/*.out")
+    for record in records:
+        record["model_name"] = record["model_name"].replace("F16@", "")
+    return records
 
+def merge_results(model_dirs="../job_results/Meta-Llama-3.1-*B"):
+    """
+    Parses and merges the results of all models matching model_dirs. The per-layer
+    table, the histograms and the merged table are written to the result store; without
+    any results the merged table is returned empty and not written.
+    """
+    configs = ConfigRegistry()
+    data1 = tf_difference_records(model_dirs)
+
+    # Convert to DataFrame for summary, all layers are kept in their own table
+    df_per_layer = tf_difference_table(data1)
+    df_per_layer["config_id"] = configs.assign(df_per_layer)
+    write_table(df_per_layer, "tensor_comparison")
+    if any(record['histogram_counts'] is not None for record in data1):
+        with span("histograms", "write"):
+            tf_difference_histograms(data1).save("histograms.npz")
+
+    df_pointwise_difference = df_per_layer[df_per_layer["layer"] == "global"]
+
+    data2 = process_all_files_quantization(f"{model_dirs}/quantization/*.out")
+    with span("quantization", "normalize"):
+        df_quantization = pd.DataFrame(data2, columns=SETUP_COLUMNS + ["n_elements", "bits_per_weight", "size"])
+        df_quantization["config_id"] = configs.assign(df_quantization)
+
+    data3 = process_all_files_model_performance(f"{model_dirs}/model_performance/*")
+    with span("model_performance", "normalize"):
+        df_model_performance = pd.DataFrame(data3, columns=SETUP_COLUMNS + ["ppl", "hellaswag"])
+        df_model_performance["model_name"] = df_model_performance["model_name"].str.replace("F16@", "", regex=False)
+        df_model_performance["config_id"] = configs.assign(df_model_performance)
+    configs.save()
+
+    columns = [*df_pointwise_difference.columns, "n_elements", "bits_per_weight", "size", "ppl", "hellaswag"]
+    frames = [frame for frame in [df_pointwise_difference, df_quantization, df_model_performance] if not frame.empty]
+    if not frames:
+        print(f"No results below {model_dirs}, all_data is not written")
+        return pd.DataFrame(columns=columns)
+
+    with span("all_data", "merge"):
+        # Configurations missing in the tensor comparison still get their setup columns from the others
+        setups = pd.concat([frame[SETUP_COLUMNS + ["config_id"]] for frame in frames])
+        setups = setups.drop_duplicates("config_id")
+        merged_df1 = pd.merge(setups, df_pointwise_difference.drop(columns=SETUP_COLUMNS), on="config_id", how="left")
+        merged_df1 = pd.merge(merged_df1, df_quantization[["config_id","n_elements","bits_per_weight","size"]], on="config_id", how="left")
+        merged_df2 = pd.merge(merged_df1, df_model_performance[["config_id","ppl","hellaswag"]], on="config_id", how="left")
+        merged_df2 = merged_df2[columns]
+    # Save full summary to the result store
+    write_table(merged_df2, "all_data")
+
+    return merged_df2
+
+if __name__ == "__main__":
+    merge_results(*sys.argv[1:2])
@@ -0,0 +1,74 @@
+"""
+Parser for the model names used throughout job_results.
+
+    Meta-Llama-3.1-8B-ZFPrate4.00:4.00_3+NOI        ZFP compressed
+    Meta-Llama-3.1-8B-F16@ZFPrate4.00:4.00_3+NOI    ZFP compressed, converted back to F16
+    Meta-Llama-3.1-8B-Q4_K_M+WII                    built-in quantization
+    Meta-Llama-3.1-8B-F16@Q4_K_M+WII                built-in quantization, converted back to F16
+
+Older results use "_" instead of "+" in front of the importance matrix tag
+(e.g. ZFPaccu0.12:0.12_4_NOI), both are accepted.
+"""
+import re
+from functools import lru_cache
+from pathlib import Path
+
+# Fields of a parsed name that identify one set of weights, the key of config_registry.
+# Results on the F16 conversion (processing_type) belong to the same configuration.
+CONFIG_COLUMNS = ["llama_version", "num_parameter", "quant_type", "dim", "threshold_low", "threshold_high", "imat"]
+
+# Result directories job_results/<model>/<category> of the evaluation scripts
+CATEGORIES = ["quantization", "tensor_comparison", "model_performance", "runtime_performance"]
+
+model_name_pattern = re.compile(
+    r'^(?:Meta-Llama-)?'
+    r'(?P<model_name>'
+    r'(?P<llama_version>[\d.]+)-(?P<num_parameter>\d+B)-'
+    r'(?:(?P<processing_type>[A-Z0-9]+)@)?'
+    r'(?:ZFP(?P<mode>rate|prec|accu)(?P<threshold_low>[\d.]+):(?P<threshold_high>[\d.]+)_(?P<dim>\d)'
+    r'|(?P<native>[A-Z0-9_]+?))'
+    r'[+_](?P<imat>NOI|WII))$'
+)
+
+
+@lru_cache(maxsize=None)
+def parse_stem(stem: str) -> dict:
+    """
+    Typed fields of a model name without file ending, e.g. "Meta-Llama-3.1-8B-F16@Q4_0+NOI".
+    The result is cached, callers must not modify it.
+    """
+    match = model_name_pattern.match(stem.strip())
+    if match is None:
+        raise ValueError(f"Unknown model name: {stem}")
+
+    mode = match.group("mode")
+
+    return {
+        "model_name": match.group("model_name"),
+        "llama_version": match.group("llama_version"),
+        "num_parameter": match.group("num_parameter"),
+        "processing_type": match.group("processing_type"),
+        "quant_type": mode if mode is not None else match.group("native"),
+        "dim": int(match.group("dim")) if mode is not None else None,
+        "threshold_low": float(match.group("threshold_low")) if mode is not None else None,
+        "threshold_high": float(match.group("threshold_high")) if mode is not None else None,
+        "imat": match.group("imat") == "WII",
+    }
+
+
+def parse_model(filename: str) -> dict:
+    """
+    Parses the model name from the stem of filename.
+
+    Returns a dict with:
+        - model_name       name without the "Meta-Llama-" prefix
+        - llama_version    "3.1"
+        - num_parameter    "8B"
+        - processing_type  type the weights were converted back to ("F16"), None if not converted
+        - quant_type       ZFP mode ("rate", "prec", "accu") or built-in type ("Q4_0")
+        - dim              ZFP dimension (int), None for built-in types
+        - threshold_low    lower ZFP parameter (float), None for built-in types
+        - threshold_high   upper ZFP parameter (float), None for built-in types
+        - imat             True if an importance matrix was used
+    """
+    return dict(parse_stem(Path(filename).stem))
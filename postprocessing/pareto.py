@@ -0,0 +1,206 @@
+"""
+Pareto fronts over the quality, size and speed of the configurations.
+
+Every objective is a column of the merged table and a direction: bits_per_weight,
+size and ppl are minimised, hellaswag and the decode throughput at a chosen
+ncore are maximised. Fronts are computed per model (llama_version,
+num_parameter), rows missing one of the objectives are left out.
+
+The dominance test is vectorised. Points are visited in lexicographic order, in
+which every dominating point comes before the points it dominates, and each
+chunk is compared against the front found so far. This takes O(n * front size)
+comparisons, not O(n^2). An epsilon-front also keeps the configurations that are
+within epsilon (in units of the objective) of being non-dominated.
+
+    python pareto.py [ncore, default 96]   # writes the pareto and pareto_runtime tables and *_pareto.pdf overlays
+"""
+import sys
+
+import numpy as np
+
+from model_parser import CONFIG_COLUMNS
+from query import ResultSet
+from result_store import apply_filters, load_table, write_table
+
+QUALITY_OBJECTIVES = {"bits_per_weight": "min", "size": "min", "ppl": "min", "hellaswag": "max"}
+RUNTIME_OBJECTIVES = {**QUALITY_OBJECTIVES, "eval_throughput": "max"}
+
+MODEL_COLUMNS = ["llama_version", "num_parameter"]
+
+# Upper bound of the boolean comparison array per chunk
+CHUNK_ELEMENTS = 1 << 22
+
+PARETO_SPEC = {
+    "columns": CONFIG_COLUMNS + ["model_name", "size", "size_gib", "color_group", "bits_per_weight", "ppl", "hellaswag"],
+    "filters": [("quant_type", "!=", "BF16")],
+}
+
+
+def objective_matrix(df, objectives):
+    """(n, k) float array of the objectives, oriented so that smaller is better."""
+    columns = []
+    for column, direction in objectives.items():
+        if direction not in ("min", "max"):
+            raise ValueError(f"Unknown direction {direction!r} of objective {column}")
+        values = df[column].astype("float64").to_numpy(na_value=np.nan)
+        columns.append(values if direction == "min" else -values)
+    return np.column_stack(columns) if columns else np.empty((len(df), 0))
+
+
+def epsilon_vector(objectives, epsilon):
+    """Per objective epsilon from a scalar, a dict {objective: epsilon} or None."""
+    if epsilon is None:
+        return np.zeros(len(objectives))
+    if isinstance(epsilon, dict):
+        return np.array([float(epsilon.get(column, 0.0)) for column in objectives])
+    return np.full(len(objectives), float(epsilon))
+
+
+def dominated_by(candidates, points, epsilon):
+    """True for every row of candidates that is dominated by a row of points, after shifting points by epsilon."""
+    result = np.zeros(len(candidates), dtype=bool)
+    if len(points) == 0 or len(candidates) == 0:
+        return result
+
+    shifted = points + epsilon
+    step = max(1, CHUNK_ELEMENTS // max(1, shifted.size))
+    for start in range(0, len(candidates), step):
+        block = candidates[start:start + step, None, :]
+        no_worse = (shifted[None] <= block).all(axis=2)
+        better = (shifted[None] < block).any(axis=2)
+        result[start:start + step] = (no_worse & better).any(axis=1)
+    return result
+
+
+def non_dominated(points, epsilon=None):
+    """
+    Boolean mask of the rows of points (smaller is better, no NaN) that are not dominated
+    by any other row. With epsilon > 0 row b only counts as dominated by a if a + epsilon
+    dominates b, so near-optimal rows stay in the (epsilon-)front.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    epsilon = np.zeros(points.shape[1]) if epsilon is None else np.asarray(epsilon, dtype=np.float64)
+    mask = np.zeros(len(points), dtype=bool)
+    if len(points) == 0:
+        return mask
+
+    # A dominating point is never lexicographically larger than the point it dominates
+    order = np.lexsort(points.T[::-1])
+    step = max(1, CHUNK_ELEMENTS // max(1, points.size))
+    front = np.empty((0, points.shape[1]))
+    for start in range(0, len(points), step):
+        index = order[start:start + step]
+        block = points[index]
+        dominated = dominated_by(block, front, epsilon) | dominated_by(block, block, epsilon)
+        mask[index[~dominated]] = True
+        front = np.vstack([front, block[~dominated]])
+    return mask
+
+
+def pareto_ranks(points, max_rank=None):
+    """
+    Non-dominated sorting: rank 1 for the front, rank 2 for the front of the rest, ...
+    One vectorised pass per front. Rows beyond max_rank and rows with NaN get rank 0.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    ranks = np.zeros(len(points), dtype=np.int64)
+    remaining = np.flatnonzero(~np.isnan(points).any(axis=1))
+
+    rank = 1
+    while len(remaining) and (max_rank is None or rank <= max_rank):
+        front = non_dominated(points[remaining])
+        ranks[remaining[front]] = rank
+        remaining = remaining[~front]
+        rank += 1
+    return ranks
+
+
+def pareto_table(df, objectives=QUALITY_OBJECTIVES, epsilon=None, group_columns=MODEL_COLUMNS, max_rank=None):
+    """
+    df with the columns pareto_rank (0 if not ranked) and pareto_front, and
+    epsilon_front if epsilon is given. Ranks are computed per group_columns.
+    """
+    df = df.copy()
+    df["pareto_rank"] = 0
+    df["pareto_front"] = False
+    if epsilon is not None:
+        df["epsilon_front"] = False
+
+    group_columns = [c for c in group_columns if c in df.columns]
+    groups = df.groupby(group_columns, observed=True, dropna=False).indices.values() if group_columns else [np.arange(len(df))]
+    eps = epsilon_vector(objectives, epsilon)
+
+    for index in groups:
+        points = objective_matrix(df.iloc[index], objectives)
+        valid = ~np.isnan(points).any(axis=1)
+
+        ranks = pareto_ranks(points, max_rank)
+        df.iloc[index, df.columns.get_loc("pareto_rank")] = ranks
+        df.iloc[index, df.columns.get_loc("pareto_front")] = ranks == 1
+
+        if epsilon is not None:
+            in_front = np.zeros(len(index), dtype=bool)
+            in_front[valid] = non_dominated(points[valid], eps)
+            df.iloc[index, df.columns.get_loc("epsilon_front")] = in_front
+
+    df["pareto_rank"] = df["pareto_rank"].astype("Int64")
+    return df
+
+
+def pareto_front(df, objectives=QUALITY_OBJECTIVES, epsilon=None, group_columns=MODEL_COLUMNS):
+    """The non-dominated configurations (the epsilon-front if epsilon is given) per group."""
+    table = pareto_table(df, objectives, epsilon, group_columns, max_rank=1)
+    selected = table["epsilon_front"] if epsilon is not None else table["pareto_front"]
+    return table[selected].sort_values([c for c in group_columns if c in table.columns] + list(objectives)[:1])
+
+
+def with_throughput(df, runtimes, ncore=96):
+    """df with the median eval_throughput of its configuration at ncore threads (NaN if not measured)."""
+    config_columns = [c for c in CONFIG_COLUMNS if c in df.columns and c in runtimes.columns]
+    # Categories of the store differ between tables, plain objects are needed to join them
+    runtimes = runtimes.astype({c: object for c in config_columns if runtimes[c].dtype == "category"})
+    throughput = (runtimes[runtimes["ncore"] == ncore]
+                  .groupby(config_columns, observed=True, dropna=False)["eval_throughput"]
+                  .median()
+                  .reset_index())
+
+    categorical = [c for c in config_columns if df[c].dtype == "category"]
+    merged = df.astype({c: object for c in categorical}).merge(throughput, on=config_columns, how="left")
+    return merged.astype({c: "category" for c in categorical})
+
+
+def overlay_front(ax, front, x, y):
+    """Rings around the front configurations on an existing scatter plot of x against y."""
+    ax.scatter(front[x], front[y], s=160, facecolors="none", edgecolors="black", linewidths=1.2,
+               label="Pareto front", zorder=5)
+
+
+if __name__ == "__main__":
+    import plotting
+
+    ncore = int(sys.argv[1]) if len(sys.argv) > 1 else 96
+
+    results = ResultSet("all_data", [PARETO_SPEC, *plotting.PLOT_SPECS.values()])
+    df = results.select(PARETO_SPEC)
+
+    front = pareto_front(df)
+    write_table(front, "pareto")
+
+    runtimes = load_table("runtimes", columns=CONFIG_COLUMNS + ["ncore", "eval_throughput"])
+    runtime_front = pareto_front(with_throughput(df, runtimes, ncore), RUNTIME_OBJECTIVES)
+    write_table(runtime_front, "pareto_runtime")
+
+    # Only the front configurations that the plot itself shows are marked
+    for name, function, output in [
+        ("summary_ppl", plotting.plot_summary_ppl, "overview_8B_70B_pareto.pdf"),
+        ("zfp_8b", plotting.plot_zfp_8b, "overview_8B_pareto.pdf"),
+        ("hellaswag_imatrix", plotting.plt_8b_hellaswag_imatrix, "overview_8B_hellaswag_pareto.pdf"),
+    ]:
+        spec = plotting.PLOT_SPECS[name]
+        function(results.select(spec), output=output, front=apply_filters(front, spec["filters"]))
+
+    columns = ["model_name", "bits_per_weight", "ppl", "hellaswag"]
+    print(front[columns].to_string(index=False))
+    print()
+    print(f"Including the decode throughput at {ncore} threads:")
+    print(runtime_front[columns + ["eval_throughput"]].to_string(index=False))
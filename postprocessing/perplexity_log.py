@@ -0,0 +1,207 @@
+"""
+Streaming parsers for the llama-perplexity logs of model_performance.
+
+The trackers remember how far they have read, so calling update() on the log
+of a running SLURM job only reads what was appended since the last call:
+
+    tracker = PerplexityTracker("...+NOI.ppl")
+    tracker.update()
+    tracker.curve           # running PPL after every chunk
+    tracker.converged()     # running PPL has settled
+    tracker.final           # "Final estimate", None while the job is running
+
+Run as script to check the logs of running jobs:
+
+    python perplexity_log.py "../job_results/Meta-Llama-3.1-*B/model_performance/*.ppl" 8.0
+"""
+import glob
+import re
+import sys
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+# "[12]6.1234," is printed for every finished chunk, all on one line
+ppl_chunk_pattern = re.compile(r'\[(\d+)\](\d+\.\d+|nan|inf),')
+ppl_total_pattern = re.compile(r'calculating perplexity over (\d+) chunks')
+ppl_final_pattern = re.compile(r'Final estimate: PPL = ([\d.]+) \+/- ([\d.]+)')
+
+# "123\t85.36585366" is printed for every finished task
+hellaswag_task_pattern = re.compile(r'^(\d+)\t+([\d.]+)[^\n]*\n', re.MULTILINE)
+
+# Default of HELLASWAG_NTASK in 15_evaluate_model_performance.sh
+HELLASWAG_NTASK = 4000
+
+
+class StreamingLog(ABC):
+    """Base class reading the text appended to a growing file since the last update()."""
+
+    # Unmatched text kept for the next update, a token can be split between two reads
+    max_pending = 256
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.offset = 0
+        self.pending = ""
+
+    def reset(self):
+        self.offset = 0
+        self.pending = ""
+
+    def read_new_text(self) -> str:
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(0, 2)
+                size = f.tell()
+                if size < self.offset:
+                    # The log was truncated, e.g. by a requeued job
+                    self.reset()
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return ""
+
+        self.offset += len(data)
+        return data.decode(errors="replace")
+
+    def scan(self, pattern):
+        """Matches of pattern in the pending and new text."""
+        text = self.pending + self.read_new_text()
+        matches = list(pattern.finditer(text))
+
+        end = matches[-1].end() if matches else 0
+        self.pending = text[max(end, len(text) - self.max_pending):]
+        return matches, text
+
+    @abstractmethod
+    def update(self) -> int:
+        """Reads the new part of the log, returns the number of new values since the last update (or truncation)."""
+
+
+class PerplexityTracker(StreamingLog):
+    def __init__(self, path):
+        super().__init__(path)
+        self.chunks = []
+        self.n_chunks = None
+        self.final = None
+        self.final_error = None
+
+    def reset(self):
+        super().reset()
+        self.chunks = []
+        self.n_chunks = None
+        self.final = None
+        self.final_error = None
+
+    def update(self) -> int:
+        """Reads the new part of the log, returns the number of new chunks."""
+        # Counted after scan(), a truncated log resets the chunks while reading
+        matches, text = self.scan(ppl_chunk_pattern)
+        before = len(self.chunks)
+        for match in matches:
+            self.chunks.append(float(match.group(2)))
+
+        # Header and footer appear once, the pending text covers lines split between reads
+        if self.n_chunks is None:
+            total = ppl_total_pattern.search(text)
+            if total:
+                self.n_chunks = int(total.group(1))
+        final = ppl_final_pattern.search(text)
+        if final:
+            self.final = float(final.group(1))
+            self.final_error = float(final.group(2))
+
+        return len(self.chunks) - before
+
+    @property
+    def curve(self):
+        """Running PPL after every chunk."""
+        return np.array(self.chunks, dtype=np.float64)
+
+    @property
+    def current(self):
+        return self.chunks[-1] if self.chunks else None
+
+    @property
+    def finished(self) -> bool:
+        return self.final is not None
+
+    def converged(self, window=20, rtol=1e-3) -> bool:
+        """True once the running PPL of the last window chunks stays within rtol."""
+        if self.finished:
+            return True
+        if len(self.chunks) < window:
+            return False
+        tail = self.curve[-window:]
+        return bool((tail.max() - tail.min()) <= rtol * tail[-1])
+
+    def hopeless(self, ppl_limit, min_chunks=20, margin=0.05) -> bool:
+        """
+        True if the running PPL exceeds ppl_limit by more than margin after min_chunks,
+        the final PPL of such a run will not get below the limit.
+        """
+        if len(self.chunks) < min_chunks:
+            return False
+        return self.current > ppl_limit * (1 + margin)
+
+
+class HellaswagTracker(StreamingLog):
+    def __init__(self, path, n_tasks=HELLASWAG_NTASK):
+        super().__init__(path)
+        self.n_tasks = n_tasks
+        self.tasks = []
+        self.accuracy = []
+
+    def reset(self):
+        super().reset()
+        self.tasks = []
+        self.accuracy = []
+
+    def update(self) -> int:
+        """Reads the new part of the log, returns the number of new tasks."""
+        matches, _ = self.scan(hellaswag_task_pattern)
+        before = len(self.tasks)
+        for match in matches:
+            self.tasks.append(int(match.group(1)))
+            self.accuracy.append(float(match.group(2)))
+        return len(self.tasks) - before
+
+    @property
+    def curve(self):
+        """Running accuracy [%] after every task."""
+        return np.array(self.accuracy, dtype=np.float64)
+
+    @property
+    def current(self):
+        return self.accuracy[-1] if self.accuracy else None
+
+    @property
+    def finished(self) -> bool:
+        return bool(self.tasks) and self.tasks[-1] >= self.n_tasks
+
+    @property
+    def final(self):
+        """Accuracy after n_tasks tasks."""
+        if not self.finished:
+            return None
+        return self.accuracy[self.tasks.index(self.n_tasks)] if self.n_tasks in self.tasks else self.accuracy[-1]
+
+
+def print_status(pattern, ppl_limit=None):
+    for path in sorted(glob.glob(pattern)):
+        tracker = PerplexityTracker(path)
+        tracker.update()
+
+        state = "finished" if tracker.finished else "converged" if tracker.converged() else "running"
+        if ppl_limit is not None and not tracker.finished and tracker.hopeless(ppl_limit):
+            state = f"HOPELESS (scancel --name={Path(path).stem})"
+
+        total = tracker.n_chunks if tracker.n_chunks is not None else "?"
+        print(f"{Path(path).stem}: {len(tracker.chunks)}/{total} chunks, PPL {tracker.current}, {state}")
+
+
+if __name__ == "__main__":
+    pattern = sys.argv[1] if len(sys.argv) > 1 else "../job_results/Meta-Llama-3.1-*B/model_performance/*.ppl"
+    ppl_limit = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    print_status(pattern, ppl_limit)
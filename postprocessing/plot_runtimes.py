@@ -1,13 +1,23 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
 import numpy as np
-plt.style.use("default")
-plt.rcParams.update({'figure.facecolor': 'white','axes.facecolor': 'white'})
-plt.rc('font', family='serif')
-plt.rcParams["font.serif"] = ["Times New Roman", "DejaVu Serif", "Bitstream Vera Serif"]
 
-df = pd.read_csv("runtimes.csv")
+from query import ResultSet
+from scaling import ideal_scaling
+from style import apply_style
+
+# Built-in quant types and ZFP rates shown in the plots, the runtime plot only shows ZFP dim 3
+SHOWN_QUANT_TYPES = ["Q4_0", "Q6_K", "Q8_0"]
+SHOWN_RATES = [4.0, 8.0]
+SHOWN_DIMS = [3]
+
+# "group" is derived by the ResultSet: "rate_{dim}_{threshold_low}_{threshold_high}" for ZFP rate, else quant_type
+RUNTIME_SPEC = {
+    "columns": ["group", "quant_type", "dim", "threshold_low", "ncore",
+                "prompt_eval_throughput", "eval_throughput", "eval_time"],
+    "filters": [("num_parameter", "==", "8B")],
+}
+
 patterns = ['//', '\\\\', '///', '\\\\\\','/','\\']
 # # --- 1a. Create a new grouping column.
 # # For rows with quant_type "rate", concatenate quant_type, dim, threshold_low, threshold_high.
@@ -101,205 +111,157 @@ patterns = ['//', '\\\\', '///', '\\\\\\','/','\\']
 # plt.show()
 
 
-# -------------------------------
-# 1a. Create a new "group" column.
-def create_group(row):
-    if row["quant_type"].strip().lower() == "rate":
-        return f"{row['quant_type']}_{row['dim']}_{row['threshold_low']}_{row['threshold_high']}"
-    else:
-        return row["quant_type"]
-
-df["group"] = df.apply(create_group, axis=1)
-
 # (Optional) if you wish to rename groups for better presentation, you can define a dictionary.
+# dim is an integer column in the result store, the thresholds are floats.
 rename_dict = {
     "rate": "ZFP-Rate",
-    "rate_2.0_4.0_4.0": "Rate:4-Block:16",
-    "rate_2.0_8.0_8.0": "Rate:8-Block:16",
-    "rate_3.0_4.0_4.0": "Rate:4-Block:64",
-    "rate_3.0_8.0_8.0": "Rate:8-Block:64",
-    "rate_4.0_4.0_4.0": "Rate:4-Block:256",
-    "rate_4.0_8.0_8.0": "Rate:8-Block:256",
+    "rate_2_4.0_4.0": "Rate:4-Block:16",
+    "rate_2_8.0_8.0": "Rate:8-Block:16",
+    "rate_3_4.0_4.0": "Rate:4-Block:64",
+    "rate_3_8.0_8.0": "Rate:8-Block:64",
+    "rate_4_4.0_4.0": "Rate:4-Block:256",
+    "rate_4_8.0_8.0": "Rate:8-Block:256",
 }
-# You can apply renaming after aggregation if needed.
-
-# -------------------------------
-# 2. Compute aggregated throughput statistics by group.
-throughput_stats = df[df["ncore"]==96]
-throughput_stats = throughput_stats.groupby(["group","threshold_low"],dropna=False).agg(
-    prompt_median=("prompt_eval_throughput", "median"),
-    prompt_min=("prompt_eval_throughput", "min"),
-    prompt_max=("prompt_eval_throughput", "max"),
-    eval_median=("eval_throughput", "median"),
-    eval_min=("eval_throughput", "min"),
-    eval_max=("eval_throughput", "max")
-).reset_index()
-
-
-
-# Compute error bars: lower error = median - min, upper error = max - median.
-throughput_stats["prompt_err_low"] = throughput_stats["prompt_median"] - throughput_stats["prompt_min"]
-throughput_stats["prompt_err_high"] = throughput_stats["prompt_max"] - throughput_stats["prompt_median"]
-throughput_stats["eval_err_low"]   = throughput_stats["eval_median"] - throughput_stats["eval_min"]
-throughput_stats["eval_err_high"]  = throughput_stats["eval_max"] - throughput_stats["eval_median"]
-
-# (Optional) Rename the group names using our rename_dict.
-throughput_stats["group"] = throughput_stats["group"].replace(rename_dict)
-throughput_stats = throughput_stats[
-    (
-        ( throughput_stats["group"] == "Q4_0" )
-        | ( throughput_stats["group"] == "Q4_0" )
-        #| ( throughput_stats["group"] == "Q4_1" )
-        #| ( throughput_stats["group"] == "Q4_K_M" )
-        | ( throughput_stats["group"] == "Q6_K" )
-        | ( throughput_stats["group"] == "Q8_0" )
-        | (
-                (throughput_stats["threshold_low"] == 4.0 )
-                |(throughput_stats["threshold_low"] == 8.0 )
-          )
-    )
-]
-# -------------------------------
-# 3. Compute aggregated runtime statistics by group and ncore.
-runtime_stats = df.groupby(["group", "ncore","quant_type","dim","threshold_low"],dropna=False).agg(
-    eval_time_median=("eval_time", "median"),
-    eval_time_min=("eval_time", "min"),
-    eval_time_max=("eval_time", "max")
-).reset_index()
-
-runtime_stats["time_err_low"] = runtime_stats["eval_time_median"] - runtime_stats["eval_time_min"]
-runtime_stats["time_err_high"] = runtime_stats["eval_time_max"] - runtime_stats["eval_time_median"]
-
-# If desired, rename the "group" values in runtime_stats as well.
-runtime_stats["group"] = runtime_stats["group"].replace(rename_dict)
-
-# -------------------------------
-# 4. Plot: Throughput (prompt and eval) as a grouped bar plot.
-fig, ax = plt.subplots(figsize=(5.5, 4.5), dpi=250)#fig, ax = plt.subplots(figsize=(12, 6))
-x = np.arange(len(throughput_stats))
-width = 0.35
-
-ax.bar(x - width/2, throughput_stats["prompt_median"], width,
-       #yerr=[throughput_stats["prompt_err_low"], throughput_stats["prompt_err_high"]],
-       capsize=5, label="Prefill Throughput", alpha=0.7, hatch="///")
-ax.bar(x + width/2, throughput_stats["eval_median"], width,
-       #yerr=[throughput_stats["eval_err_low"], throughput_stats["eval_err_high"]],
-       capsize=5, label="Decode Throughput", alpha=0.7, hatch="\\\\\\")
-
-
-ax.set_xticks(x)
-ax.set_xticklabels(throughput_stats["group"], rotation=30, ha="right")
-ax.set_xlabel("Quantization Type")
-ax.set_ylabel("Throughput [token/s]")
-ax.set_yscale('log')
-ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, pos: f"{x:g}"))
-ax.set_yticks([0.1,1,10,100])
-
-ax.set_title("Throughput Llama-3.1-8B (96 Threads)")
-ax.legend()
-ax.grid(True, linestyle='--', linewidth=0.5)
-plt.tight_layout()
-#plt.show()
-plt.savefig("throughput-8B.pdf", transparent=True)
-plt.close()
-# -------------------------------
-# 5. Plot: Evaluation Runtime vs ncore for each group (grouped bar plot).
-# Get sorted unique ncore values.
-ncore_values = sorted(runtime_stats["ncore"].unique())
-runtime_stats_filtered = runtime_stats[
-    (
-        (runtime_stats["group"] =="Q4_0")
-        | (runtime_stats["group"] =="Q6_K")
-        | (runtime_stats["group"] =="Q8_0")
-
-        | (
-            ((runtime_stats["threshold_low"] == 4.0 )
-            |(runtime_stats["threshold_low"] == 8.0 ))
-            & (runtime_stats["dim"] ==3)
-      )
-    )
-    #&
-   # (
-        #(runtime_stats["dim"] ==3)
-        #| (runtime_stats["dim"] =="")
-    #)
-]
-groups = runtime_stats_filtered["group"].unique()
-
-#fig, ax = plt.subplots(figsize=(12, 6))
-# fig, ax = plt.subplots(figsize=(5.5, 3.8), dpi=250)#fig, ax = plt.subplots(figsize=(12, 6))
-# bar_width = 0.15
-# # Compute offsets for each group.
-# offsets = {grp: (i - (len(groups)-1)/2) * bar_width for i, grp in enumerate(groups)}
-#
-# for pattern, grp in zip(patterns,groups):
-#
-#     sub = runtime_stats_filtered[runtime_stats_filtered["group"] == grp]
-#     pos = np.array([ncore_values.index(n) for n in sub["ncore"]]) + offsets[grp]
-#     ax.bar(pos, sub["eval_time_median"]/1000, bar_width,
-#            #yerr=[sub["time_err_low"], sub["time_err_high"]],
-#            capsize=5, label=grp, alpha=0.7,hatch=pattern)
-#
-# ref_scale_x = np.arange(1, 5.05, 1/24, ) - 1 + 0.3 #np.arange(24, 96, 1) / 10
-# ref_scale_y = 24*3800/1000 / np.arange(1, 5.05, 1/24)
-# ax.plot(ref_scale_x, ref_scale_y, linestyle="-", color="k", label="Reference: linear scaling")
-#
-#
-# ax.set_yscale('log')
-# ax.set_xticks(np.arange(len(ncore_values)))
-# ax.set_xticklabels(ncore_values)
-# ax.set_xlabel("Number of Threads")
-# ax.set_yticks([x/1000 for x in [100, 200, 1000, 3000, 12000]])
-# ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, pos: f"{x:g}"))
-# ax.set_ylabel("Time per token [s]")
-# ax.set_title("Runtime per decode token for Llama-3.1-8B")
-# ax.legend(ncol=1, fontsize="small", loc='upper right')
-# ax.grid(True, linestyle='--', linewidth=0.5)
-# plt.tight_layout()
-# plt.show()
 
 
-# assume groups = ["A","B",…], patterns same length, and ncore_values = [1,2,3,4]
-ncores = np.array(ncore_values, dtype=float)
+def throughput_table(df, ncore=96):
+    """Median, min and max prefill and decode throughput per group at ncore threads."""
+    # -------------------------------
+    # 2. Compute aggregated throughput statistics by group.
+    throughput_stats = df[df["ncore"]==ncore]
+    throughput_stats = throughput_stats.groupby(["group","threshold_low"],dropna=False).agg(
+        prompt_median=("prompt_eval_throughput", "median"),
+        prompt_min=("prompt_eval_throughput", "min"),
+        prompt_max=("prompt_eval_throughput", "max"),
+        eval_median=("eval_throughput", "median"),
+        eval_min=("eval_throughput", "min"),
+        eval_max=("eval_throughput", "max")
+    ).reset_index()
 
-# set bar_width to 15% of the ncore‐spacing
-bar_width = (ncores[1] - ncores[0]) * 0.15
+    # Compute error bars: lower error = median - min, upper error = max - median.
+    throughput_stats["prompt_err_low"] = throughput_stats["prompt_median"] - throughput_stats["prompt_min"]
+    throughput_stats["prompt_err_high"] = throughput_stats["prompt_max"] - throughput_stats["prompt_median"]
+    throughput_stats["eval_err_low"]   = throughput_stats["eval_median"] - throughput_stats["eval_min"]
+    throughput_stats["eval_err_high"]  = throughput_stats["eval_max"] - throughput_stats["eval_median"]
+
+    # (Optional) Rename the group names using our rename_dict.
+    throughput_stats["group"] = throughput_stats["group"].replace(rename_dict)
+    return throughput_stats[
+        throughput_stats["group"].isin(SHOWN_QUANT_TYPES) | throughput_stats["threshold_low"].isin(SHOWN_RATES)
+    ]
+
+
+def runtime_table(df):
+    """Median, min and max time per decode token per group and ncore."""
+    # -------------------------------
+    # 3. Compute aggregated runtime statistics by group and ncore.
+    runtime_stats = df.groupby(["group", "ncore","quant_type","dim","threshold_low"],dropna=False,observed=True).agg(
+        eval_time_median=("eval_time", "median"),
+        eval_time_min=("eval_time", "min"),
+        eval_time_max=("eval_time", "max")
+    ).reset_index()
+
+    runtime_stats["time_err_low"] = runtime_stats["eval_time_median"] - runtime_stats["eval_time_min"]
+    runtime_stats["time_err_high"] = runtime_stats["eval_time_max"] - runtime_stats["eval_time_median"]
+
+    # If desired, rename the "group" values in runtime_stats as well.
+    runtime_stats["group"] = runtime_stats["group"].replace(rename_dict)
+    return runtime_stats[
+        runtime_stats["group"].isin(SHOWN_QUANT_TYPES)
+        | (runtime_stats["threshold_low"].isin(SHOWN_RATES) & runtime_stats["dim"].isin(SHOWN_DIMS))
+    ]
+
+
+def plot_throughput(df, output="throughput-8B.pdf"):
+    throughput_stats = throughput_table(df)
+
+    # -------------------------------
+    # 4. Plot: Throughput (prompt and eval) as a grouped bar plot.
+    fig, ax = plt.subplots(figsize=(5.5, 4.5), dpi=250)#fig, ax = plt.subplots(figsize=(12, 6))
+    x = np.arange(len(throughput_stats))
+    width = 0.35
+
+    ax.bar(x - width/2, throughput_stats["prompt_median"], width,
+           #yerr=[throughput_stats["prompt_err_low"], throughput_stats["prompt_err_high"]],
+           capsize=5, label="Prefill Throughput", alpha=0.7, hatch="///")
+    ax.bar(x + width/2, throughput_stats["eval_median"], width,
+           #yerr=[throughput_stats["eval_err_low"], throughput_stats["eval_err_high"]],
+           capsize=5, label="Decode Throughput", alpha=0.7, hatch="\\\\\\")
+
+
+    ax.set_xticks(x)
+    ax.set_xticklabels(throughput_stats["group"], rotation=30, ha="right")
+    ax.set_xlabel("Quantization Type")
+    ax.set_ylabel("Throughput [token/s]")
+    ax.set_yscale('log')
+    ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, pos: f"{x:g}"))
+    ax.set_yticks([0.1,1,10,100])
+
+    ax.set_title("Throughput Llama-3.1-8B (96 Threads)")
+    ax.legend()
+    ax.grid(True, linestyle='--', linewidth=0.5)
+    plt.tight_layout()
+    #plt.show()
+    plt.savefig(output, transparent=True)
+    plt.close()
+
+
+def plot_runtime_decode(df, output="runtime_decode-8B.pdf"):
+    runtime_stats_filtered = runtime_table(df)
+
+    # -------------------------------
+    # 5. Plot: Evaluation Runtime vs ncore for each group (grouped bar plot).
+    # Get sorted unique ncore values.
+    ncore_values = sorted(runtime_stats_filtered["ncore"].unique())
+    groups = runtime_stats_filtered["group"].unique()
+
+    # assume groups = ["A","B",…], patterns same length, and ncore_values = [1,2,3,4]
+    ncores = np.array(ncore_values, dtype=float)
+
+    # set bar_width to 15% of the ncore‐spacing
+    bar_width = (ncores[1] - ncores[0]) * 0.15
+
+    # compute offsets in the same units
+    offsets = {
+        grp: (i - (len(groups)-1)/2) * bar_width
+        for i, grp in enumerate(groups)
+    }
+
+    fig, ax = plt.subplots(figsize=(5.5, 3.8), dpi=250)
+
+    for pattern, grp in zip(patterns, groups):
+        sub = runtime_stats_filtered[runtime_stats_filtered["group"] == grp]
+        # use actual ncore values + offset
+        x = sub["ncore"].values + offsets[grp]
+        y = sub["eval_time_median"] / 1000
+        ax.bar(x, y, bar_width,
+               capsize=5, label=grp, alpha=0.7, hatch=pattern)
+
+    # reference line for linear scaling, starting at the slowest group at the smallest ncore
+    # here we span the same ncore range with fine sampling
+    ref_n = np.linspace(ncores.min(), ncores.max(), 100)
+    ref_time = runtime_stats_filtered.loc[runtime_stats_filtered["ncore"] == ncores.min(), "eval_time_median"].max() / 1000
+    ax.plot(ref_n, ideal_scaling(ncores.min(), ref_time, ref_n), "-", color="k", label="Reference: linear scaling")
+
+    # styling
+    ax.set_yscale('log')
+    ax.set_xticks(ncores)
+    ax.set_xticklabels(ncores.astype(int))
+    ax.set_xlabel("Number of Threads")
+    ax.set_ylabel("Time per token [s]")
+    ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, pos: f"{x:g}"))
+
+    ax.set_title("Runtime per decode token for Llama-3.1-8B")
+    ax.legend(ncol=1, fontsize="small", loc='upper right')
+    ax.grid(True, linestyle='--', linewidth=0.5)
+    plt.tight_layout()
+    #plt.show()
+    plt.savefig(output, transparent=True)
+    plt.close()
 
-# compute offsets in the same units
-offsets = {
-    grp: (i - (len(groups)-1)/2) * bar_width
-    for i, grp in enumerate(groups)
-}
 
-fig, ax = plt.subplots(figsize=(5.5, 3.8), dpi=250)
-
-for pattern, grp in zip(patterns, groups):
-    sub = runtime_stats_filtered[runtime_stats_filtered["group"] == grp]
-    # use actual ncore values + offset
-    x = sub["ncore"].values + offsets[grp]
-    y = sub["eval_time_median"] / 1000
-    ax.bar(x, y, bar_width,
-           capsize=5, label=grp, alpha=0.7, hatch=pattern)
-
-# reference line for linear scaling
-# here we span the same ncore range with fine sampling
-ref_n = np.linspace(ncores.min(), ncores.max(), 100)
-ref_scale_y = 24*(3800-500)/1000 / ref_n
-ax.plot(ref_n + 7, ref_scale_y, "-", color="k", label="Reference: linear scaling")
-
-# styling
-ax.set_yscale('log')
-ax.set_xticks(ncores)
-ax.set_xticklabels(ncores.astype(int))
-ax.set_xlabel("Number of Threads")
-ax.set_ylabel("Time per token [s]")
-ax.yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, pos: f"{x:g}"))
-
-ax.set_title("Runtime per decode token for Llama-3.1-8B")
-ax.legend(ncol=1, fontsize="small", loc='upper right')
-ax.grid(True, linestyle='--', linewidth=0.5)
-plt.tight_layout()
-#plt.show()
-
-
-plt.savefig("runtime_decode-8B.pdf", transparent=True)
+if __name__ == "__main__":
+    apply_style()
+    df = ResultSet("runtimes", [RUNTIME_SPEC]).select(RUNTIME_SPEC)
+    plot_throughput(df)
+    plot_runtime_decode(df)
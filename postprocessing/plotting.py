@@ -1,13 +1,10 @@
-import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
 import matplotlib.ticker as mticker
-import matplotlib.lines as mlines
-#plt.rcParams["font.family"] = "Times New Roman"
-plt.style.use("default")
-plt.rcParams.update({'figure.facecolor': 'white','axes.facecolor': 'white'})
-plt.rc('font', family='serif')
-plt.rcParams["font.serif"] = ["Times New Roman", "DejaVu Serif", "Bitstream Vera Serif"]
+
+from pareto import overlay_front
+from query import ResultSet
+from style import apply_style
+
 desired_order = ["accu", "prec", "rate", "built-in","native"]
 # Example color, marker, and name mappings
 
@@ -42,6 +39,30 @@ name_mapping = {
     'native': 'F16 Native'
 }
 
+# Rows and columns of all_data needed by each plot. color_group and size_gib are
+# derived once by the ResultSet, filters shared by all plots are pushed down to the scan.
+PLOT_SPECS = {
+    "summary_ppl": {
+        "columns": ["size_gib", "ppl", "color_group"],
+        "filters": [("quant_type", "!=", "BF16"), ("ppl", "<", 14)],
+    },
+    "zfp_8b": {
+        "columns": ["bits_per_weight", "ppl", "color_group"],
+        "filters": [("quant_type", "!=", "BF16"), ("ppl", "<", 8), ("num_parameter", "==", "8B"),
+                    ("imat", "==", False), ("size_gib", "<", 10)],
+    },
+    "zfp_8b_chunk": {
+        "columns": ["bits_per_weight", "ppl", "dim"],
+        "filters": [("quant_type", "!=", "BF16"), ("ppl", "<", 8), ("num_parameter", "==", "8B"),
+                    ("imat", "==", False), ("size_gib", "<", 10), ("color_group", "!=", "built-in")],
+    },
+    "hellaswag_imatrix": {
+        "columns": ["bits_per_weight", "hellaswag", "color_group", "imat"],
+        "filters": [("quant_type", "!=", "BF16"), ("hellaswag", ">", 55), ("num_parameter", "==", "8B"),
+                    ("color_group", "in", ["built-in", "rate"])],
+    },
+}
+
 label_dict = {
     "ppl": "Perplexity (n_ctx=4096,  WikiText-2)",
     "hellaswag": "HellaSwag Score [%]",
@@ -50,22 +71,7 @@ label_dict = {
 }
 
 
-def plot_summary_ppl(df):
-
-    my_df = df.copy()
-    conditions = [
-        my_df['quant_type'] == 'F16',
-        my_df['quant_type'].isin(['rate', 'accu', 'prec'])
-    ]
-    choices = ['native', my_df['quant_type']]
-    my_df['color_group'] = np.select(conditions, choices, default='built-in')
-
-    my_df["size"] = my_df["size"] / 1024
-    filtered_df = my_df[(my_df["ppl"] < 14)
-                        & (my_df["quant_type"] != "BF16")
-                        #& (my_df["imat"] == False)
-
-    ]
+def plot_summary_ppl(df, output="overview_8B_70B.pdf", front=None):
 
     fig, ax = plt.subplots(figsize=(5.5, 4.4), dpi=250)
     ax.set_xlabel("Llama-3.1 Compressed Model Size [GiB]")
@@ -75,13 +81,13 @@ def plot_summary_ppl(df):
 
     for group in desired_order:
         # Check if the group is present in the filtered data
-        if group not in filtered_df['color_group'].unique():
+        if group not in df['color_group'].unique():
             continue  # skip if the group doesn't exist
 
-        group_data = filtered_df[filtered_df["color_group"] == group]
+        group_data = df[df["color_group"] == group]
 
         ax.scatter(
-            group_data["size"],
+            group_data["size_gib"],
             group_data["ppl"],
             color=color_mapping.get(group, 'black'),
             marker=marker_mapping.get(group, 'o'),
@@ -121,39 +127,17 @@ def plot_summary_ppl(df):
     ax.xaxis.set_major_formatter(mticker.FuncFormatter(lambda x, pos: f"{x:g}"))
 
     ax.grid(True, linestyle='--', linewidth=0.5)
+    if front is not None:
+        overlay_front(ax, front, "size_gib", "ppl")
     ax.legend(title="Quantization Type", loc='upper right')
     plt.tight_layout()
     #plt.show()
-    plt.savefig("overview_8B_70B.pdf",transparent=True,dpi=300)
+    plt.savefig(output,transparent=True,dpi=300)
     plt.close()
 
 
-def plot_zfp_8b(df):
-
-    my_df = df.copy()
-    conditions = [
-        my_df['quant_type'] == 'F16',
-        my_df['quant_type'].isin(['rate', 'accu', 'prec'])
-    ]
-    choices = ['native', my_df['quant_type']]
-    my_df['color_group'] = np.select(conditions, choices, default='built-in')
-
-    my_df["size"] = my_df["size"] / 1024
-    filtered_df = my_df[(my_df["ppl"] < 8)
-                        & (my_df["quant_type"] != "BF16")
-                        & (
-                                my_df["quant_type"].str.startswith("Q")
-                             | my_df["quant_type"].str.startswith("rate")
-                             | my_df["quant_type"].str.startswith("prec")
-                             | my_df["quant_type"].str.startswith("accu")
-                             | ("I" not in my_df["quant_type"])
-                        )
-                        #& (my_df["color_group"] != "built-in")
-                        & (my_df["num_parameter"] == "8B")
-                        & (my_df["imat"] == False)
-                        & (my_df["size"] < 10)
-    ]
-    print(my_df)
+def plot_zfp_8b(df, output="overview_8B.pdf", front=None):
+
     fig, ax = plt.subplots(figsize=(5.5, 3.8), dpi=250)
     ax.set_xlabel(label_dict["bpw"])
     ax.set_ylabel(label_dict["ppl"])
@@ -162,10 +146,10 @@ def plot_zfp_8b(df):
 
     for group in desired_order:
         # Check if the group is present in the filtered data
-        if group not in filtered_df['color_group'].unique():
+        if group not in df['color_group'].unique():
             continue  # skip if the group doesn't exist
 
-        group_data = filtered_df[filtered_df["color_group"] == group]
+        group_data = df[df["color_group"] == group]
 
         ax.scatter(
             group_data["bits_per_weight"],
@@ -185,32 +169,17 @@ def plot_zfp_8b(df):
     ax.xaxis.set_major_formatter(mticker.FuncFormatter(lambda x, pos: f"{x:g}"))
     ax.set_xlim(left=2,right=10.3)
     ax.grid(True, linestyle='--', linewidth=0.5)
+    if front is not None:
+        overlay_front(ax, front, "bits_per_weight", "ppl")
     ax.legend(title="Quantization Type", loc='upper right')
     plt.tight_layout()
     #plt.show()
-    plt.savefig("overview_8B.pdf",transparent=True,dpi=300)
+    plt.savefig(output,transparent=True,dpi=300)
     plt.close()
 
 
-def plot_zfp_8b_chunk(df):
-
-    my_df = df.copy()
-    conditions = [
-        my_df['quant_type'] == 'F16',
-        my_df['quant_type'].isin(['rate', 'accu', 'prec'])
-    ]
-    choices = ['native', my_df['quant_type']]
-    my_df['color_group'] = np.select(conditions, choices, default='built-in')
-
-    my_df["size"] = my_df["size"] / 1024
-    filtered_df = my_df[(my_df["ppl"] < 8)
-                        & (my_df["quant_type"] != "BF16")
-                        & (my_df["color_group"] != "built-in")
-                        & (my_df["num_parameter"] == "8B")
-                        & (my_df["imat"] == False)
-                        & (my_df["size"] < 10)
-    ]
-    print(my_df)
+def plot_zfp_8b_chunk(df, output="overview_8B_zfp_chunksize.pdf"):
+
     fig, ax = plt.subplots(figsize=(5.5, 3.8), dpi=250)
     ax.set_xlabel(label_dict["bpw"])
     ax.set_ylabel(label_dict["ppl"])
@@ -221,10 +190,10 @@ def plot_zfp_8b_chunk(df):
 
     for dim in desired_order:
         # Check if the group is present in the filtered data
-        if dim not in filtered_df['dim'].unique():
+        if dim not in df['dim'].unique():
             continue  # skip if the group doesn't exist
 
-        group_data = filtered_df[filtered_df["dim"] == dim]
+        group_data = df[df["dim"] == dim]
 
         ax.scatter(
             group_data["bits_per_weight"],
@@ -247,32 +216,12 @@ def plot_zfp_8b_chunk(df):
     ax.legend(title="Block Size", loc='upper right')
     plt.tight_layout()
     #plt.show()
-    plt.savefig("overview_8B_zfp_chunksize.pdf",transparent=True,dpi=300)
+    plt.savefig(output,transparent=True,dpi=300)
     plt.close()
 
 
-def plt_8b_hellaswag_imatrix(df):
-
-    my_df = df.copy()
-    conditions = [
-        my_df['quant_type'] == 'F16',
-        my_df['quant_type'].isin(['rate', 'accu', 'prec'])
-    ]
-    choices = ['native', my_df['quant_type']]
-    my_df['color_group'] = np.select(conditions, choices, default='built-in')
-
-    my_df["size"] = my_df["size"] / 1024
-    filtered_df = my_df[(my_df["hellaswag"] > 55)
-                        #& (my_df["ppl"] < 12)
-                        & (my_df["quant_type"] != "BF16")
-                        & (
-                                (my_df["color_group"] == "built-in")
-                                | (my_df["color_group"] == "rate")
-                        )
-                        & (my_df["num_parameter"] == "8B")
-                        #& (my_df["imat"] == False)
-    ]
-    #print(my_df)
+def plt_8b_hellaswag_imatrix(df, output="overview_8B_hellaswag.pdf", front=None):
+
     fig, ax = plt.subplots(figsize=(5.5, 3.8), dpi=250)
     ax.set_xlabel(label_dict["bpw"])
     ax.set_ylabel(label_dict["hellaswag"])
@@ -283,12 +232,12 @@ def plt_8b_hellaswag_imatrix(df):
         for imat in [True,False]:
 
             # Check if the group is present in the filtered data
-            if group not in filtered_df['color_group'].unique():
+            if group not in df['color_group'].unique():
                 continue  # skip if the group doesn't exist
 
-            group_data = filtered_df[
-                (filtered_df["color_group"] == group)
-                & (filtered_df["imat"] == imat)
+            group_data = df[
+                (df["color_group"] == group)
+                & (df["imat"] == imat)
             ]
 
             ax.scatter(
@@ -309,16 +258,19 @@ def plt_8b_hellaswag_imatrix(df):
     ax.xaxis.set_major_formatter(mticker.FuncFormatter(lambda x, pos: f"{x:g}"))
     ax.set_xlim(left=2,right=10.3)
     ax.grid(True, linestyle='--', linewidth=0.5)
+    if front is not None:
+        overlay_front(ax, front, "bits_per_weight", "hellaswag")
     ax.legend(title="Quantization Type", loc='lower right')
     plt.tight_layout()
     #plt.show()
-    plt.savefig("overview_8B_hellaswag.pdf",transparent=True,dpi=300)
+    plt.savefig(output,transparent=True,dpi=300)
     plt.close()
 if __name__ == "__main__":
-    df = pd.read_csv("all_data.csv")
-    plot_summary_ppl(df)
-    plot_zfp_8b(df)
-    plot_zfp_8b_chunk(df)
-    plt_8b_hellaswag_imatrix(df)
+    apply_style()
+    results = ResultSet("all_data", PLOT_SPECS.values())
+    plot_summary_ppl(results.select(PLOT_SPECS["summary_ppl"]))
+    plot_zfp_8b(results.select(PLOT_SPECS["zfp_8b"]))
+    plot_zfp_8b_chunk(results.select(PLOT_SPECS["zfp_8b_chunk"]))
+    plt_8b_hellaswag_imatrix(results.select(PLOT_SPECS["hellaswag_imatrix"]))
 
 
@@ -0,0 +1,176 @@
+"""
+Single entry point of the postprocessing, one subcommand per task.
+
+Only argparse and the model name parser are imported at start. pandas,
+matplotlib and pyarrow are imported by the subcommands that need them, so quick
+questions about job_results are answered right away on a login node. Importing
+this module has no side effects.
+
+    python postprocess.py stats --category runtime_performance --quant-type Q4_0
+    python postprocess.py stats --table runtimes --by quant_type ncore
+    python postprocess.py ingest "../job_results/Meta-Llama-3.1-*B/runtime_performance/*" [--history]
+    python postprocess.py merge "../job_results/Meta-Llama-3.1-*B"
+    python postprocess.py load "../job_results/Meta-Llama-3.1-*B/load_performance/*.out"
+    python postprocess.py plot [figure ...] [--output-dir .] [--force]
+    python postprocess.py watch ../job_results [--port 8765] [--interval 30]
+"""
+import argparse
+import glob
+import os
+import re
+from collections import Counter
+
+from model_parser import CATEGORIES, parse_stem
+
+RUNTIME_SUFFIX = re.compile(r"_n(?P<ncore>\d+)_i(?P<iteration>\d+)$")
+
+
+def result_setup(path) -> dict:
+    """Fields of a result file name, with ncore and iteration for runtime results."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    runtime = RUNTIME_SUFFIX.search(stem)
+    if runtime is None:
+        return dict(parse_stem(stem))
+    return {**parse_stem(stem[:runtime.start()]), "ncore": int(runtime.group("ncore")),
+            "iteration": int(runtime.group("iteration"))}
+
+
+def count_results(root, categories=CATEGORIES, model="*", by=("category",), **filters) -> Counter:
+    """
+    Number of result files below root per value of the fields in by, e.g. ("category", "quant_type").
+    filters select on the fields of the file names (quant_type="Q4_0", imat=False, ncore=96).
+    Files whose names cannot be parsed are counted with the field values None.
+    """
+    counts = Counter()
+    for category in categories:
+        for path in glob.glob(f"{root}/Meta-Llama-{model}/{category}/*"):
+            try:
+                setup = {"category": category, **result_setup(path)}
+            except ValueError:
+                setup = {"category": category}
+                if filters:
+                    continue
+            if all(str(setup.get(field)) == str(value) for field, value in filters.items()):
+                counts[tuple(setup.get(field) for field in by)] += 1
+    return counts
+
+
+def table_counts(table, by):
+    """Rows of a table of the result store per value of the columns in by."""
+    from result_store import load_table
+
+    df = load_table(table, columns=list(by))
+    return df.groupby(list(by), observed=True, dropna=False).size()
+
+
+def run_stats(args):
+    if args.table:
+        print(table_counts(args.table, args.by or ["quant_type"]).to_string())
+        return
+
+    filters = {field: value for field, value in [("quant_type", args.quant_type), ("ncore", args.ncore),
+                                                  ("imat", args.imat)] if value is not None}
+    by = args.by or ["category"]
+    counts = count_results(args.root, args.category or CATEGORIES, args.model, by, **filters)
+    for key, count in sorted(counts.items(), key=lambda item: tuple(str(v) for v in item[0])):
+        print(" ".join(f"{value}" for value in key), count)
+    print(f"total {sum(counts.values())}")
+
+
+def run_ingest(args):
+    from create_runtime_csv import create_runtime_table
+
+    runtimes = create_runtime_table(args.pattern)
+    print(f"runtimes: {len(runtimes)} rows")
+    if args.history:
+        from runtime_history import append_history
+        append_history(runtimes)
+
+
+def run_merge(args):
+    from merge_all_data import merge_results
+
+    all_data = merge_results(args.model_dirs)
+    print(f"all_data: {len(all_data)} rows")
+
+
+def run_load(args):
+    from load_benchmark import compare, create_load_table, summarize
+    from result_store import write_table
+
+    loads = create_load_table(args.pattern)
+    print(f"load_performance: {len(loads)} rows")
+    if not loads.empty:
+        summary = summarize(loads)
+        write_table(summary, "load_summary")
+        comparison = compare(summary)
+        if not comparison.empty:
+            write_table(comparison, "load_comparison")
+
+
+def run_plot(args):
+    from figures import build
+
+    build(args.figures or None, output_dir=args.output_dir, max_workers=args.max_workers, force=args.force)
+
+
+def run_watch(args):
+    import asyncio
+
+    from watch_results import main as watch
+
+    asyncio.run(watch(args.root, args.port, args.interval))
+
+
+def argument_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    stats = subcommands.add_parser("stats", help="count result files, or rows of a table of the result store")
+    stats.add_argument("--root", default="../job_results")
+    stats.add_argument("--model", default="*", help="e.g. 3.1-8B, default all models")
+    stats.add_argument("--category", nargs="*", choices=CATEGORIES)
+    stats.add_argument("--quant-type", default=None, help="e.g. Q4_0 or rate")
+    stats.add_argument("--ncore", type=int, default=None)
+    stats.add_argument("--imat", choices=["True", "False"], default=None)
+    stats.add_argument("--by", nargs="*", default=None,
+                       help="fields to count by, default category (files) or quant_type (--table)")
+    stats.add_argument("--table", default=None, help="count the rows of this table instead of files")
+    stats.set_defaults(run=run_stats)
+
+    ingest = subcommands.add_parser("ingest", help="parse runtime results into the runtimes table")
+    ingest.add_argument("pattern", nargs="?", default="../job_results/Meta-Llama-3.1-*B/runtime_performance/*")
+    ingest.add_argument("--history", action="store_true", help="also append new results to runtime_history")
+    ingest.set_defaults(run=run_ingest)
+
+    merge = subcommands.add_parser("merge", help="parse and merge quantization, tensor comparison and model performance")
+    merge.add_argument("model_dirs", nargs="?", default="../job_results/Meta-Llama-3.1-*B")
+    merge.set_defaults(run=run_merge)
+
+    load = subcommands.add_parser("load", help="parse the cold/warm load benchmark and compare against the baselines")
+    load.add_argument("pattern", nargs="?", default="../job_results/Meta-Llama-3.1-*B/load_performance/*.out")
+    load.set_defaults(run=run_load)
+
+    plot = subcommands.add_parser("plot", help="render the stale figures")
+    plot.add_argument("figures", nargs="*", help="figures to render, default all")
+    plot.add_argument("--output-dir", default=".")
+    plot.add_argument("--max-workers", type=int, default=None)
+    plot.add_argument("--force", action="store_true", help="render even if up to date")
+    plot.set_defaults(run=run_plot)
+
+    watch = subcommands.add_parser("watch", help="refresh the tables while jobs finish and serve the status")
+    watch.add_argument("root", nargs="?", default="../job_results")
+    watch.add_argument("--port", type=int, default=8765)
+    watch.add_argument("--interval", type=float, default=30.0, help="polling interval [s] on network file systems")
+    watch.set_defaults(run=run_watch)
+
+    return parser
+
+
+def main(argv=None):
+    args = argument_parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Timing spans and memory tracking for the postprocessing pipeline.
+
+Off by default. Setting POSTPROCESSING_PROFILE turns it on for any script:
+
+    POSTPROCESSING_PROFILE=merge python merge_all_data.py
+
+and writes merge.json (totals per stage and per span) and merge.trace.json
+(Chrome trace, open in chrome://tracing or ui.perfetto.dev) when the script exits.
+"1" uses the prefix "profile". POSTPROCESSING_PROFILE_MEMORY=0 skips the
+allocation tracking with tracemalloc, which slows Python code down noticeably.
+
+Every span belongs to one of STAGES and records its wall time, the peak of traced
+allocations inside it and the peak RSS of the process when it ends. Spans of worker
+processes are handed back to the parent with drain() and merge().
+
+    with span("tensor_comparison", "parse"):
+        ...
+
+    @profiled("write")
+    def write_table(...):
+"""
+import atexit
+import functools
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE_ENV = "POSTPROCESSING_PROFILE"
+MEMORY_ENV = "POSTPROCESSING_PROFILE_MEMORY"
+
+STAGES = ("discover", "read", "parse", "normalize", "merge", "write", "render")
+
+_state = {"enabled": False, "memory": False, "output": None, "pid": None}
+_events = []
+_stack = threading.local()
+
+
+def enable(output="profile", memory=True):
+    """Turns profiling on, the profile is written to output.json and output.trace.json at exit."""
+    if _state["enabled"]:
+        return
+    _state.update(enabled=True, memory=memory, output=output, pid=os.getpid())
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    atexit.register(_write_at_exit)
+
+
+def enabled() -> bool:
+    return _state["enabled"]
+
+
+def _peak_rss_mib():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def span(name, stage, **args):
+    """Records the block as span name of stage, args are stored with it."""
+    if not _state["enabled"]:
+        yield
+        return
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage {stage}, expected one of {', '.join(STAGES)}")
+
+    stack = getattr(_stack, "spans", None)
+    if stack is None:
+        stack = _stack.spans = []
+
+    if _state["memory"]:
+        # The peak is reset for every span, so the enclosing span keeps the peak seen so far
+        _, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]["alloc_peak"] = max(stack[-1]["alloc_peak"], peak)
+        tracemalloc.reset_peak()
+    frame = {"alloc_peak": 0}
+    stack.append(frame)
+
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter_ns() - start
+        stack.pop()
+        event = {
+            "name": name,
+            "stage": stage,
+            "start_us": start / 1000,
+            "duration_us": duration / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "peak_rss_mib": _peak_rss_mib(),
+            "args": {key: str(value) for key, value in args.items()},
+        }
+        if _state["memory"]:
+            _, peak = tracemalloc.get_traced_memory()
+            frame["alloc_peak"] = max(frame["alloc_peak"], peak)
+            event["alloc_peak_mib"] = frame["alloc_peak"] / 1024 ** 2
+            if stack:
+                stack[-1]["alloc_peak"] = max(stack[-1]["alloc_peak"], frame["alloc_peak"])
+        _events.append(event)
+
+
+def profiled(stage, name=None):
+    """Decorator recording every call of the function as a span of stage."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _state["enabled"]:
+                return function(*args, **kwargs)
+            with span(name or function.__qualname__, stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def drain() -> list:
+    """Removes and returns the spans recorded by this process, for workers to send to the parent."""
+    pid = os.getpid()
+    # Forked workers start with a copy of the parent's spans, those stay with the parent
+    own = [event for event in _events if event["pid"] == pid]
+    _events[:] = [event for event in _events if event["pid"] != pid]
+    return own
+
+
+def merge(events):
+    """Adds spans recorded by a worker process."""
+    _events.extend(events or [])
+
+
+def summary(events=None) -> dict:
+    """Count, total and maximum time [s] and memory peaks per stage and per (stage, span name)."""
+    events = _events if events is None else events
+
+    def add(totals, key, event):
+        entry = totals.setdefault(key, {"count": 0, "total_s": 0.0, "max_s": 0.0,
+                                        "peak_rss_mib": 0.0, "alloc_peak_mib": 0.0})
+        seconds = event["duration_us"] / 1e6
+        entry["count"] += 1
+        entry["total_s"] += seconds
+        entry["max_s"] = max(entry["max_s"], seconds)
+        entry["peak_rss_mib"] = max(entry["peak_rss_mib"], event["peak_rss_mib"])
+        entry["alloc_peak_mib"] = max(entry["alloc_peak_mib"], event.get("alloc_peak_mib", 0.0))
+
+    stages, spans = {}, {}
+    for event in events:
+        add(stages, event["stage"], event)
+        add(spans, f"{event['stage']}:{event['name']}", event)
+    return {"stages": stages, "spans": spans}
+
+
+def chrome_trace(events=None) -> dict:
+    """The spans in the Chrome trace event format (complete events)."""
+    events = _events if events is None else events
+    return {
+        "traceEvents": [{
+            "name": event["name"],
+            "cat": event["stage"],
+            "ph": "X",
+            "ts": event["start_us"],
+            "dur": event["duration_us"],
+            "pid": event["pid"],
+            "tid": event["tid"],
+            "args": {**event["args"], "peak_rss_mib": event["peak_rss_mib"],
+                     **({"alloc_peak_mib": event["alloc_peak_mib"]} if "alloc_peak_mib" in event else {})},
+        } for event in events],
+        "displayTimeUnit": "ms",
+    }
+
+
+def write(output=None):
+    """Writes output.json with the summary and all spans and output.trace.json."""
+    output = output or _state["output"] or "profile"
+    with open(f"{output}.json", "w") as f:
+        json.dump({**summary(), "events": _events}, f, indent=1)
+    with open(f"{output}.trace.json", "w") as f:
+        json.dump(chrome_trace(), f)
+
+
+def _write_at_exit():
+    # Workers inherit the atexit handler when forked, only the process that enabled profiling writes
+    if os.getpid() == _state["pid"] and _events:
+        write()
+        print(f"profile: {len(_events)} spans written to {_state['output']}.json and {_state['output']}.trace.json")
+
+
+if os.environ.get(PROFILE_ENV, "") not in ("", "0"):
+    enable("profile" if os.environ[PROFILE_ENV] == "1" else os.environ[PROFILE_ENV],
+           memory=os.environ.get(MEMORY_ENV, "1") != "0")
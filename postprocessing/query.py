@@ -0,0 +1,92 @@
+"""
+Lazy, declarative queries over the result store.
+
+Plots declare what they need as data instead of building masks by hand:
+
+    SPEC = {
+        "columns": ["bits_per_weight", "ppl", "color_group"],
+        "filters": [("num_parameter", "==", "8B"), ("ppl", "<", 8), ("size_gib", "<", 10)],
+    }
+
+A ResultSet serves a group of such specs from one table. Nothing is read
+until the first select(). The table is then scanned once with the union of
+the needed columns, and the filters shared by all specs are pushed down to
+the parquet scan. Derived columns (DERIVED_COLUMNS) are computed once on
+the scanned frame. Each select() only evaluates the remaining filters of its
+spec.
+"""
+import numpy as np
+import pandas as pd
+
+from result_store import STORE_DIR, apply_filters, filter_columns, load_table
+
+ZFP_MODES = ["rate", "accu", "prec"]
+
+
+def color_group(df):
+    """"native" for F16, the ZFP mode for ZFP and "built-in" for everything else."""
+    quant_type = df["quant_type"].astype(object)
+    groups = quant_type.where(quant_type.isin(ZFP_MODES), "built-in")
+    return groups.mask(quant_type == "F16", "native")
+
+
+def runtime_group(df):
+    """ZFP rate runs are grouped by dim and rate ("rate_3_4.0_4.0"), all others by quant type."""
+    quant_type = df["quant_type"].astype(object)
+    rate_group = ("rate_" + df["dim"].astype(str) + "_" + df["threshold_low"].astype(str)
+                  + "_" + df["threshold_high"].astype(str))
+    return pd.Series(np.where(quant_type == "rate", rate_group, quant_type), index=df.index)
+
+
+# name: (stored columns it is computed from, function)
+DERIVED_COLUMNS = {
+    "color_group": (["quant_type"], color_group),
+    "size_gib": (["size"], lambda df: df["size"] / 1024),
+    "group": (["quant_type", "dim", "threshold_low", "threshold_high"], runtime_group),
+}
+
+
+class ResultSet:
+    def __init__(self, table, specs, store_dir=STORE_DIR):
+        self.table = table
+        self.specs = list(specs)
+        self.store_dir = store_dir
+        self.pushdown = []
+        self._frame = None
+
+    def plan(self):
+        """(stored columns to scan, derived columns to compute, filters pushed down to the scan)"""
+        needed = set()
+        for spec in self.specs:
+            needed |= set(spec.get("columns", [])) | filter_columns(spec.get("filters", []))
+
+        derived = sorted(c for c in needed if c in DERIVED_COLUMNS)
+        stored = {c for c in needed if c not in DERIVED_COLUMNS}
+        for column in derived:
+            stored |= set(DERIVED_COLUMNS[column][0])
+
+        # Only filters every spec agrees on can drop rows before the scan
+        first = self.specs[0].get("filters", []) if self.specs else []
+        pushdown = [f for f in first
+                    if all(f in spec.get("filters", []) for spec in self.specs)
+                    and not filter_columns([f]) & set(DERIVED_COLUMNS)]
+
+        return sorted(stored), derived, pushdown
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            stored, derived, self.pushdown = self.plan()
+            df = load_table(self.table, columns=stored, filters=self.pushdown, store_dir=self.store_dir)
+            for column in derived:
+                df[column] = DERIVED_COLUMNS[column][1](df)
+            self._frame = df
+        return self._frame
+
+    def select(self, spec):
+        """Rows and columns of spec, derived columns included."""
+        frame = self.frame
+        remaining = [f for f in spec.get("filters", []) if f not in self.pushdown]
+        df = apply_filters(frame, remaining)
+        columns = spec.get("columns")
+        return df[columns] if columns else df
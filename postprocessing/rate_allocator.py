@@ -0,0 +1,250 @@
+"""
+Per-tensor ZFP rates from the importance matrix under a bit budget.
+
+The error of tensor t compressed with rate R is weighted by the mean importance
+w_t of its input columns (imatrix.dat, the same file llama-quantize --imatrix reads):
+
+    D_t(R) = w_t * n_t * mse_t(R)
+
+and sum D_t(R_t) is minimised subject to sum n_t * R_t staying within the budget. mse_t(R)
+comes from the per-tensor table of zfp_simulator.py (rate mode, needs zfpy) if given. Without it the
+high-rate model mse_t(R) = var_t * 2^(-2R) is used, with var_t estimated from
+sampled blocks of the F16 GGUF. Rates are chosen from a ladder (RATE_STEP apart). The
+greedy allocation always buys the step with the largest error reduction per bit, which on
+the lower convex hull of every curve is the Lagrangian optimum.
+
+    python rate_allocator.py <F16 gguf> <imatrix.dat> --bpw 4.5 [--dim 3] [--simulation] [--output rate_map.txt]
+
+The rate map has one "<tensor name> <rate>" line per compressed tensor and "#"
+comment lines. A quantize build has to read it (e.g. from ZFP_RATE_MAP) for it
+to take effect. The llama-quantize.rate.wi_imat binaries do not read it, they
+interpolate between ZFP_RATE_MIN and ZFP_RATE_MAX.
+"""
+import argparse
+import heapq
+import struct
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gguf_compare import open_gguf
+from model_parser import parse_stem
+from zfp_simulator import UNCOMPRESSED_BITS, sample_blocks
+
+RATE_MIN = 3.0
+RATE_MAX = 8.0
+# ZFP rounds the rate to whole bits per block, 1/4 is exact for every dim
+RATE_STEP = 0.25
+
+
+def read_imatrix(path) -> dict:
+    """{tensor name: importance per input column} of a legacy imatrix.dat."""
+    data = Path(path).read_bytes()
+    if data[:4] == b"GGUF":
+        raise ValueError(f"{path} is an imatrix in GGUF format, only imatrix.dat is supported")
+
+    offset = 0
+
+    def read(fmt):
+        nonlocal offset
+        values = struct.unpack_from(fmt, data, offset)
+        offset += struct.calcsize(fmt)
+        return values
+
+    (n_entries,) = read("<i")
+    entries = {}
+    for _ in range(n_entries):
+        (length,) = read("<i")
+        name = data[offset:offset + length].decode("utf-8")
+        offset += length
+        n_call, n_values = read("<ii")
+        values = np.frombuffer(data, dtype="<f4", count=n_values, offset=offset)
+        offset += 4 * n_values
+        # Stored as sums over n_call chunks, llama-quantize divides by n_call as well
+        entries[name] = values / max(n_call, 1)
+    return entries
+
+
+def tensor_importance(reader, imatrix) -> dict:
+    """Mean importance of every 2D tensor, the median of the others for tensors missing in imatrix."""
+    names = [name for name, tensor in reader.tensors.items() if len(tensor["shape"]) >= 2]
+    importance = {name: float(np.mean(imatrix[name])) for name in names if name in imatrix}
+    if not importance:
+        raise ValueError("No tensor of the GGUF is in the importance matrix")
+    default = float(np.median(list(importance.values())))
+    return {name: importance.get(name, default) for name in names}
+
+
+def model_curves(reader, names, rates, dim):
+    """{name: mse per rate} of the high-rate model var * 2^(-2R)."""
+    curves = {}
+    for name in names:
+        blocks = sample_blocks(reader, name, dim)
+        variance = float(blocks.astype(np.float64).var()) if blocks.size else 0.0
+        curves[name] = variance * 2.0 ** (-2 * rates)
+    return curves
+
+
+def simulated_curves(tensors: pd.DataFrame, names, rates, dim):
+    """
+    {name: mse per rate} interpolated (in log mse) from the rate runs of zfp_simulator's
+    per-tensor table, for the tensors of names it has.
+    """
+    setups = pd.DataFrame([parse_stem(model_name) for model_name in tensors["model_name"].astype(str)],
+                          index=tensors.index)
+    selected = (setups["quant_type"] == "rate") & (setups["dim"] == dim)
+    runs = tensors[selected].assign(rate=setups.loc[selected, "threshold_low"])
+    if runs["rate"].nunique() < 2:
+        raise ValueError(f"The simulation needs at least two rates of dim {dim}")
+
+    curves = {}
+    for name, run in runs[runs["tensor"].isin(names)].groupby("tensor"):
+        run = run.sort_values("rate")
+        log_mse = np.log(np.maximum(run["rmse"].to_numpy(dtype=np.float64) ** 2, 1e-30))
+        curves[name] = np.exp(np.interp(rates, run["rate"], log_mse))
+    return curves
+
+
+def lower_hull(bits, distortion):
+    """Indices of the lower convex hull of the points (bits, distortion), bits ascending."""
+    hull = []
+    for i in range(len(bits)):
+        while len(hull) >= 2:
+            a, b = hull[-2], hull[-1]
+            # b is dropped if it lies on or above the line from a to i
+            if (distortion[b] - distortion[a]) * (bits[i] - bits[a]) >= (distortion[i] - distortion[a]) * (bits[b] - bits[a]):
+                hull.pop()
+            else:
+                break
+        hull.append(i)
+    return hull
+
+
+def allocate(n_elements, weights, curves, rates, budget_bits):
+    """
+    Greedy marginal-utility allocation: {name: rate} with sum n_elements * rate <= budget_bits.
+    Every tensor starts at the lowest rate, then the step with the largest weighted error
+    reduction per bit is taken while it fits.
+    """
+    hulls, position, allocation = {}, {}, {}
+    used = 0.0
+    heap = []
+    for name, mse in curves.items():
+        bits = n_elements[name] * rates
+        distortion = weights[name] * n_elements[name] * mse
+        hull = lower_hull(bits, distortion)
+        hulls[name] = (bits, distortion, hull)
+        position[name] = 0
+        used += bits[hull[0]]
+        if len(hull) > 1:
+            a, b = hull[0], hull[1]
+            heapq.heappush(heap, (-(distortion[a] - distortion[b]) / (bits[b] - bits[a]), name))
+
+    if used > budget_bits:
+        raise ValueError(f"The budget is below the lowest rate {rates[0]} for every tensor")
+
+    while heap:
+        _, name = heapq.heappop(heap)
+        bits, distortion, hull = hulls[name]
+        a, b = hull[position[name]], hull[position[name] + 1]
+        if used + bits[b] - bits[a] > budget_bits:
+            # Steps are taken in order of utility, a tensor that does not fit stays where it is
+            continue
+        used += bits[b] - bits[a]
+        position[name] += 1
+        if position[name] + 1 < len(hull):
+            a, b = b, hull[position[name] + 1]
+            heapq.heappush(heap, (-(distortion[a] - distortion[b]) / (bits[b] - bits[a]), name))
+
+    for name, (_, _, hull) in hulls.items():
+        allocation[name] = float(rates[hull[position[name]]])
+    return allocation
+
+
+def rate_map(path, imatrix_path, bpw=None, gib=None, dim=3, simulation=None,
+             rate_min=RATE_MIN, rate_max=RATE_MAX, rate_step=RATE_STEP) -> pd.DataFrame:
+    """
+    Per-tensor rates of the F16 GGUF path for a budget of bpw bits per weight or gib GiB
+    (uncompressed tensors included). simulation is zfp_simulator's per-tensor table or None.
+
+    Returns a DataFrame with tensor, n_elements, importance, rate and predicted mse.
+    """
+    if (bpw is None) == (gib is None):
+        raise ValueError("Exactly one of bpw and gib has to be given")
+
+    reader = open_gguf(str(path))
+    weights = tensor_importance(reader, read_imatrix(imatrix_path))
+    n_elements = {name: reader.tensors[name]["n_elements"] for name in reader.tensors}
+    rates = np.arange(rate_min, rate_max + rate_step / 2, rate_step)
+
+    curves = model_curves(reader, weights, rates, dim)
+    if simulation is not None:
+        curves.update(simulated_curves(simulation, weights, rates, dim))
+
+    total_elements = sum(n_elements.values())
+    uncompressed_bits = sum(n for name, n in n_elements.items() if name not in weights) * UNCOMPRESSED_BITS
+    budget_bits = (bpw * total_elements if bpw is not None else gib * 8 * 1024 ** 3) - uncompressed_bits
+
+    allocation = allocate(n_elements, weights, curves, rates, budget_bits)
+    return pd.DataFrame([{
+        "tensor": name,
+        "n_elements": n_elements[name],
+        "importance": weights[name],
+        "rate": rate,
+        "mse": float(curves[name][np.searchsorted(rates, rate - rate_step / 2)]),
+    } for name, rate in allocation.items()])
+
+
+def write_rate_map(df, output, comment=""):
+    """
+    Writes the rate map of df to output, a plain text file a quantize build is expected to
+    read as follows:
+
+        # <comment line>                 any line starting with "#" is a comment
+        <tensor name> <rate>             e.g. "blk.0.attn_q.weight 4.75"
+
+    Fields are separated by one space. The tensor name is the GGUF name of the F16 weights,
+    the rate the ZFP rate in bits per weight with two decimals (a multiple of RATE_STEP) for
+    zfp_stream_set_rate. Every compressed tensor has exactly one line; tensors without a line
+    stay uncompressed (F32), as llama-quantize keeps the 1D tensors. The rates are only valid
+    for the dim they were allocated for, which the comment names.
+    """
+    lines = [f"# {line}" for line in comment.splitlines()]
+    lines += [f"{tensor} {rate:.2f}" for tensor, rate in zip(df["tensor"], df["rate"])]
+    Path(output).write_text("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    from result_store import load_table
+
+    parser = argparse.ArgumentParser(description="Allocates per-tensor ZFP rates from the importance matrix.")
+    parser.add_argument("path", help="F16 GGUF of the model")
+    parser.add_argument("imatrix", help="imatrix.dat of the model")
+    budget = parser.add_mutually_exclusive_group(required=True)
+    budget.add_argument("--bpw", type=float, help="target bits per weight of the whole model")
+    budget.add_argument("--gib", type=float, help="target size of the whole model in GiB")
+    parser.add_argument("--dim", type=int, default=3)
+    parser.add_argument("--rate-min", type=float, default=RATE_MIN)
+    parser.add_argument("--rate-max", type=float, default=RATE_MAX)
+    parser.add_argument("--simulation", action="store_true",
+                        help="use the error curves of the zfp_simulation_tensors table, "
+                             "written by zfp_simulator.py (needs zfpy)")
+    parser.add_argument("--output", default="zfp_rate_map.txt")
+    args = parser.parse_args()
+
+    simulation = load_table("zfp_simulation_tensors") if args.simulation else None
+    df = rate_map(args.path, args.imatrix, args.bpw, args.gib, args.dim, simulation, args.rate_min, args.rate_max)
+
+    n_total = sum(tensor["n_elements"] for tensor in open_gguf(args.path).tensors.values())
+    bits = float((df["rate"] * df["n_elements"]).sum()) + (n_total - df["n_elements"].sum()) * UNCOMPRESSED_BITS
+    budget_bits = args.bpw * n_total if args.bpw is not None else args.gib * 8 * 1024 ** 3
+    # The rate ladder is discrete, the allocation stays below the budget by up to a step of one tensor
+    shortfall = budget_bits - bits
+    summary = (f"{Path(args.path).name}, dim {args.dim}, budget {args.bpw} bpw / {args.gib} GiB\n"
+               f"allocated {bits / n_total:.4f} bpw, {bits / 8 / 1024 ** 3:.3f} GiB\n"
+               f"shortfall {shortfall / n_total:.4f} bpw, {shortfall / 8 / 1024 ** 2:.2f} MiB below the budget")
+    write_rate_map(df, args.output, summary)
+
+    print(summary)
+    print(df.groupby("rate")["n_elements"].agg(["count", "sum"]).to_string())
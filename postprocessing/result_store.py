@@ -0,0 +1,226 @@
+"""
+Typed, partitioned columnar store for the postprocessing results.
+
+Every table (e.g. "runtimes", "all_data") is a parquet dataset below
+results/<table>/, hive-partitioned by llama_version/num_parameter/quant_type.
+Columns are written with fixed types and quant_type, processing_type and node
+are dictionary encoded, so readers get categoricals back without converting
+anything. Readers pick the columns and partitions they need:
+
+    df = load_table("all_data", columns=["quant_type", "bits_per_weight", "ppl"],
+                    filters=[("num_parameter", "==", "8B"), ("imat", "==", False)])
+
+If a table has not been written to the store yet, load_table falls back to
+<table>.csv in the current directory.
+"""
+import operator
+import shutil
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from profiling import span
+
+STORE_DIR = "results"
+
+PARTITION_COLUMNS = ["llama_version", "num_parameter", "quant_type"]
+CATEGORICAL_COLUMNS = ["quant_type", "processing_type", "node"]
+
+COLUMN_TYPES = {
+    "config_id": "Int64",
+    "model_name": "string",
+    "llama_version": "string",
+    "num_parameter": "string",
+    "dim": "Int64",
+    "threshold_low": "float64",
+    "threshold_high": "float64",
+    "imat": "boolean",
+    "ncore": "Int64",
+    "iteration": "Int64",
+    "prompt_eval_tokens": "Int64",
+    "eval_tokens": "Int64",
+    "sample_tokens": "Int64",
+    "total_tokens": "Int64",
+    "graph_nodes": "Int64",
+    "graph_splits": "Int64",
+    "n_elements": "Int64",
+    "bits_per_weight": "float64",
+    "size": "float64",
+    "ppl": "float64",
+    "hellaswag": "float64",
+    "build": "string",
+}
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def table_path(name: str, store_dir=STORE_DIR) -> Path:
+    return Path(store_dir) / name
+
+
+def table_mtime(name: str, store_dir=STORE_DIR):
+    """Latest modification time [ns] of the files of table name (or of <name>.csv), None if it does not exist."""
+    path = table_path(name, store_dir)
+    if path.exists():
+        return max((f.stat().st_mtime_ns for f in path.rglob("*") if f.is_file()), default=path.stat().st_mtime_ns)
+    csv = Path(f"{name}.csv")
+    return csv.stat().st_mtime_ns if csv.exists() else None
+
+
+def coerce_types(df: pd.DataFrame) -> pd.DataFrame:
+    """Casts the known columns of df to their store types."""
+    types = {column: dtype for column, dtype in COLUMN_TYPES.items() if column in df.columns}
+    df = df.astype(types)
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def write_table(df: pd.DataFrame, name: str, store_dir=STORE_DIR):
+    """Replaces table name in the store with df."""
+    with span(name, "write", rows=len(df)):
+        _write_table(df, name, store_dir)
+
+
+def _write_table(df, name, store_dir, append=False):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    df = coerce_types(df)
+    partition_columns = [column for column in PARTITION_COLUMNS if column in df.columns]
+    for column in partition_columns:
+        # Directory names are plain strings, the dictionary encoding is restored on read
+        df[column] = df[column].astype("string")
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    path = table_path(name, store_dir)
+    if path.exists() and not append:
+        shutil.rmtree(path)
+
+    if table.num_rows == 0:
+        if not append:
+            # Partitioning writes no file for no rows, an empty table keeps its schema in one file
+            import pyarrow.parquet as pq
+            path.mkdir(parents=True, exist_ok=True)
+            pq.write_table(table, path / "part-0.parquet")
+        return
+
+    ds.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([(c, pa.string()) for c in partition_columns]), flavor="hive"),
+        # Appended parts get unique names, so they never replace earlier files
+        basename_template=f"part-{time.time_ns()}-{{i}}.parquet" if append else None,
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def append_table(df: pd.DataFrame, name: str, store_dir=STORE_DIR):
+    """Adds the rows of df to table name as new files, the rows already in the table are kept."""
+    with span(name, "write", rows=len(df)):
+        _write_table(df, name, store_dir, append=True)
+
+
+def any_of(*alternatives):
+    """Filter matching rows that pass all filters of at least one of the alternatives."""
+    return (None, "any", [list(alternative) for alternative in alternatives])
+
+
+def filter_columns(filters) -> set:
+    """Columns referenced by filters."""
+    columns = set()
+    for column, op, value in filters:
+        if op == "any":
+            for alternative in value:
+                columns |= filter_columns(alternative)
+        else:
+            columns.add(column)
+    return columns
+
+
+def _filter_expression(filters):
+    import pyarrow.dataset as ds
+
+    expression = None
+    for column, op, value in filters:
+        if op == "any":
+            term = None
+            for alternative in value:
+                alternative_term = _filter_expression(alternative)
+                term = alternative_term if term is None else term | alternative_term
+        elif op == "in":
+            term = ds.field(column).isin(list(value))
+        elif op == "not in":
+            term = ~ds.field(column).isin(list(value))
+        else:
+            term = _OPERATORS[op](ds.field(column), value)
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def filter_mask(df: pd.DataFrame, filters) -> pd.Series:
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        if op == "any":
+            term = pd.Series(False, index=df.index)
+            for alternative in value:
+                term |= filter_mask(df, alternative)
+        elif op == "in":
+            term = df[column].isin(list(value))
+        elif op == "not in":
+            term = ~df[column].isin(list(value))
+        else:
+            term = _OPERATORS[op](df[column], value)
+        mask &= term.fillna(False).astype(bool)
+    return mask
+
+
+def apply_filters(df: pd.DataFrame, filters) -> pd.DataFrame:
+    """The pandas equivalent of the filters pushed down to the parquet scan."""
+    return df[filter_mask(df, filters)]
+
+
+def load_table(name: str, columns=None, filters=None, store_dir=STORE_DIR) -> pd.DataFrame:
+    """
+    Loads table name from the store.
+
+    Arguments:
+        columns: Columns to read, None reads all of them.
+        filters: List of (column, op, value) with op one of ==, !=, <, <=, >, >=, in, not in,
+                 alternatives are combined with any_of().
+                 Filters on partition columns skip whole directories, the others are
+                 evaluated on the row groups while scanning.
+    """
+    with span(name, "read"):
+        return _load_table(name, columns, filters or [], store_dir)
+
+
+def _load_table(name, columns, filters, store_dir):
+    path = table_path(name, store_dir)
+
+    if not path.exists():
+        df = pd.read_csv(f"{name}.csv")
+        df = coerce_types(df)
+        df = apply_filters(df, filters)
+        return df[columns] if columns is not None else df
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    # Partition values come back dictionary encoded, i.e. as categoricals
+    dataset = ds.dataset(path, format="parquet", partitioning=ds.HivePartitioning.discover(infer_dictionary=True))
+    table = dataset.to_table(columns=columns, filter=_filter_expression(filters) if filters else None)
+
+    types_mapper = {pa.int64(): pd.Int64Dtype(), pa.bool_(): pd.BooleanDtype()}.get
+    return table.to_pandas(types_mapper=types_mapper)
@@ -0,0 +1,198 @@
+"""
+Runtime history across llama.cpp builds and a regression report between them.
+
+The runtime result files carry a fingerprint of the llama-cli binary (",build,<sha256 prefix>"
+on the metadata line), which changes with every rebuild, e.g. with other compiler
+flags or ZFP kernels. Every run of this script appends the measurements not seen
+before to the runtime_history table, which is never rewritten. Results written
+before the fingerprint existed get the build "unknown".
+
+Per configuration and ncore the measurements are ordered by build, builds by the
+time they were first recorded. Binary segmentation places change points between
+builds where the mean throughput shifts by more than the noise explains
+(penalty 2 * sigma^2 * log(n), sigma from the pooled deviation within builds).
+Each change point is tested with a one-sided Mann-Whitney U test, and a drop of
+more than MIN_DROP of the median with p < ALPHA is a regression.
+
+    python runtime_history.py [pattern of the runtime result files]
+"""
+import math
+import sys
+
+import numpy as np
+import pandas as pd
+
+from create_runtime_csv import create_runtime_table
+from model_parser import CONFIG_COLUMNS
+from result_store import STORE_DIR, append_table, load_table, table_path, write_table
+
+HISTORY_TABLE = "runtime_history"
+REPORT_TABLE = "runtime_regressions"
+
+METRICS = ["eval_throughput", "prompt_eval_throughput"]
+UNKNOWN_BUILD = "unknown"
+
+REPORT_COLUMNS = ["model_name", "metric", "build_before", "build_after", "n_before", "n_after",
+                  "median_before", "median_after", "change", "p_value", "regression"]
+
+# Smallest relative drop of the median throughput that counts as a regression
+MIN_DROP = 0.03
+ALPHA = 0.05
+
+
+def _plain(df, columns):
+    # Categories of the store differ between tables, plain objects are needed to join them
+    return df.astype({c: object for c in columns if c in df.columns and df[c].dtype == "category"})
+
+
+def append_history(runtimes, store_dir=STORE_DIR) -> pd.DataFrame:
+    """Appends the rows of runtimes not in the history yet, returns the whole history."""
+    runtimes = runtimes.copy()
+    if "build" not in runtimes.columns:
+        runtimes["build"] = None
+    runtimes["build"] = runtimes["build"].fillna(UNKNOWN_BUILD)
+
+    keys = [c for c in CONFIG_COLUMNS + ["ncore", "iteration", "node", "build"] + METRICS if c in runtimes.columns]
+    runtimes = _plain(runtimes, keys)
+    history = None
+    if table_path(HISTORY_TABLE, store_dir).exists():
+        history = _plain(load_table(HISTORY_TABLE, store_dir=store_dir), keys)
+        seen = history[keys].drop_duplicates().astype(object)
+        matched = runtimes.astype({c: object for c in keys}).merge(seen, on=keys, how="left", indicator=True)
+        runtimes = runtimes[(matched["_merge"] == "left_only").to_numpy()]
+
+    runtimes = runtimes.drop_duplicates(keys).assign(recorded=pd.Timestamp.now())
+    if not runtimes.empty:
+        append_table(runtimes, HISTORY_TABLE, store_dir)
+    print(f"{len(runtimes)} new runtime measurements added to {HISTORY_TABLE}")
+
+    return runtimes if history is None else pd.concat([history, _plain(runtimes, keys)], ignore_index=True)
+
+
+def build_order(history) -> list:
+    """Builds ordered by the time they were first recorded."""
+    first = history.groupby("build", observed=True)["recorded"].min()
+    return list(first.sort_values(kind="stable").index)
+
+
+def change_points(values, boundaries, penalty) -> list:
+    """
+    Binary segmentation of values with a mean shift cost, splits are only placed at boundaries
+    (indices where a new build starts). Returns the sorted split indices.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    total = np.concatenate([[0.0], np.cumsum(values)])
+    squares = np.concatenate([[0.0], np.cumsum(values ** 2)])
+
+    def cost(start, stop):
+        n = stop - start
+        s = total[stop] - total[start]
+        return squares[stop] - squares[start] - s * s / n
+
+    splits = []
+    segments = [(0, len(values))]
+    while segments:
+        start, stop = segments.pop()
+        candidates = [b for b in boundaries if start < b < stop]
+        if not candidates:
+            continue
+        whole = cost(start, stop)
+        gains = [whole - cost(start, b) - cost(b, stop) for b in candidates]
+        best = int(np.argmax(gains))
+        if gains[best] > penalty:
+            split = candidates[best]
+            splits.append(split)
+            segments += [(start, split), (split, stop)]
+    return sorted(splits)
+
+
+def mann_whitney_greater(before, after) -> float:
+    """One-sided p-value of before > after, U test with the normal approximation and tie correction."""
+    n1, n2 = len(before), len(after)
+    ranks = pd.Series(np.concatenate([before, after])).rank().to_numpy()
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    _, ties = np.unique(np.concatenate([before, after]), return_counts=True)
+    variance = n1 * n2 / 12 * ((n + 1) - (ties ** 3 - ties).sum() / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    # Continuity correction of 0.5
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def pooled_sigma(values, builds) -> float:
+    """Robust noise level: the MAD of the deviations from the median of each build."""
+    values = pd.Series(values)
+    deviations = values - values.groupby(np.asarray(builds)).transform("median")
+    return 1.4826 * float(deviations.abs().median())
+
+
+def regression_report(history, metrics=METRICS, min_drop=MIN_DROP, alpha=ALPHA) -> pd.DataFrame:
+    """One row per change point of a metric per (configuration, ncore), with the drops flagged."""
+    order = {build: i for i, build in enumerate(build_order(history))}
+    group_columns = [c for c in CONFIG_COLUMNS if c in history.columns] + ["ncore"]
+    history = _plain(history, group_columns).assign(build_rank=history["build"].astype(object).map(order))
+
+    rows = []
+    for key, group in history.groupby(group_columns, observed=True, dropna=False):
+        group = group.sort_values(["build_rank", "recorded"], kind="stable")
+        if group["build_rank"].nunique() < 2:
+            continue
+        for metric in metrics:
+            if metric not in group.columns:
+                continue
+            measured = group.dropna(subset=[metric])
+            values = measured[metric].to_numpy(dtype=np.float64)
+            ranks = measured["build_rank"].to_numpy()
+            boundaries = list(np.flatnonzero(np.diff(ranks)) + 1)
+            if not boundaries:
+                continue
+
+            sigma = pooled_sigma(values, ranks)
+            # Without any spread within the builds, fall back to the overall spread
+            sigma = sigma if sigma > 0 else float(np.std(values)) or 1e-12
+            splits = change_points(values, boundaries, 2 * sigma ** 2 * math.log(len(values)))
+
+            edges = [0] + splits + [len(values)]
+            builds = measured["build"].astype(object).to_numpy()
+            for left, split, right in zip(edges[:-2], edges[1:-1], edges[2:]):
+                before, after = values[left:split], values[split:right]
+                change = np.median(after) / np.median(before) - 1
+                p_value = mann_whitney_greater(before, after)
+                row = dict(zip(group_columns, key))
+                row.update({
+                    "model_name": measured["model_name"].iloc[0] if "model_name" in measured else None,
+                    "metric": metric,
+                    "build_before": builds[split - 1],
+                    "build_after": builds[split],
+                    "n_before": len(before),
+                    "n_after": len(after),
+                    "median_before": float(np.median(before)),
+                    "median_after": float(np.median(after)),
+                    "change": float(change),
+                    "p_value": p_value,
+                    "regression": bool(change <= -min_drop and p_value < alpha),
+                })
+                rows.append(row)
+
+    # The columns are fixed, so a report without change points is still written
+    return pd.DataFrame(rows, columns=group_columns + REPORT_COLUMNS)
+
+
+if __name__ == "__main__":
+    runtimes = create_runtime_table(*sys.argv[1:2])
+    history = append_history(runtimes)
+    report = regression_report(history)
+
+    # Written even when empty, the table must not keep the regressions of an earlier run
+    write_table(report, REPORT_TABLE)
+    if report.empty:
+        print(f"No change points across {history['build'].nunique()} builds")
+    else:
+        print(report.sort_values("change").to_string(
+            columns=["model_name", "ncore", "metric", "build_before", "build_after",
+                     "median_before", "median_after", "change", "p_value", "regression"],
+            index=False, float_format=lambda x: f"{x:.4g}"))
+        regressions = report[report["regression"]]
+        print(f"{len(regressions)} regressions (drop > {MIN_DROP:.0%}, p < {ALPHA})")
@@ -0,0 +1,135 @@
+"""
+Robust statistics over the iterations of the runtime sweep.
+
+For every (configuration, ncore) of the runtimes table the prompt and eval
+throughput are reduced to a median with bootstrap confidence interval after
+rejecting outliers by their median absolute deviation (MAD). The per-node bias
+shows nodes that are systematically slower or faster than the rest, and the
+required number of iterations tells how many repetitions of
+17_evalute_model_runtime.sh are needed to reach a target CI width.
+
+    python runtime_stats.py [target relative CI width, default 0.05]
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from result_store import load_table, write_table
+
+GROUP_COLUMNS = ["llama_version", "num_parameter", "quant_type", "model_name", "ncore"]
+METRICS = ["prompt_eval_throughput", "eval_throughput"]
+# Parsed from the full llama-cli logs only, aggregated where present
+LOG_METRICS = ["load_time", "total_time", "model_buffer_mib"]
+
+
+def mad_outliers(df, metric, group_columns=GROUP_COLUMNS, threshold=3.5):
+    """
+    True for values whose modified z-score 0.6745 * |x - median| / MAD within their group
+    exceeds threshold. Groups with MAD == 0 have no outliers.
+    """
+    grouped = df.groupby(group_columns, observed=True, dropna=False)[metric]
+    median = grouped.transform("median")
+    deviation = (df[metric] - median).abs()
+    mad = deviation.groupby([df[c] for c in group_columns], observed=True, dropna=False).transform("median")
+
+    score = 0.6745 * deviation / mad.where(mad > 0)
+    return (score > threshold).fillna(False)
+
+
+def bootstrap_median_ci(groups, n_boot=2000, confidence=0.95, seed=0):
+    """
+    Bootstrap confidence interval of the median for a list of 1D sample arrays.
+    Groups of equal size are resampled together in one vectorised draw.
+
+    Returns two arrays (low, high) in the order of groups.
+    """
+    rng = np.random.default_rng(seed)
+    low = np.full(len(groups), np.nan)
+    high = np.full(len(groups), np.nan)
+    alpha = (1 - confidence) / 2
+
+    sizes = np.array([len(g) for g in groups])
+    for size in np.unique(sizes):
+        if size == 0:
+            continue
+        index = np.flatnonzero(sizes == size)
+        samples = np.stack([np.asarray(groups[i], dtype=np.float64) for i in index])  # (g, n)
+
+        draws = rng.integers(0, size, size=(len(index), n_boot, size))
+        resampled = np.take_along_axis(samples[:, None, :], draws, axis=2)
+        medians = np.median(resampled, axis=2)  # (g, n_boot)
+
+        low[index], high[index] = np.quantile(medians, [alpha, 1 - alpha], axis=1)
+
+    return low, high
+
+
+def required_iterations(n, relative_ci_width, target_width):
+    """Iterations needed for target_width, assuming the CI width shrinks with 1/sqrt(n)."""
+    needed = np.ceil(n * (relative_ci_width / target_width) ** 2)
+    return np.maximum(needed, n).astype("Int64")
+
+
+def aggregate_runtimes(df, metrics=METRICS, target_width=0.05, n_boot=2000, confidence=0.95):
+    """
+    One row per (configuration, ncore) with n, n_outliers and per metric the median,
+    ci_low, ci_high, relative CI width and the iterations required for target_width.
+    """
+    group_columns = [c for c in GROUP_COLUMNS if c in df.columns]
+    result = None
+
+    for metric in metrics:
+        outlier = mad_outliers(df, metric, group_columns)
+        kept = df[~outlier & df[metric].notna()]
+
+        grouped = kept.groupby(group_columns, observed=True, dropna=False)[metric]
+        samples = grouped.apply(lambda s: s.to_numpy())
+        low, high = bootstrap_median_ci(list(samples), n_boot=n_boot, confidence=confidence)
+
+        stats = grouped.agg(["count", "median"])
+        stats.columns = [f"{metric}_n", f"{metric}_median"]
+        stats[f"{metric}_n_outliers"] = outlier.groupby([df[c] for c in group_columns], observed=True, dropna=False).sum()
+        stats[f"{metric}_ci_low"] = low
+        stats[f"{metric}_ci_high"] = high
+
+        relative_width = (stats[f"{metric}_ci_high"] - stats[f"{metric}_ci_low"]) / stats[f"{metric}_median"]
+        stats[f"{metric}_rel_ci_width"] = relative_width
+        stats[f"{metric}_required_iterations"] = required_iterations(stats[f"{metric}_n"], relative_width, target_width)
+
+        result = stats if result is None else result.join(stats, how="outer")
+
+    return result.reset_index()
+
+
+def node_bias(df, metrics=METRICS):
+    """
+    Relative deviation of every node from the median of the groups it ran in,
+    e.g. 0.97 for a node that is 3% slower than typical. The median over the
+    log-ratios makes single bad runs on a node irrelevant.
+    """
+    group_columns = [c for c in GROUP_COLUMNS if c in df.columns]
+    rows = {}
+    for metric in metrics:
+        median = df.groupby(group_columns, observed=True, dropna=False)[metric].transform("median")
+        log_ratio = np.log(df[metric] / median)
+        per_node = log_ratio.groupby(df["node"], observed=True).agg(["median", "count"])
+        rows[f"{metric}_bias"] = np.exp(per_node["median"])
+        rows["runs"] = per_node["count"]
+    return pd.DataFrame(rows).sort_values(f"{metrics[-1]}_bias")
+
+
+if __name__ == "__main__":
+    target_width = float(sys.argv[1]) if len(sys.argv) > 1 else 0.05
+
+    df = load_table("runtimes")
+    metrics = METRICS + [m for m in LOG_METRICS if m in df.columns and df[m].notna().any()]
+    stats = aggregate_runtimes(df, metrics, target_width=target_width)
+    write_table(stats, "runtime_stats")
+
+    print(node_bias(df).to_string())
+    print()
+    for metric in metrics:
+        required = stats[f"{metric}_required_iterations"]
+        print(f"{metric}: {int((required <= stats[f'{metric}_n']).sum())}/{len(stats)} groups reach a "
+              f"relative CI width of {target_width:g}, at most {required.max()} iterations required")
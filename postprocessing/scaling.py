@@ -0,0 +1,194 @@
+"""
+Strong scaling analysis of the runtime sweep over ncore.
+
+For every configuration (quant type, ZFP dim and rate) the median time per
+decode token is turned into speedup and parallel efficiency relative to the
+smallest measured core count. Amdahl (T(n) = T1 * ((1 - p) + p / n)) and
+Gustafson (S(n) = s + (1 - s) * n) models are fitted per configuration, and the
+weight bytes streamed per token (n_elements * bits_per_weight / 8) times the
+decode throughput estimate the memory bandwidth in use.
+
+    python scaling.py     # writes the scaling, scaling_fits and scaling_curves tables and scaling-8B.pdf
+"""
+import numpy as np
+import pandas as pd
+
+from model_parser import CONFIG_COLUMNS
+from result_store import load_table, write_table
+
+# Fraction of the best decode throughput of a configuration that is still "good enough"
+THROUGHPUT_FRACTION = 0.9
+
+
+def ideal_scaling(ncore_ref, time_ref, ncore):
+    """Time per token under perfect linear scaling from (ncore_ref, time_ref)."""
+    return time_ref * ncore_ref / np.asarray(ncore, dtype=np.float64)
+
+
+def fit_amdahl(ncore, time):
+    """
+    Least-squares fit of T(n) = a + b / n with a, b >= 0.
+    Returns (T1, p) with T1 = a + b the single core time and p = b / T1 the parallel fraction.
+    """
+    ncore = np.asarray(ncore, dtype=np.float64)
+    time = np.asarray(time, dtype=np.float64)
+    design = np.column_stack([np.ones_like(ncore), 1 / ncore])
+    (a, b), *_ = np.linalg.lstsq(design, time, rcond=None)
+
+    if a < 0:
+        a, b = 0.0, float(np.dot(time, 1 / ncore) / np.dot(1 / ncore, 1 / ncore))
+    elif b < 0:
+        a, b = float(time.mean()), 0.0
+
+    return a + b, b / (a + b) if a + b > 0 else np.nan
+
+
+def amdahl_time(t1, p, ncore):
+    return t1 * ((1 - p) + p / np.asarray(ncore, dtype=np.float64))
+
+
+def fit_gustafson(scale, speedup):
+    """
+    Least-squares fit of the serial fraction s in S = s + (1 - s) * scale,
+    with scale = n / n_ref and S the measured speedup relative to n_ref.
+    """
+    scale = np.asarray(scale, dtype=np.float64)
+    speedup = np.asarray(speedup, dtype=np.float64)
+    denominator = np.sum((1 - scale) ** 2)
+    if denominator == 0:
+        return np.nan
+    return float(np.sum((speedup - scale) * (1 - scale)) / denominator)
+
+
+def scaling_table(runtimes, quantization=None):
+    """
+    One row per (configuration, ncore) with the median eval time [ms per token],
+    throughput, speedup, efficiency and, if quantization provides n_elements and
+    bits_per_weight, the streamed weight bandwidth [GB/s].
+    """
+    group_columns = [c for c in CONFIG_COLUMNS if c in runtimes.columns]
+    # Categories of the store differ between tables, plain objects are needed to join them
+    runtimes = runtimes.astype({c: object for c in group_columns if runtimes[c].dtype == "category"})
+    table = (runtimes
+             .groupby(group_columns + ["ncore"], observed=True, dropna=False)
+             .agg(eval_time=("eval_time", "median"), eval_throughput=("eval_throughput", "median"))
+             .reset_index())
+
+    grouped = table.groupby(group_columns, observed=True, dropna=False)
+    ncore_ref = grouped["ncore"].transform("min")
+    time_ref = table["eval_time"].where(table["ncore"] == ncore_ref).groupby(
+        [table[c] for c in group_columns], observed=True, dropna=False).transform("max")
+
+    table["ncore_ref"] = ncore_ref
+    table["speedup"] = time_ref / table["eval_time"]
+    table["efficiency"] = table["speedup"] / (table["ncore"] / ncore_ref)
+
+    if quantization is not None:
+        quantization = quantization.astype({c: object for c in group_columns if quantization[c].dtype == "category"})
+        weights = quantization[group_columns + ["n_elements", "bits_per_weight"]].drop_duplicates(group_columns)
+        table = table.merge(weights, on=group_columns, how="left")
+        bytes_per_token = table["n_elements"].astype("float64") * table["bits_per_weight"] / 8
+        table["bandwidth_gbs"] = bytes_per_token * table["eval_throughput"] / 1e9
+
+    return table
+
+
+def fit_scaling(table):
+    """Amdahl and Gustafson fits and the cheapest good core count per configuration."""
+    group_columns = [c for c in CONFIG_COLUMNS if c in table.columns]
+    rows = []
+    for key, group in table.groupby(group_columns, observed=True, dropna=False):
+        group = group.sort_values("ncore")
+        if len(group) < 2:
+            continue
+
+        t1, p = fit_amdahl(group["ncore"], group["eval_time"])
+        serial = fit_gustafson(group["ncore"] / group["ncore_ref"], group["speedup"])
+
+        # Cheapest core count that reaches THROUGHPUT_FRACTION of the best throughput
+        best = group["eval_throughput"].max()
+        good = group[group["eval_throughput"] >= THROUGHPUT_FRACTION * best].iloc[0]
+
+        row = dict(zip(group_columns, key if isinstance(key, tuple) else (key,)))
+        row.update({
+            "amdahl_t1": t1,
+            "amdahl_parallel_fraction": p,
+            "amdahl_max_speedup": np.inf if p == 1 else 1 / (1 - p),
+            "gustafson_serial_fraction": serial,
+            "max_eval_throughput": best,
+            "cheapest_ncore": int(good["ncore"]),
+            "cheapest_eval_throughput": good["eval_throughput"],
+        })
+        if "bandwidth_gbs" in group.columns:
+            row["max_bandwidth_gbs"] = group["bandwidth_gbs"].max()
+            row["bandwidth_at_cheapest_gbs"] = good["bandwidth_gbs"]
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def fitted_curves(fits, ncore):
+    """Amdahl fitted time per token for every configuration on the ncore grid, as data."""
+    group_columns = [c for c in CONFIG_COLUMNS if c in fits.columns]
+    ncore = np.asarray(ncore, dtype=np.float64)
+    frames = []
+    for _, fit in fits.iterrows():
+        frame = pd.DataFrame({"ncore": ncore, "eval_time_fit": amdahl_time(fit["amdahl_t1"], fit["amdahl_parallel_fraction"], ncore)})
+        for column in group_columns:
+            frame[column] = fit[column]
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def config_label(row):
+    if row["quant_type"] in ["rate", "accu", "prec"]:
+        return f'{str(row["quant_type"]).title()}:{row["threshold_low"]:g}-Block:{int(4 ** row["dim"])}'
+    return str(row["quant_type"])
+
+
+def plot_scaling(table, output="scaling-8B.pdf"):
+    """Measured speedup per configuration with its Amdahl fit and ideal scaling."""
+    import matplotlib.pyplot as plt
+
+    group_columns = [c for c in CONFIG_COLUMNS if c in table.columns]
+    fig, ax = plt.subplots(figsize=(5.5, 3.8), dpi=250)
+    cmap = plt.get_cmap('tab10')
+    ncore_grid = np.linspace(table["ncore"].min(), table["ncore"].max(), 100)
+
+    for i, (_, group) in enumerate(table.groupby(group_columns, observed=True, dropna=False)):
+        group = group.sort_values("ncore")
+        color = cmap(i % 10)
+        ax.plot(group["ncore"], group["speedup"], "o", color=color, label=config_label(group.iloc[0]))
+
+        if len(group) > 1:
+            t1, p = fit_amdahl(group["ncore"], group["eval_time"])
+            ncore_ref = group["ncore_ref"].iloc[0]
+            ax.plot(ncore_grid, amdahl_time(t1, p, ncore_ref) / amdahl_time(t1, p, ncore_grid),
+                    "--", color=color, linewidth=1)
+
+    ncore_ref = table["ncore_ref"].min()
+    ax.plot(ncore_grid, ncore_grid / ncore_ref, "-", color="k", label="Ideal scaling")
+
+    ax.set_xlabel("Number of Threads")
+    ax.set_ylabel("Decode speedup")
+    ax.set_title("Strong scaling of the decode step (dashed: Amdahl fit)")
+    ax.grid(True, linestyle='--', linewidth=0.5)
+    ax.legend(ncol=2, fontsize="x-small", loc='upper left')
+    plt.tight_layout()
+    plt.savefig(output, transparent=True)
+    plt.close()
+
+
+if __name__ == "__main__":
+    runtimes = load_table("runtimes", filters=[("num_parameter", "==", "8B")])
+    quantization = load_table("all_data", columns=CONFIG_COLUMNS + ["n_elements", "bits_per_weight"])
+
+    table = scaling_table(runtimes, quantization.dropna(subset=["n_elements", "bits_per_weight"]))
+    fits = fit_scaling(table)
+
+    write_table(table, "scaling")
+    write_table(fits, "scaling_fits")
+    write_table(fitted_curves(fits, np.arange(1, table["ncore"].max() + 1)), "scaling_curves")
+    plot_scaling(table)
+
+    print(fits.to_string())
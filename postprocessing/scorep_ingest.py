@@ -0,0 +1,182 @@
+"""
+Per ggml op cost tables from Score-P profiles and traces.
+
+Every Score-P run of llama-cli (scripts/19_evaluate_model_runtime_scorep.sh, an
+instrumented build) writes an experiment directory named like the runtime result
+file, below job_results/<model>/scorep:
+
+    ../job_results/Meta-Llama-3.1-8B/scorep/Meta-Llama-3.1-8B-ZFPrate4.00:4.00_3+NOI_n96_i1/
+        profile.cubex    (SCOREP_ENABLE_PROFILING)
+        traces.otf2      (SCOREP_ENABLE_TRACING)
+
+The instrumented regions are mapped to ggml ops with OP_PATTERNS, anything else
+is "other". Per configuration, ncore, iteration and op the exclusive time (summed
+over threads), the visits and every hardware counter of the profile are
+aggregated. The profile is read with pycubexr. Runs without a profile are read
+from the trace with the otf2 bindings, event by event, which gives time and visits
+but no counters. Both packages are only needed for the files they read:
+pycubexr from PyPI (pip install pycubexr), otf2 are the Python bindings installed
+with OTF2, e.g. the lib/python*/site-packages of the Score-P of 02_install_scorep.sh
+on the PYTHONPATH.
+
+    python scorep_ingest.py     # writes the scorep_ops and scorep_runtime tables
+"""
+import glob
+import re
+from pathlib import Path
+
+import pandas as pd
+
+from ingest import ingest
+from model_parser import CONFIG_COLUMNS, parse_model
+from result_store import load_table, write_table
+
+# Bump whenever the parsers change, cached records of older versions are discarded
+PARSER_VERSION = 1
+
+# (op, pattern on the region name), the first match wins
+OP_PATTERNS = [
+    ("zfp_decompress", re.compile(r"zfp.*decompress|decompress_.*(float|block)|decode_.*block", re.I)),
+    ("zfp_compress", re.compile(r"zfp.*compress|compress_.*(float|block)|encode_.*block", re.I)),
+    ("mul_mat", re.compile(r"mul_mat|vec_dot|gemm|gemv", re.I)),
+    ("get_rows", re.compile(r"get_rows", re.I)),
+    ("rms_norm", re.compile(r"rms_norm", re.I)),
+    ("rope", re.compile(r"rope", re.I)),
+    ("soft_max", re.compile(r"soft_max", re.I)),
+    ("glu", re.compile(r"silu|swiglu|glu", re.I)),
+    ("add", re.compile(r"forward_add|vec_add", re.I)),
+    ("mul", re.compile(r"forward_mul\b|vec_mul", re.I)),
+    ("cpy", re.compile(r"forward_cpy|forward_dup|fp16_to_fp32|fp32_to_fp16", re.I)),
+    ("sync", re.compile(r"barrier|omp_|pthread|sync", re.I)),
+]
+
+TIME_METRIC = "time"
+VISITS_METRIC = "visits"
+
+
+def ggml_op(region: str) -> str:
+    for op, pattern in OP_PATTERNS:
+        if pattern.search(region):
+            return op
+    return "other"
+
+
+def experiment_setup(directory) -> dict:
+    """Configuration, ncore and iteration of an experiment directory ..._n{ncore}_i{iteration}."""
+    name = Path(directory).name
+    match = re.match(r"^(?P<stem>.+)_n(?P<ncore>\d+)_i(?P<iteration>\d+)$", name)
+    if match is None:
+        raise ValueError(f"Unknown Score-P experiment directory: {name}")
+    return {
+        **parse_model(match.group("stem") + ".scorep"),
+        "ncore": int(match.group("ncore")),
+        "iteration": int(match.group("iteration")),
+    }
+
+
+def read_cube(path) -> dict:
+    """{op: {metric: value}} of a CUBE profile, exclusive values summed over all threads."""
+    from pycubexr import CubexParser
+
+    totals = {}
+    with CubexParser(str(path)) as parser:
+        for metric in parser.get_metrics():
+            try:
+                values = parser.get_metric_values(metric=metric)
+            except Exception:
+                # Derived metrics have no stored values
+                continue
+            for index in values.cnode_indices:
+                cnode = parser.get_cnode(index)
+                op = ggml_op(parser.get_region(cnode).name)
+                value = float(sum(values.cnode_values(cnode, convert_to_exclusive=True)))
+                op_totals = totals.setdefault(op, {})
+                op_totals[metric.name] = op_totals.get(metric.name, 0.0) + value
+    return totals
+
+
+def read_otf2(path) -> dict:
+    """{op: {"time": s, "visits": n}} of an OTF2 trace, exclusive time per thread from its call stack."""
+    import otf2
+
+    totals = {}
+    stacks = {}
+    with otf2.reader.open(str(path)) as trace:
+        resolution = trace.definitions.clock_properties.timer_resolution
+        for location, event in trace.events:
+            stack = stacks.setdefault(location, [])
+            if isinstance(event, otf2.events.Enter):
+                # [op, enter time, time spent in callees]
+                stack.append([ggml_op(event.region.name), event.time, 0])
+            elif isinstance(event, otf2.events.Leave) and stack:
+                op, start, children = stack.pop()
+                duration = event.time - start
+                if stack:
+                    stack[-1][2] += duration
+                op_totals = totals.setdefault(op, {TIME_METRIC: 0.0, VISITS_METRIC: 0.0})
+                op_totals[TIME_METRIC] += (duration - children) / resolution
+                op_totals[VISITS_METRIC] += 1
+    return totals
+
+
+def experiment_sources(directory):
+    return [Path(directory) / "profile.cubex", Path(directory) / "traces.otf2"]
+
+
+def parse_experiment(directory) -> list:
+    """One record per ggml op of an experiment directory, from its profile or else its trace."""
+    setup = experiment_setup(directory)
+    cube, trace = experiment_sources(directory)
+    if cube.exists():
+        totals, source = read_cube(cube), "cube"
+    elif trace.exists():
+        totals, source = read_otf2(trace), "otf2"
+    else:
+        raise FileNotFoundError(f"Neither {cube.name} nor {trace.name} in {directory}")
+
+    return [{**setup, "op": op, "source": source, **metrics} for op, metrics in totals.items()]
+
+
+def collect_ops(pattern="../job_results/Meta-Llama-3.1-*B/scorep/*"):
+    directories = sorted(d for d in glob.glob(pattern) if Path(d).is_dir())
+    records = ingest(directories, parse_experiment, "scorep", PARSER_VERSION, sources=experiment_sources)
+    return [row for rows in records.values() for row in rows]
+
+
+def op_table(rows) -> pd.DataFrame:
+    """Per configuration, ncore, iteration and op: the metrics and the share of the run's exclusive time."""
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    run_columns = [c for c in CONFIG_COLUMNS if c in df.columns] + ["ncore", "iteration"]
+    run_time = df.groupby(run_columns, dropna=False)[TIME_METRIC].transform("sum")
+    df["time_fraction"] = df[TIME_METRIC] / run_time
+    return df
+
+
+def with_runtimes(ops, runtimes) -> pd.DataFrame:
+    """ops joined to the runtime measurements of the same configuration, ncore and iteration."""
+    keys = [c for c in CONFIG_COLUMNS if c in ops.columns and c in runtimes.columns] + ["ncore", "iteration"]
+    measured = ["eval_time", "eval_throughput", "prompt_eval_time", "prompt_eval_throughput"]
+    # Categories of the store differ between tables, plain objects are needed to join them
+    runtimes = runtimes.astype({c: object for c in keys if runtimes[c].dtype == "category"})
+    ops = ops.astype({c: object for c in keys if ops[c].dtype == "category"})
+    columns = keys + [c for c in measured if c in runtimes.columns]
+    return ops.merge(runtimes[columns].drop_duplicates(keys), on=keys, how="left")
+
+
+if __name__ == "__main__":
+    ops = op_table(collect_ops())
+    if ops.empty:
+        raise SystemExit("No Score-P experiments found, see scripts/19_evaluate_model_runtime_scorep.sh")
+    write_table(ops, "scorep_ops")
+
+    joined = with_runtimes(ops, load_table("runtimes"))
+    write_table(joined, "scorep_runtime")
+
+    # Where the time goes as the cores scale
+    share = (joined
+             .groupby(["model_name", "ncore", "op"], observed=True)["time_fraction"].median()
+             .unstack("op")
+             .fillna(0))
+    print(share.to_string(float_format=lambda x: f"{x:.3f}"))
@@ -0,0 +1,16 @@
+"""
+Matplotlib style of the paper figures.
+
+Importing the plot modules changes nothing, the scripts and the figure workers
+call apply_style() before they draw.
+"""
+
+
+def apply_style():
+    """White background and serif fonts (Times New Roman where installed)."""
+    import matplotlib.pyplot as plt
+
+    plt.style.use("default")
+    plt.rcParams.update({'figure.facecolor': 'white', 'axes.facecolor': 'white'})
+    plt.rc('font', family='serif')
+    plt.rcParams["font.serif"] = ["Times New Roman", "DejaVu Serif", "Bitstream Vera Serif"]
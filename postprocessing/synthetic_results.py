@@ -0,0 +1,234 @@
+"""
+Synthetic job_results trees for testing and benchmarking the parsers.
+
+Writes the four result categories of a sweep in the formats the jobs produce,
+with the names and sizes of the real runs:
+
+    <root>/Meta-Llama-<model>/quantization/<name>.out                  ZFP_RESULT / QUANT_RESULT line
+    <root>/Meta-Llama-<model>/tensor_comparison/<F16@name>.out         per-layer stats and histograms
+    <root>/Meta-Llama-<model>/model_performance/<F16@name>.{ppl,hellaswag}   full llama-perplexity logs
+    <root>/Meta-Llama-<model>/runtime_performance/<name>_n<N>_i<i>.out
+
+The configurations are the ones of the sweep planner (SWEEP, or TEST_SWEEP),
+the layers those of Llama 3.1 8B and 70B. Values are random but plausible and
+depend only on the seed.
+
+    python synthetic_results.py <root> [--test] [--seed 0]
+"""
+import argparse
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from gguf_compare import format_result, histogram_edges
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from sweep_planner import SWEEP, TEST_SWEEP  # noqa: E402
+
+# n_layer, n_embd, n_ff, n_embd_kv, n_vocab, n_elements
+ARCHITECTURES = {
+    "8B": (32, 4096, 14336, 1024, 128256, 8030261248),
+    "70B": (80, 8192, 28672, 1024, 128256, 70553706560),
+}
+
+# Chunks of wikitext-2 at n_ctx 512, as in 15_evaluate_model_performance.sh
+PPL_CHUNKS = 584
+HELLASWAG_TASKS = 4000
+
+
+def layer_shapes(num_parameter):
+    """[(tensor name, n_elements)] in the order llama-compare-tensors prints them."""
+    n_layer, n_embd, n_ff, n_kv, n_vocab, _ = ARCHITECTURES[num_parameter]
+    layers = [("token_embd.weight", n_vocab * n_embd)]
+    for i in range(n_layer):
+        layers += [
+            (f"blk.{i}.attn_norm.weight", n_embd),
+            (f"blk.{i}.attn_q.weight", n_embd * n_embd),
+            (f"blk.{i}.attn_k.weight", n_embd * n_kv),
+            (f"blk.{i}.attn_v.weight", n_embd * n_kv),
+            (f"blk.{i}.attn_output.weight", n_embd * n_embd),
+            (f"blk.{i}.ffn_norm.weight", n_embd),
+            (f"blk.{i}.ffn_gate.weight", n_embd * n_ff),
+            (f"blk.{i}.ffn_up.weight", n_embd * n_ff),
+            (f"blk.{i}.ffn_down.weight", n_ff * n_embd),
+        ]
+    layers += [("output_norm.weight", n_embd), ("output.weight", n_vocab * n_embd)]
+    return layers
+
+
+def nominal_bpw(name) -> float:
+    """Rough bits per weight of a weight name like ZFPrate4.00:4.00_3+NOI or Q4_K_M+NOI."""
+    zfp = re.match(r"ZFP(rate|prec|accu)([\d.]+)", name)
+    if zfp:
+        mode, value = zfp.group(1), float(zfp.group(2))
+        if mode == "rate":
+            return value
+        if mode == "prec":
+            return 0.7 * value
+        return 3 + 6 * (0.15 - value) / 0.14
+    if name.startswith(("F16", "BF16")):
+        return 16.0
+    digit = re.search(r"\d", name)
+    return float(digit.group()) + 0.5 if digit else 4.5
+
+
+def sweep_names(sweep, model):
+    """Weight names (without the Meta-Llama-<model>- prefix) of the quantization sweep."""
+    imat_tags = {"wi_imat": "WII", "no_imat": "NOI"}
+    names = []
+    for mode in sweep["zfp"]["modes"]:
+        for imatrix in sweep["imatrices"]:
+            if imatrix == "wi_imat" and mode != "rate":
+                continue
+            for dim in sweep["zfp"]["dims"]:
+                for value in sweep["zfp"]["parameters"][mode]:
+                    high = "8.00" if imatrix == "wi_imat" else value
+                    names.append(f"ZFP{mode}{value}:{high}_{dim}+{imat_tags[imatrix]}")
+    for mode in sweep["native"]["modes"]:
+        for imatrix in sweep["imatrices"]:
+            names.append(f"{mode}+{imat_tags[imatrix]}")
+    return names
+
+
+def quantization_result(name, num_parameter, rng) -> str:
+    n_elements = ARCHITECTURES[num_parameter][5]
+    bpw = nominal_bpw(name) * (1 + rng.uniform(0, 1e-3))
+    record = "ZFP_RESULT" if name.startswith("ZFP") else "QUANT_RESULT"
+    return (f"{record}, n_elements, {n_elements}, bits_per_weight, {bpw:.6f}, "
+            f"compressed_size(MiB), {n_elements * bpw / 8 / 1024 ** 2:.2f}\n")
+
+
+def tensor_comparison_result(name, num_parameter, rng) -> str:
+    layers = layer_shapes(num_parameter)
+    scale = 2.0 ** -nominal_bpw(name) * 0.05
+    edges = histogram_edges()
+
+    stats, counts = [], []
+    for _, n in layers:
+        rmse = scale * rng.lognormal(0, 0.3)
+        # Absolute errors are roughly exponential, the bins hold their counts
+        probabilities = np.diff(1 - np.exp(-edges / rmse))
+        layer_counts = rng.multinomial(n, probabilities / probabilities.sum())
+        counts.append(layer_counts)
+        stats.append([rmse, rmse * rng.uniform(8, 40), 3 * rmse, 0.7 * rmse])
+
+    counts = np.array(counts, dtype=np.int64)
+    stats = np.array(stats)
+    total = np.array([[np.sqrt((stats[:, 0] ** 2 * [n for _, n in layers]).sum() / sum(n for _, n in layers)),
+                       stats[:, 1].max(), 3 * scale, 0.7 * scale]])
+    names = np.array(["global"] + [layer for layer, _ in layers])
+    return format_result(names, np.vstack([total, stats]), edges, np.vstack([counts.sum(axis=0), counts]))
+
+
+def perplexity_log(name, num_parameter, rng, n_chunks=PPL_CHUNKS) -> str:
+    final = 6.2 * (1 + 2.0 ** -(nominal_bpw(name) - 2)) * (1.1 if num_parameter == "8B" else 0.55)
+    lines = [f"llama_model_loader: - kv {i:3d}: synthetic.key_{i} str = value" for i in range(40)]
+    lines += [f"llama_model_loader: - tensor {i:4d}: {layer:32s} f16 [{n}]" for i, (layer, n) in
+              enumerate(layer_shapes(num_parameter))]
+    lines += [
+        "perplexity: tokenizing the input ..",
+        "perplexity: tokenization took 812.2 ms",
+        f"perplexity: calculating perplexity over {n_chunks} chunks, n_ctx=512, batch_size=2048, n_seq=4",
+        "perplexity: 2.31 seconds per pass - ETA 5.62 minutes",
+    ]
+    # The running PPL starts high and settles at the final value
+    curve = final * (1 + 0.6 * np.exp(-np.arange(1, n_chunks + 1) / 40)) * (1 + rng.normal(0, 0.003, n_chunks))
+    lines.append("".join(f"[{i}]{value:.4f}," for i, value in enumerate(curve, start=1)))
+    lines += [
+        f"Final estimate: PPL = {curve[-1]:.4f} +/- {curve[-1] * 0.006:.5f}",
+        "",
+        "llama_perf_context_print:        load time =    1834.01 ms",
+        "llama_perf_context_print: prompt eval time =  301234.56 ms / 299008 tokens (    1.01 ms per token,   992.60 tokens per second)",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def hellaswag_log(name, rng, n_tasks=HELLASWAG_TASKS) -> str:
+    final = min(85.0, 40 + 5 * nominal_bpw(name))
+    lines = ["hellaswag_score: loaded 10042 tasks from prompt.",
+             f"hellaswag_score: selecting {n_tasks} random tasks.",
+             "hellaswag_score: calculating HellaSwag score over selected tasks.",
+             "",
+             "task\tacc_norm\t95% confidence interval"]
+    correct = rng.random(n_tasks) < final / 100
+    accuracy = 100 * np.cumsum(correct) / np.arange(1, n_tasks + 1)
+    lines += [f"{i}\t{value:.8f}\t[{max(value - 5, 0):.4f}%, {min(value + 5, 100):.4f}%]"
+              for i, value in enumerate(accuracy, start=1)]
+    return "\n".join(lines) + "\n"
+
+
+def runtime_result(result_name, ncore, iteration, rng) -> str:
+    ms_per_token = 20 + 2000 / ncore * rng.lognormal(0, 0.05)
+    prompt_ms = ms_per_token / 5
+
+    def number(value):
+        # The nodes print comma decimals
+        return f"{value:.2f}".replace(".", ",")
+
+    load_ms = 1500 * rng.lognormal(0, 0.1)
+    total_ms = load_ms + 154 * prompt_ms + 199 * ms_per_token
+    # Metadata line and the llama-cli log as the job scripts keep it, shortened to the parsed lines
+    return (f"{result_name},ncores,{ncore},iteration,{iteration},node,n{1300 + iteration}\n"
+            f"load_tensors:          CPU model buffer size = {number(4437.8)} MiB\n"
+            f"llama_kv_cache_init:        CPU KV buffer size = {number(512)} MiB\n"
+            f"llama_new_context_with_model:        CPU  output buffer size = {number(0.49)} MiB\n"
+            f"llama_new_context_with_model:        CPU compute buffer size = {number(258.5)} MiB\n"
+            f"llama_new_context_with_model: graph nodes  = 1030\n"
+            f"llama_new_context_with_model: graph splits = 1\n"
+            f"llama_perf_sampler_print:    sampling time = {number(12.3)} ms /   353 runs   "
+            f"( {number(12.3 / 353)} ms per token, {number(353000 / 12.3)} tokens per second)\n"
+            f"llama_perf_context_print:        load time = {number(load_ms)} ms\n"
+            f"llama_perf_context_print: prompt eval time = {number(154 * prompt_ms)} ms /   154 tokens "
+            f"( {number(prompt_ms)} ms per token, {number(1000 / prompt_ms)} tokens per second)\n"
+            f"llama_perf_context_print:        eval time = {number(199 * ms_per_token)} ms /   199 runs   "
+            f"( {number(ms_per_token)} ms per token, {number(1000 / ms_per_token)} tokens per second)\n"
+            f"llama_perf_context_print:       total time = {number(total_ms)} ms /   353 tokens\n")
+
+
+def generate(root, sweep=SWEEP, seed=0) -> dict:
+    """Writes the synthetic tree below root, returns the number of files per category."""
+    rng = np.random.default_rng(seed)
+    written = {"quantization": 0, "tensor_comparison": 0, "model_performance": 0, "runtime_performance": 0}
+
+    for model in sweep["models"]:
+        prefix = f"Meta-Llama-{model}"
+        num_parameter = model.split("-")[-1]
+        model_dir = Path(root) / prefix
+        for category in written:
+            (model_dir / category).mkdir(parents=True, exist_ok=True)
+
+        for name in sweep_names(sweep, model):
+            (model_dir / "quantization" / f"{prefix}-{name}.out").write_text(
+                quantization_result(name, num_parameter, rng))
+            f16_name = f"{prefix}-F16@{name}"
+            (model_dir / "tensor_comparison" / f"{f16_name}.out").write_text(
+                tensor_comparison_result(name, num_parameter, rng))
+            (model_dir / "model_performance" / f"{f16_name}.ppl").write_text(perplexity_log(name, num_parameter, rng))
+            (model_dir / "model_performance" / f"{f16_name}.hellaswag").write_text(hellaswag_log(name, rng))
+            written["quantization"] += 1
+            written["tensor_comparison"] += 1
+            written["model_performance"] += 2
+
+        if model in sweep["runtime"]["models"]:
+            for weights in sweep["runtime"]["weights"]:
+                for ncore in sweep["runtime"]["cores"]:
+                    for iteration in range(1, sweep["runtime"]["iterations"] + 1):
+                        result_name = f"{prefix}-{weights}"
+                        path = model_dir / "runtime_performance" / f"{result_name}_n{ncore}_i{iteration}.out"
+                        path.write_text(runtime_result(result_name, ncore, iteration, rng))
+                        written["runtime_performance"] += 1
+
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Writes a synthetic job_results tree.")
+    parser.add_argument("root")
+    parser.add_argument("--test", action="store_true", help="the configurations of the test sweep")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    counts = generate(args.root, TEST_SWEEP if args.test else SWEEP, args.seed)
+    print(", ".join(f"{category}: {count} files" for category, count in counts.items()))
@@ -1,18 +1,41 @@
-import pandas as pd
 import matplotlib.pyplot as plt
-import json
-import math
-plt.style.use("default")
-plt.rcParams.update({'figure.facecolor': 'white','axes.facecolor': 'white'})
-plt.rc('font', family='serif')
-plt.rcParams["font.serif"] = ["Times New Roman", "DejaVu Serif", "Bitstream Vera Serif"]
+from pathlib import Path
 
-patterns = ['///', '\\\\\\','/','\\']
-def plot_overlay_multi(input_data):
-    data = pd.read_csv(input_data)
+from histograms import HistogramSet
+from result_store import load_table, table_mtime
+from style import apply_style
 
-    # Filter for the "global" layer
-    working_data = data[data["layer"] == "global"]
+patterns = ['///', '\\\\\\','/','\\']
+def load_histograms(input_data, histogram_file, model_dirs="../job_results/Meta-Llama-3.1-*B"):
+    """
+    Loads the binary histogram set. When the file is missing or older than the table
+    input_data, it is rebuilt from the comparison logs below model_dirs (cached by the
+    ingestion manifest, so only new logs are parsed).
+    """
+    histogram_path = Path(histogram_file)
+    table_modified = table_mtime(input_data)
+    if histogram_path.exists() and (table_modified is None or histogram_path.stat().st_mtime_ns >= table_modified):
+        return HistogramSet.load(histogram_file)
+
+    from merge_all_data import tf_difference_histograms, tf_difference_records
+
+    records = [record for record in tf_difference_records(model_dirs) if record['histogram_counts'] is not None]
+    if not records:
+        raise FileNotFoundError(f"No histograms in the comparison logs below {model_dirs}, run "
+                                f"llama-compare-tensors with --histogram and postprocess.py merge first")
+    histograms = tf_difference_histograms(records)
+    histograms.save(histogram_file)
+    return histograms
+
+def plot_overlay_multi(input_data, histogram_file="histograms.npz"):
+    histograms = load_histograms(input_data, histogram_file)
+
+    # Only the "global" layer is needed
+    working_data = load_table(
+        input_data,
+        columns=["model_name", "layer", "quant_type", "dim", "threshold_low", "threshold_high", "imat"],
+        filters=[("layer", "==", "global")],
+    )
 
     #----------------------------------------------------------------------
     # 1) DEFINE THE QUERIES FOR THE 4 SUBPLOTS
@@ -90,35 +113,25 @@ def plot_overlay_multi(input_data):
     # 3) LOOP OVER THE 4 FILTERS AND PLOT THE NORMALIZED HISTOGRAM FOR EACH
     #----------------------------------------------------------------------
     for i, q in enumerate(queries):
-        # Get the subset of data corresponding to the query
-        sub_df = working_data[q["filter"]].copy()
-        barplot_data = sub_df["histogram"]
+        # Get the subset of data corresponding to the query. Models without histograms
+        # (none printed, or skipped for other bin edges) are left out of the figure.
+        sub_df = working_data[q["filter"]]
+        missing = sorted(set(sub_df["model_name"]) - set(histograms.models))
+        if missing:
+            print(f"No histograms for {', '.join(missing)}, left out of \"{q['name']}\"")
+            sub_df = sub_df[sub_df["model_name"].isin(histograms.models)]
+
+        # Normalise all histograms of this query at once
+        selected = histograms.select(models=sub_df["model_name"], layers=["global"])
+        fractions = selected.fractions()[:, 0, :]
+        bin_mid = selected.bin_mids()
+        bin_width = selected.bin_widths()
 
         # Use the current subplot axis
         ax = axes[i]
 
-        for idx, data_str in enumerate(barplot_data):
-            # Preprocess the histogram data: adjust quotes and handle "inf"
-            data_tmp = data_str.strip('"').replace("'", '"').replace("inf", "Infinity")
-            data_list = json.loads(data_tmp)
-            df = pd.DataFrame(data_list)
-
-            # Replace infinite bin_end values with the maximum finite value in that row
-            if df['bin_end'].apply(math.isinf).any():
-                max_finite = df.loc[~df['bin_end'].apply(math.isinf), 'bin_end'].max()
-                df.loc[df['bin_end'].apply(math.isinf), 'bin_end'] = max_finite
-
-            # Compute bin midpoint and width
-            df['bin_mid'] = (df['bin_start'] + df['bin_end']) / 2
-            df['bin_width'] = df['bin_end'] - df['bin_start']
-
-            # Compute the fraction per bin: count divided by total count
-            total_count = df['count'].sum()
-            if total_count > 0:
-                df['fraction'] = df['count'] / total_count
-            else:
-                df['fraction'] = 0
-
+        labels = []
+        for idx, fraction in enumerate(fractions):
             # Create a label for this histogram (only use it for the first entry)
             row = sub_df.iloc[idx]
             if str(row["quant_type"]) in ["rate", "accu", "prec"]:
@@ -126,8 +139,10 @@ def plot_overlay_multi(input_data):
             else:
                 distribution_name = str(row["quant_type"])
 
+            labels.append(distribution_name)
+
             color = cmap(idx % 10)
-            ax.bar(df['bin_mid'], df['fraction'], width=df['bin_width'],
+            ax.bar(bin_mid, fraction, width=bin_width,
                    edgecolor='black', align='center',
                    color=color,
                    alpha=0.7,
@@ -143,11 +158,41 @@ def plot_overlay_multi(input_data):
         if not sub_df.empty:
             ax.legend(title="Quantization Type")
 
+        if i == 0:
+            cdf_models, cdf_labels = list(sub_df["model_name"]), labels
+
     plt.tight_layout()
     plt.savefig("Llama-3.1-8B-tensor_compare_Q4_K_M_ZFP_Rate4.50:4.50_3.pdf", bbox_inches='tight', pad_inches=0.05, transparent=True)
-    plt.show()
+    plt.close()
+
+    plot_cdf_multi(histograms, cdf_models, cdf_labels, "Llama-3.1-8B-tensor_compare_cdf.pdf")
+
+def plot_cdf_multi(histograms, models, labels, output):
+    """
+    Cumulative fraction of the absolute difference of the "global" layer, one line per model.
+    """
+    selected = histograms.select(models=models, layers=["global"])
+    cdf = selected.cdf()[:, 0, :]
+    upper_edges = selected.finite_edges()[1:]
+
+    fig, ax = plt.subplots(figsize=(5.5, 3.8), dpi=250)
+    for label, values in zip(labels, cdf):
+        ax.step(upper_edges, values, where="post", label=label)
+
+    ax.set_xlabel("Absolute difference")
+    ax.set_ylabel("Cumulative fraction")
+    ax.set_xscale("log")
+    ax.set_ylim(0, 1.02)
+    ax.grid(True, linestyle='--', linewidth=0.5)
+    if labels:
+        ax.legend(title="Quantization Type", loc='lower right')
+
+    plt.tight_layout()
+    plt.savefig(output, bbox_inches='tight', pad_inches=0.05, transparent=True)
+    plt.close()
 
 if __name__ == "__main__":
-    input_data = "summary.csv"
+    apply_style()
+    input_data = "tensor_comparison"
     plot_overlay_multi(input_data)
     print("Done!")
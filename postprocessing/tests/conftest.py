@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The postprocessing modules import each other by their flat names
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+@pytest.fixture(scope="session")
+def synthetic_root(tmp_path_factory):
+    """job_results tree of the TEST_SWEEP, written once per session."""
+    from synthetic_results import TEST_SWEEP, generate
+
+    root = tmp_path_factory.mktemp("job_results")
+    generate(root, TEST_SWEEP)
+    return root
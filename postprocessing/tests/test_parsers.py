@@ -0,0 +1,171 @@
+"""
+Parser tests: round trips over the synthetic job_results tree, and the log
+excerpts of tests/data, which are written independently of synthetic_results.py
+so a format drift of the generator does not hide a broken parser.
+
+    cd postprocessing && python -m pytest tests
+"""
+import glob
+
+import numpy as np
+import pytest
+
+import create_runtime_csv
+import merge_all_data
+from conftest import DATA_DIR
+from gguf_compare import format_result, histogram_edges
+from histograms import HistogramSet
+from load_benchmark import parse_file_load
+from perplexity_log import HellaswagTracker, PerplexityTracker
+from synthetic_results import ARCHITECTURES, HELLASWAG_TASKS, PPL_CHUNKS, layer_shapes, nominal_bpw
+
+MODEL = "Meta-Llama-3.1-8B"
+
+
+def files(root, category, suffix="*.out"):
+    paths = sorted(glob.glob(f"{root}/{MODEL}/{category}/{suffix}"))
+    assert paths, f"no {category} files below {root}"
+    return paths
+
+
+# Round trips over the synthetic tree
+
+def test_quantization_round_trip(synthetic_root):
+    for path in files(synthetic_root, "quantization"):
+        record = merge_all_data.parse_file_quantization(path)
+        name = record["model_name"].removeprefix("3.1-8B-")
+        assert record["n_elements"] == ARCHITECTURES["8B"][5]
+        assert record["bits_per_weight"] == pytest.approx(nominal_bpw(name), rel=1e-3)
+
+
+def test_tensor_comparison_round_trip():
+    rng = np.random.default_rng(0)
+    edges = histogram_edges()
+    names = np.array(["global", "token_embd.weight", "output_norm.weight"])
+    stats = rng.uniform(0, 0.01, (len(names), 4))
+    counts = rng.integers(0, 10 ** 9, (len(names), len(edges) - 1))
+
+    parsed_names, parsed_stats, parsed_edges, parsed_counts = merge_all_data.scan_tf_difference(
+        format_result(names, stats, edges, counts).encode())
+
+    np.testing.assert_array_equal(parsed_names, names)
+    np.testing.assert_allclose(parsed_stats, stats, atol=1e-4)
+    np.testing.assert_allclose(parsed_edges, edges)
+    np.testing.assert_array_equal(parsed_counts, counts)
+
+
+def test_tensor_comparison_files(synthetic_root):
+    n_layers = len(layer_shapes("8B")) + 1
+    for path in files(synthetic_root, "tensor_comparison"):
+        record = merge_all_data.parse_file_tf_difference(path)
+        assert record["layer"][0] == "global"
+        assert record["stats"].shape == (n_layers, 4)
+        np.testing.assert_allclose(record["histogram_edges"], histogram_edges())
+        # The global histogram is the sum of the layers
+        np.testing.assert_array_equal(record["histogram_counts"][0], record["histogram_counts"][1:].sum(axis=0))
+
+
+def test_model_performance_round_trip(synthetic_root):
+    for path in files(synthetic_root, "model_performance", "*.ppl"):
+        record = merge_all_data.parse_file_model_performance(path.removesuffix(".ppl"))
+        assert len(record["ppl_curve"]) == PPL_CHUNKS
+        assert record["ppl"] == pytest.approx(record["ppl_curve"][-1], abs=1e-4)
+        assert len(record["hellaswag_curve"]) == HELLASWAG_TASKS
+        assert record["hellaswag"] == pytest.approx(record["hellaswag_curve"][-1])
+
+
+def test_runtime_round_trip(synthetic_root):
+    for path in files(synthetic_root, "runtime_performance"):
+        record = create_runtime_csv.parse_file_model_performance(path)
+        assert path.endswith(f"_n{record['ncore']}_i{record['iteration']}.out")
+        assert record["eval_tokens"] == 199 and record["prompt_eval_tokens"] == 154
+        assert record["eval_throughput"] == pytest.approx(1000 / record["eval_time"], rel=1e-2)
+        assert record["model_buffer_mib"] == pytest.approx(4437.8)
+
+
+# Log excerpts in the output format of the tools
+
+def test_quantization_excerpt():
+    record = merge_all_data.parse_file_quantization(DATA_DIR / "quantization" / "Meta-Llama-3.1-8B-Q4_0+NOI.out")
+    assert record["quant_type"] == "Q4_0" and record["imat"] is False
+    assert record["n_elements"] == 8030261248
+    assert record["bits_per_weight"] == pytest.approx(4.636842)
+    assert record["size"] == pytest.approx(4437.80)
+
+
+def test_tensor_comparison_excerpt():
+    path = DATA_DIR / "tensor_comparison" / "Meta-Llama-3.1-8B-F16@Q4_0+NOI.out"
+    record = merge_all_data.parse_file_tf_difference(str(path))
+
+    assert record["processing_type"] == "F16" and record["quant_type"] == "Q4_0"
+    assert list(record["layer"]) == ["global", "token_embd.weight", "blk.0.attn_q.weight", "output_norm.weight"]
+    np.testing.assert_allclose(record["stats"][0], [0.00052119, 0.034729, 0.001, 0.0004])
+    np.testing.assert_allclose(record["histogram_edges"], [0, 2e-4, 4e-4, 6e-4, 8e-4, np.inf])
+    # The edges are printed with other precision than gguf_compare uses, they still match its bins
+    np.testing.assert_allclose(record["histogram_edges"][:-1], histogram_edges()[:5])
+    assert record["histogram_counts"][1, 0] == 105066283
+    # Layers without histogram keep zero counts
+    assert record["histogram_counts"][3].sum() == 0
+
+    histograms = HistogramSet.from_records(
+        (record["model_name"], layer, record["histogram_edges"], counts)
+        for layer, counts in zip(record["layer"], record["histogram_counts"]))
+    assert histograms.select(layers=["global"]).fractions()[0, 0].sum() == pytest.approx(1)
+
+
+def test_model_performance_excerpt():
+    stem = DATA_DIR / "model_performance" / "Meta-Llama-3.1-8B-F16@Q4_0+NOI"
+    record = merge_all_data.parse_file_model_performance(str(stem))
+    assert record["ppl"] == pytest.approx(7.3165)
+    assert len(record["ppl_curve"]) == 8
+    # Only 4 of the 4000 tasks, the run is not finished
+    assert record["hellaswag"] is None
+    np.testing.assert_allclose(record["hellaswag_curve"], [100, 50, 66.66666667, 75])
+
+    ppl = PerplexityTracker(f"{stem}.ppl")
+    ppl.update()
+    assert ppl.n_chunks == 8 and ppl.final_error == pytest.approx(0.14699)
+
+    hellaswag = HellaswagTracker(f"{stem}.hellaswag", n_tasks=4)
+    hellaswag.update()
+    assert hellaswag.final == pytest.approx(75)
+
+
+def test_runtime_excerpt():
+    path = DATA_DIR / "runtime_performance" / "Meta-Llama-3.1-8B-Q4_0+NOI_n24_i1.out"
+    record = create_runtime_csv.parse_file_model_performance(str(path))
+
+    assert (record["ncore"], record["iteration"], record["node"], record["build"]) == (24, 1, "n1310", "3f2a9c1d0b7e")
+    assert record["quant_type"] == "Q4_0"
+    assert record["load_time"] == pytest.approx(1834.01)
+    assert (record["prompt_eval_time"], record["prompt_eval_throughput"], record["prompt_eval_tokens"]) == \
+        pytest.approx((18.12, 55.20, 154))
+    assert (record["eval_time"], record["eval_throughput"], record["eval_total_time"]) == \
+        pytest.approx((95.21, 10.50, 18947.69))
+    assert (record["total_time"], record["total_tokens"]) == pytest.approx((21912.08, 353))
+    assert (record["model_buffer_mib"], record["kv_buffer_mib"], record["output_buffer_mib"],
+            record["compute_buffer_mib"]) == pytest.approx((4437.80, 512.00, 0.49, 258.50))
+    assert (record["graph_nodes"], record["graph_splits"]) == (1030, 1)
+
+
+def test_load_excerpt():
+    path = DATA_DIR / "load_performance" / "Meta-Llama-3.1-8B-Q4_0+NOI_mmap_cold_n96_i1.out"
+    record = parse_file_load(str(path))
+
+    assert (record["mmap"], record["cache"], record["cached_fraction"]) == ("mmap", "cold", 0.0)
+    assert record["max_rss_mib"] == pytest.approx(5324812 / 1024)
+    assert record["wall_time"] == pytest.approx(23050)
+    assert (record["major_faults"], record["minor_faults"], record["fs_inputs"]) == (36214, 178342, 9088632)
+    assert record["time_to_first_token"] == pytest.approx(1834.01 + 2789.96 + 95.21)
+
+
+def test_truncated_log_counts_from_reset(tmp_path):
+    path = tmp_path / "run.ppl"
+    path.write_text("[1]6.5,[2]6.4,[3]6.3,")
+    tracker = PerplexityTracker(path)
+    assert tracker.update() == 3
+
+    # A requeued job starts the log again
+    path.write_text("[1]7.0,")
+    assert tracker.update() == 1
+    assert tracker.chunks == [7.0]
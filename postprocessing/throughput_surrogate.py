@@ -0,0 +1,272 @@
+"""
+Surrogate model of the prompt and decode throughput with active selection of runs.
+
+A Gaussian process per metric is trained on the runtimes table, joined with the
+bits_per_weight and n_elements of the quantization results. The features are the
+ZFP mode or family of the built-in type, dim, thresholds, imat, bits_per_weight,
+log2(ncore) and log(n_elements). Decode streams all weights per token, so its
+target is log(throughput * weight bytes), the effective bandwidth. Prompt
+processing is compute bound and uses log(throughput * n_elements). Both carry
+over between model sizes much better than the raw throughput.
+
+Every configuration of all_data on the ncore grid of the sweep is a candidate.
+The predictions come with a 95% interval, and --propose picks a batch of
+unmeasured (configuration, ncore) runs one at a time: each pick is the run whose
+measurement reduces the summed posterior variance over all candidates the most,
+the posterior covariance is updated with it before the next pick.
+
+    python throughput_surrogate.py [--num-parameter 70B] [--propose 10]
+
+writes the throughput_predictions table and, with --propose, runtime_proposals.
+"""
+import argparse
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from model_parser import CONFIG_COLUMNS
+from result_store import load_table, write_table
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from sweep_planner import SWEEP  # noqa: E402
+
+METRICS = ["eval_throughput", "prompt_eval_throughput"]
+
+# Built-in types are grouped into families, each ZFP mode is a family of its own
+FAMILIES = ["rate", "prec", "accu", "float", "iq", "k", "legacy", "ternary"]
+
+FEATURES = [f"family_{family}" for family in FAMILIES] + [
+    "dim", "threshold_low", "threshold_high", "imat", "bits_per_weight", "log2_ncore", "log_n_elements"]
+
+# Multiplicative steps of the coordinate search over the hyperparameters
+SEARCH_STEPS = [0.25, 0.5, 2.0, 4.0]
+SEARCH_PASSES = 6
+# Length scale of features that do not vary in the training data. The targets are normalized to carry
+# over between model sizes, so a 70B model (log n_elements + 2.2) is still correlated with 8B (0.9)
+UNSEEN_LENGTH_SCALE = 5.0
+# Smallest gain in log marginal likelihood a step has to bring
+SEARCH_TOLERANCE = 1e-3
+
+
+def quant_family(quant_type) -> str:
+    quant_type = str(quant_type)
+    if quant_type in ("rate", "prec", "accu"):
+        return quant_type
+    if quant_type in ("F16", "BF16", "F32"):
+        return "float"
+    if quant_type.startswith("IQ"):
+        return "iq"
+    if quant_type.startswith("TQ"):
+        return "ternary"
+    if "_K" in quant_type:
+        return "k"
+    return "legacy"
+
+
+def feature_matrix(df) -> np.ndarray:
+    """(n, len(FEATURES)) features of rows with the CONFIG_COLUMNS, bits_per_weight, n_elements and ncore."""
+    families = df["quant_type"].map(quant_family)
+    columns = {f"family_{family}": (families == family).astype("float64") for family in FAMILIES}
+    columns.update({
+        "dim": df["dim"].astype("float64").fillna(0),
+        "threshold_low": df["threshold_low"].astype("float64").fillna(0),
+        "threshold_high": df["threshold_high"].astype("float64").fillna(0),
+        "imat": df["imat"].astype("float64"),
+        "bits_per_weight": df["bits_per_weight"].astype("float64"),
+        "log2_ncore": np.log2(df["ncore"].astype("float64")),
+        "log_n_elements": np.log(df["n_elements"].astype("float64")),
+    })
+    return np.column_stack([np.asarray(columns[feature], dtype=np.float64) for feature in FEATURES])
+
+
+def target_scale(df, metric) -> np.ndarray:
+    """Log of the factor the throughput is multiplied with to get the modelled target."""
+    n_elements = df["n_elements"].astype("float64").to_numpy()
+    if metric == "eval_throughput":
+        return np.log(n_elements * df["bits_per_weight"].astype("float64").to_numpy() / 8)
+    return np.log(n_elements)
+
+
+class GaussianProcess:
+    """GP regression with a squared exponential ARD kernel and white noise on standardized data."""
+
+    def __init__(self):
+        self.params = None
+
+    def _kernel(self, a, b, length_scales, signal):
+        a, b = a / length_scales, b / length_scales
+        # |a - b|^2 without the (n, m, features) array of differences
+        distance = (a ** 2).sum(axis=1)[:, None] + (b ** 2).sum(axis=1)[None, :] - 2 * a @ b.T
+        return signal * np.exp(-0.5 * np.maximum(distance, 0))
+
+    def _unpack(self, params):
+        return np.exp(params[:-2]), math.exp(params[-2]), math.exp(params[-1])
+
+    def log_marginal_likelihood(self, params, x, y):
+        length_scales, signal, noise = self._unpack(params)
+        covariance = self._kernel(x, x, length_scales, signal) + noise * np.eye(len(x))
+        try:
+            cholesky = np.linalg.cholesky(covariance)
+        except np.linalg.LinAlgError:
+            return -np.inf
+        alpha = np.linalg.solve(cholesky.T, np.linalg.solve(cholesky, y))
+        return -0.5 * y @ alpha - np.log(np.diag(cholesky)).sum() - 0.5 * len(x) * math.log(2 * math.pi)
+
+    def fit(self, x, y):
+        self.x_mean, self.x_std = x.mean(axis=0), x.std(axis=0)
+        # The likelihood knows nothing about features without spread in the training data (e.g.
+        # n_elements with only 8B measured), they keep UNSEEN_LENGTH_SCALE in their raw units
+        spread = np.ptp(x, axis=0) > 0
+        self.x_std[~spread] = UNSEEN_LENGTH_SCALE
+        self.y_mean, self.y_std = y.mean(), y.std() or 1.0
+        self.x = (x - self.x_mean) / self.x_std
+        self.y = (y - self.y_mean) / self.y_std
+
+        # Coordinate search over log length scales, log signal and log noise variance
+        params = np.concatenate([np.zeros(x.shape[1]), [0.0, math.log(0.1)]])
+        best = self.log_marginal_likelihood(params, self.x, self.y)
+        for _ in range(SEARCH_PASSES):
+            improved = False
+            for i in [*np.flatnonzero(spread), len(params) - 2, len(params) - 1]:
+                for step in SEARCH_STEPS:
+                    trial = params.copy()
+                    trial[i] += math.log(step)
+                    value = self.log_marginal_likelihood(trial, self.x, self.y)
+                    if value > best + SEARCH_TOLERANCE:
+                        params, best, improved = trial, value, True
+            if not improved:
+                break
+
+        self.params = params
+        length_scales, signal, self.noise = self._unpack(params)
+        covariance = self._kernel(self.x, self.x, length_scales, signal) + self.noise * np.eye(len(self.x))
+        self.cholesky = np.linalg.cholesky(covariance)
+        self.alpha = np.linalg.solve(self.cholesky.T, np.linalg.solve(self.cholesky, self.y))
+        return self
+
+    def posterior(self, x, full_covariance=False):
+        """Mean and variance (or covariance) of the latent function at x, in standardized units."""
+        length_scales, signal, _ = self._unpack(self.params)
+        x = (x - self.x_mean) / self.x_std
+        cross = self._kernel(x, self.x, length_scales, signal)
+        mean = cross @ self.alpha
+        v = np.linalg.solve(self.cholesky, cross.T)
+        if full_covariance:
+            return mean, self._kernel(x, x, length_scales, signal) - v.T @ v
+        return mean, np.maximum(signal - (v ** 2).sum(axis=0), 0)
+
+    def predict(self, x):
+        """Mean and standard deviation of the target at x."""
+        mean, variance = self.posterior(x)
+        return self.y_mean + self.y_std * mean, self.y_std * np.sqrt(variance)
+
+
+def training_data(runtimes, quantization) -> pd.DataFrame:
+    """Runtime measurements with the bits_per_weight and n_elements of their configuration."""
+    keys = [c for c in CONFIG_COLUMNS if c in runtimes.columns]
+    # Categories of the store differ between tables, plain objects are needed to join them
+    runtimes = runtimes.astype({c: object for c in keys if runtimes[c].dtype == "category"})
+    quantization = quantization.astype({c: object for c in keys if quantization[c].dtype == "category"})
+    weights = quantization[keys + ["n_elements", "bits_per_weight"]].drop_duplicates(keys)
+    return runtimes.merge(weights, on=keys, how="inner").dropna(subset=["n_elements", "bits_per_weight"])
+
+
+def candidates(quantization, cores=SWEEP["runtime"]["cores"]) -> pd.DataFrame:
+    """Every configuration of the quantization results on the ncore grid."""
+    configurations = quantization.dropna(subset=["n_elements", "bits_per_weight"]).drop_duplicates(CONFIG_COLUMNS)
+    configurations = configurations.astype({c: object for c in CONFIG_COLUMNS
+                                            if configurations[c].dtype == "category"})
+    return configurations.merge(pd.DataFrame({"ncore": list(cores)}), how="cross").reset_index(drop=True)
+
+
+def fit_models(train) -> dict:
+    x = feature_matrix(train)
+    models = {}
+    for metric in METRICS:
+        measured = train[metric].notna().to_numpy()
+        y = np.log(train[metric].to_numpy(dtype=np.float64)[measured]) + target_scale(train[measured], metric)
+        models[metric] = GaussianProcess().fit(x[measured], y)
+    return models
+
+
+def predict(models, grid) -> pd.DataFrame:
+    """grid with the predicted throughput and its 95% interval per metric."""
+    x = feature_matrix(grid)
+    grid = grid.copy()
+    for metric, model in models.items():
+        mean, std = model.predict(x)
+        log_throughput = mean - target_scale(grid, metric)
+        grid[metric] = np.exp(log_throughput)
+        grid[f"{metric}_low"] = np.exp(log_throughput - 1.96 * std)
+        grid[f"{metric}_high"] = np.exp(log_throughput + 1.96 * std)
+        grid[f"{metric}_log_std"] = std
+    return grid
+
+
+def propose(models, grid, measured, batch_size) -> pd.DataFrame:
+    """
+    Greedy batch of unmeasured rows of grid. Each pick maximizes the reduction of the summed
+    posterior variance over grid (in standardized units, summed over the metrics), then the
+    posterior covariance is conditioned on it, which needs no measured value.
+    """
+    x = feature_matrix(grid)
+    covariances = {metric: model.posterior(x, full_covariance=True)[1] for metric, model in models.items()}
+    available = ~np.asarray(measured, dtype=bool)
+
+    picks, reductions = [], []
+    for _ in range(min(batch_size, int(available.sum()))):
+        reduction = np.zeros(len(grid))
+        for metric, covariance in covariances.items():
+            reduction += (covariance ** 2).sum(axis=0) / (np.diag(covariance) + models[metric].noise)
+        reduction[~available] = -np.inf
+        pick = int(np.argmax(reduction))
+        for metric, covariance in covariances.items():
+            column = covariance[:, pick].copy()
+            covariance -= np.outer(column, column) / (column[pick] + models[metric].noise)
+        available[pick] = False
+        picks.append(pick)
+        reductions.append(reduction[pick])
+
+    return grid.iloc[picks].assign(variance_reduction=reductions)
+
+
+def weights_name(row) -> str:
+    """Weight name as in SWEEP["runtime"]["weights"], e.g. ZFPrate4.00:4.00_3+NOI."""
+    return str(row["model_name"]).removeprefix(f"{row['llama_version']}-{row['num_parameter']}-")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput surrogate model and active selection of runtime runs.")
+    parser.add_argument("--num-parameter", default=None, help="restrict the candidates to one model size, e.g. 70B")
+    parser.add_argument("--propose", type=int, default=0, help="number of runs to propose")
+    args = parser.parse_args()
+
+    quantization = load_table("all_data", columns=CONFIG_COLUMNS + ["model_name", "n_elements", "bits_per_weight"])
+    train = training_data(load_table("runtimes"), quantization)
+    if train.empty:
+        raise SystemExit("No runtime measurements with quantization results to train on")
+    models = fit_models(train)
+    for metric, model in models.items():
+        length_scales = dict(zip(FEATURES, np.exp(model.params[:-2])))
+        print(f"{metric}: noise std {math.sqrt(model.noise) * model.y_std:.3f} (log), length scales "
+              + ", ".join(f"{feature} {value:.2g}" for feature, value in length_scales.items()))
+
+    grid = candidates(quantization)
+    if args.num_parameter:
+        grid = grid[grid["num_parameter"] == args.num_parameter].reset_index(drop=True)
+    grid = predict(models, grid)
+    write_table(grid, "throughput_predictions")
+
+    if args.propose:
+        seen = train[CONFIG_COLUMNS + ["ncore"]].drop_duplicates().assign(measured=True)
+        measured = grid[CONFIG_COLUMNS + ["ncore"]].merge(seen, how="left")["measured"].fillna(False).to_numpy()
+        proposals = propose(models, grid, measured, args.propose)
+        proposals = proposals.assign(weights=proposals.apply(weights_name, axis=1))
+        write_table(proposals, "runtime_proposals")
+        print(proposals.to_string(
+            columns=["num_parameter", "weights", "ncore", "eval_throughput", "eval_throughput_low",
+                     "eval_throughput_high", "prompt_eval_throughput", "variance_reduction"],
+            index=False, float_format=lambda x: f"{x:.3g}"))
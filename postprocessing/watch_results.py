@@ -0,0 +1,247 @@
+"""
+Live monitoring of job_results while a sweep drains.
+
+Watches job_results/<model>/{quantization,tensor_comparison,model_performance,runtime_performance}
+and refreshes the merged tables of the result store whenever outputs appear or
+change. Thanks to the ingestion manifests only new or changed files are parsed.
+Changes are picked up with inotify where the file system supports it, Lustre
+and other network file systems are polled.
+
+The current state is served as JSON:
+
+    python watch_results.py ../job_results 8765
+    curl http://localhost:8765/status
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import glob
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from model_parser import CATEGORIES
+
+# File systems on which inotify does not see changes made by other nodes
+POLLING_FILE_SYSTEMS = {"lustre", "nfs", "nfs4", "gpfs", "beegfs", "cifs", "fuse.sshfs"}
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+
+def filesystem_type(path) -> str:
+    """Type of the file system holding path, taken from /proc/mounts."""
+    path = os.path.realpath(path)
+    best, best_type = "", "unknown"
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                fields = line.split()
+                mount_point, fs_type = fields[1], fields[2]
+                if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) > len(best):
+                    best, best_type = mount_point, fs_type
+    except OSError:
+        pass
+    return best_type
+
+
+def model_dirs(root):
+    return sorted(d for d in glob.glob(f"{root}/Meta-Llama-*") if os.path.isdir(d))
+
+
+def category_dirs(root):
+    return sorted(d for category in CATEGORIES for d in glob.glob(f"{root}/Meta-Llama-*/{category}"))
+
+
+def snapshot(directories) -> dict:
+    """(size, mtime) of every file below directories."""
+    result = {}
+    for directory in directories:
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        result[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            continue
+    return result
+
+
+class PollingWatcher:
+    def __init__(self, root, interval=30.0):
+        self.root = root
+        self.interval = interval
+        self.state = snapshot(category_dirs(root))
+
+    async def wait(self):
+        """Returns once something below root changed."""
+        while True:
+            await asyncio.sleep(self.interval)
+            state = await asyncio.to_thread(snapshot, category_dirs(self.root))
+            if state != self.state:
+                self.state = state
+                return
+
+
+class InotifyWatcher:
+    def __init__(self, root):
+        self.root = root
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watched = set()
+        self.changed = asyncio.Event()
+        asyncio.get_running_loop().add_reader(self.fd, self._on_event)
+        self.add_directories()
+
+    def add_directories(self):
+        """
+        Watches root and the model directories for new subdirectories and the category
+        directories for results. Parents are watched before their children are listed,
+        so a directory created in between still fires an event.
+        """
+        for directory in [self.root, *model_dirs(self.root)]:
+            self._add_watch(directory, IN_CREATE | IN_MOVED_TO)
+        for directory in category_dirs(self.root):
+            self._add_watch(directory, IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+
+    def _add_watch(self, directory, mask):
+        if directory not in self.watched:
+            if self.libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) >= 0:
+                self.watched.add(directory)
+
+    def _on_event(self):
+        # The events themselves are not needed, the ingestion finds the changed files
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        # Directories of new models and categories appear during a sweep
+        self.add_directories()
+        self.changed.set()
+
+    async def wait(self):
+        await self.changed.wait()
+        self.changed.clear()
+
+
+class ResultMonitor:
+    def __init__(self, root, settle=5.0, min_interval=30.0):
+        self.root = root
+        self.settle = settle
+        self.min_interval = min_interval
+        self.started = time.time()
+        self.status = {"state": "starting", "root": str(root)}
+        self.refreshes = 0
+
+    def refresh(self) -> dict:
+        """Parses new outputs, rewrites the merged tables and returns the summary stats."""
+        from create_runtime_csv import create_runtime_table
+        from merge_all_data import merge_results
+
+        start = time.time()
+        model_dirs = f"{self.root}/Meta-Llama-*"
+        all_data = merge_results(model_dirs)
+        runtimes = create_runtime_table(f"{model_dirs}/runtime_performance/*")
+
+        files = {category: len(glob.glob(f"{model_dirs}/{category}/*")) for category in CATEGORIES}
+
+        throughput = {}
+        if not runtimes.empty:
+            stats = runtimes.groupby(["model_name", "ncore"])["eval_throughput"].median()
+            throughput = {f"{model}@{ncore}": value for (model, ncore), value in stats.items()}
+
+        ppl = all_data.dropna(subset=["ppl"]).set_index("model_name")["ppl"]
+
+        return {
+            "files": files,
+            "configurations": int(len(all_data)),
+            "with_bits_per_weight": int(all_data["bits_per_weight"].notna().sum()),
+            "with_ppl": int(all_data["ppl"].notna().sum()),
+            "with_hellaswag": int(all_data["hellaswag"].notna().sum()),
+            "runtime_results": int(len(runtimes)),
+            "ppl": ppl.to_dict(),
+            "median_eval_throughput": throughput,
+            "refresh_seconds": round(time.time() - start, 3),
+        }
+
+    async def run_refresh(self):
+        self.status["state"] = "refreshing"
+        try:
+            summary = await asyncio.to_thread(self.refresh)
+        except Exception as e:
+            self.status.update({"state": "error", "error": repr(e)})
+            print(f"Refresh failed: {e!r}")
+            return
+        self.refreshes += 1
+        self.status = {
+            "state": "idle",
+            "root": str(self.root),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "refreshes": self.refreshes,
+            "last_refresh": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            **summary,
+        }
+
+    async def watch(self, watcher):
+        await self.run_refresh()
+        while True:
+            last = time.monotonic()
+            await watcher.wait()
+            # Let bursts of finishing jobs settle and do not refresh more often than min_interval
+            await asyncio.sleep(max(self.settle, self.min_interval - (time.monotonic() - last)))
+            await self.run_refresh()
+
+    async def handle_http(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            path = request_line.split()[1].decode() if len(request_line.split()) > 1 else "/"
+            if path in ("/", "/status"):
+                status, body = "200 OK", json.dumps({**self.status, "uptime_seconds": round(time.time() - self.started, 1)})
+            else:
+                status, body = "404 Not Found", json.dumps({"error": f"unknown path {path}"})
+
+            body = body.encode()
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+def create_watcher(root, interval):
+    fs_type = filesystem_type(root)
+    if sys.platform.startswith("linux") and fs_type not in POLLING_FILE_SYSTEMS:
+        try:
+            watcher = InotifyWatcher(root)
+            print(f"Watching {root} ({fs_type}) with inotify")
+            return watcher
+        except (OSError, AttributeError) as e:
+            print(f"inotify not available ({e}), polling instead")
+    print(f"Polling {root} ({fs_type}) every {interval} s")
+    return PollingWatcher(root, interval)
+
+
+async def main(root="../job_results", port=8765, interval=30.0):
+    monitor = ResultMonitor(Path(root))
+    server = await asyncio.start_server(monitor.handle_http, "127.0.0.1", port)
+    print(f"Status on http://127.0.0.1:{port}/status")
+
+    async with server:
+        await monitor.watch(create_watcher(root, interval))
+
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else "../job_results"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+    asyncio.run(main(root, port))
@@ -0,0 +1,249 @@
+"""
+Offline prediction of ZFP bits_per_weight, size and error before running llama-quantize.
+
+The F16 GGUF is memory-mapped and a stratified sample of 4^dim blocks of every
+2D tensor is compressed with the Python ZFP bindings (zfpy) in rate, precision
+and accuracy mode. The blocks are decompressed and rounded to F16 like the F16@
+weights, so the error is the one the tensor comparison reports. 1D tensors
+(norms) stay F32, as llama-quantize leaves them.
+
+A block of dim d covers 4^(d-1) consecutive rows and 4 consecutive columns of a
+tensor. ZFP compresses every block on its own, so the sampled blocks give the
+bits and errors of the whole tensor without compressing all of it. The rows
+are split into bands and the same number of blocks is drawn from every band.
+
+Only the fixed parameter runs (+NOI) are predicted. The importance matrix runs
+choose the parameter per tensor inside llama-quantize. The grid is the zfp part of
+SWEEP in scripts/sweep_planner.py.
+
+Unlike the rest of postprocessing this needs zfpy (pip install zfpy), and so does
+rate_allocator.py --simulation, which reads the zfp_simulation_tensors table.
+
+    python zfp_simulator.py <Meta-Llama-...-F16.gguf> [--modes rate prec] [--dims 3 4] [--test]
+
+Writes the tables zfp_simulation (per model) and zfp_simulation_tensors (per tensor)
+and prints the predictions, with the measured values where all_data has them and
+the settings on the bits_per_weight / rmse Pareto front.
+"""
+import argparse
+import re
+import sys
+import zlib
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gguf_compare import open_gguf, to_float32
+from ingest import run_pool
+from model_parser import parse_stem
+
+try:
+    import zfpy
+except ImportError:
+    zfpy = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from sweep_planner import SWEEP  # noqa: E402
+
+# The sweep keeps the parameters as they appear in the names, zfpy needs numbers
+PARAMETERS = {mode: [int(value) if mode == "prec" else float(value) for value in values]
+              for mode, values in SWEEP["zfp"]["parameters"].items()}
+DIMS = SWEEP["zfp"]["dims"]
+# Test grid of 10_create_weights_zfp.sh
+TEST_PARAMETERS = {
+    "rate": [4.00, 6.00],
+    "prec": [8, 9, 10, 11, 12, 13],
+    "accu": [0.05, 0.10, 0.12, 0.13, 0.14],
+}
+
+# Parameter as written in the model names
+PARAMETER_FORMATS = {"rate": "{:.2f}", "prec": "{:02d}", "accu": "{:.2f}"}
+
+# Rows of a tensor are split in BANDS bands, BLOCKS_PER_BAND blocks are drawn from each
+BANDS = 64
+BLOCKS_PER_BAND = 64
+
+# Bits of the tensors that are not compressed (F32)
+UNCOMPRESSED_BITS = 32
+
+
+def result_name(prefix, mode, parameter, dim):
+    """Name of the fixed parameter run, e.g. Meta-Llama-3.1-8B-ZFPrate4.00:4.00_3+NOI."""
+    value = PARAMETER_FORMATS[mode].format(parameter)
+    return f"{prefix}-ZFP{mode}{value}:{value}_{dim}+NOI"
+
+
+def zfp_compress(values, mode, parameter, write_header=True):
+    if zfpy is None:
+        raise ImportError("zfp_simulator needs the ZFP Python bindings (pip install zfpy)")
+    if mode == "rate":
+        return zfpy.compress_numpy(values, rate=parameter, write_header=write_header)
+    if mode == "prec":
+        return zfpy.compress_numpy(values, precision=int(parameter), write_header=write_header)
+    if mode == "accu":
+        return zfpy.compress_numpy(values, tolerance=parameter, write_header=write_header)
+    raise ValueError(f"Unknown ZFP mode {mode}")
+
+
+@lru_cache(maxsize=None)
+def header_bytes(mode, parameter, dim):
+    """Size of the zfpy header, which is not part of the compressed weights."""
+    block = np.zeros((4,) * dim, dtype=np.float32)
+    return len(zfp_compress(block, mode, parameter)) - len(zfp_compress(block, mode, parameter, write_header=False))
+
+
+def sample_blocks(reader, name, dim, bands=BANDS, blocks_per_band=BLOCKS_PER_BAND):
+    """
+    Stratified sample of the 4^dim blocks of a 2D tensor as float32 array of shape
+    (n_blocks * 4, 4, ..., 4), every block its own 4-slab along the first axis.
+    """
+    tensor = reader.tensors[name]
+    height = 4 ** (dim - 1)
+    matrix = reader.raw(name).reshape(-1, tensor["shape"][-1])
+    block_rows, block_columns = matrix.shape[0] // height, matrix.shape[1] // 4
+    if block_rows == 0 or block_columns == 0:
+        return np.empty((0,) + (4,) * dim, dtype=np.float32)
+
+    # Seeded by the tensor name, every setting and every rerun sees the same blocks
+    rng = np.random.default_rng(zlib.crc32(f"{name}:{dim}".encode()))
+    edges = np.linspace(0, block_rows, min(bands, block_rows) + 1).astype(np.int64)
+    rows = np.concatenate([rng.integers(low, high, blocks_per_band) for low, high in zip(edges[:-1], edges[1:])])
+    columns = rng.integers(0, block_columns, len(rows))
+
+    row_index = rows[:, None] * height + np.arange(height)
+    column_index = columns[:, None] * 4 + np.arange(4)
+    # Fancy indexing only touches the pages of the sampled blocks
+    blocks = to_float32(matrix[row_index[:, :, None], column_index[:, None, :]], tensor["type"])
+    return blocks.reshape((len(rows) * 4,) + (4,) * (dim - 1))
+
+
+def simulate_tensor(path, name, settings):
+    """
+    {(mode, parameter, dim): (bits per weight, mean squared error, maxerr, sampled elements)}
+    of tensor name, None for tensors that are not compressed.
+    """
+    reader = open_gguf(path)
+    if len(reader.tensors[name]["shape"]) < 2:
+        return None
+
+    results = {}
+    for dim in sorted({dim for _, _, dim in settings}):
+        blocks = sample_blocks(reader, name, dim)
+        if blocks.size == 0:
+            continue
+        for mode, parameter, setting_dim in settings:
+            if setting_dim != dim:
+                continue
+            stream = zfp_compress(blocks, mode, parameter)
+            # The F16@ weights are the decompressed values rounded to F16
+            restored = zfpy.decompress_numpy(stream).astype(np.float16).astype(np.float32)
+            difference = np.abs(restored - blocks).astype(np.float64).ravel()
+            bits = (len(stream) - header_bytes(mode, parameter, dim)) * 8
+            results[(mode, parameter, dim)] = (bits / blocks.size, float(np.dot(difference, difference)) / blocks.size,
+                                               float(difference.max()), blocks.size)
+    return results
+
+
+def _simulate_one(args):
+    return simulate_tensor(*args)
+
+
+def simulate(path, parameters=PARAMETERS, dims=DIMS, max_workers=None):
+    """
+    Predicted (per model, per tensor) DataFrames of all fixed parameter runs of the F16 GGUF path.
+
+    Per model: the columns of parse_stem, n_elements, bits_per_weight, size (MiB), rmse and maxerr
+    (the largest error in the sample, a lower bound). Per tensor: model_name, tensor, n_elements,
+    bits_per_weight, rmse, maxerr and sampled (number of sampled weights).
+    """
+    path = str(path)
+    prefix = re.sub(r"-F16$", "", Path(path).stem)
+    settings = [(mode, parameter, dim) for mode, values in parameters.items() for parameter in values for dim in dims]
+
+    reader = open_gguf(path)
+    names = list(reader.tensors)
+    tasks = [(path, name, settings) for name in names]
+    results = dict(zip(names, run_pool(tasks, _simulate_one, weight=lambda task: reader.tensors[task[1]]["n_elements"],
+                                       max_workers=max_workers)))
+
+    uncompressed_bits = 0
+    tensor_records = []
+    for name in names:
+        ok, result = results[name]
+        n_elements = reader.tensors[name]["n_elements"]
+        if not ok:
+            print(f"Error simulating {name}: {result}")
+            continue
+        if result is None:
+            uncompressed_bits += n_elements * UNCOMPRESSED_BITS
+            continue
+        for (mode, parameter, dim), (bpw, mse, maxerr, sampled) in result.items():
+            tensor_records.append({
+                "model_name": parse_stem(result_name(prefix, mode, parameter, dim))["model_name"],
+                "tensor": name,
+                "n_elements": n_elements,
+                "bits_per_weight": bpw,
+                "squared_error": mse * n_elements,
+                "rmse": np.sqrt(mse),
+                "maxerr": maxerr,
+                "sampled": sampled,
+            })
+
+    tensors = pd.DataFrame(tensor_records)
+    total_elements = sum(tensor["n_elements"] for tensor in reader.tensors.values())
+
+    model_records = []
+    for mode, parameter, dim in settings:
+        setup = parse_stem(result_name(prefix, mode, parameter, dim))
+        rows = tensors[tensors["model_name"] == setup["model_name"]]
+        bits = float((rows["bits_per_weight"] * rows["n_elements"]).sum()) + uncompressed_bits
+        model_records.append({
+            **setup,
+            "n_elements": total_elements,
+            "bits_per_weight": bits / total_elements,
+            "size": bits / 8 / 1024 ** 2,
+            "rmse": np.sqrt(rows["squared_error"].sum() / total_elements),
+            "maxerr": rows["maxerr"].max(),
+        })
+
+    return pd.DataFrame(model_records), tensors.drop(columns="squared_error")
+
+
+if __name__ == "__main__":
+    from pareto import pareto_table
+    from result_store import load_table, table_path, write_table
+
+    parser = argparse.ArgumentParser(description="Predicts bits_per_weight, size and rmse of the ZFP runs (needs zfpy).")
+    parser.add_argument("path", help="F16 GGUF of the model, e.g. Meta-Llama-3.1-8B-F16.gguf")
+    parser.add_argument("--modes", nargs="*", default=list(PARAMETERS))
+    parser.add_argument("--dims", nargs="*", type=int, default=DIMS)
+    parser.add_argument("--test", action="store_true", help="use the parameters of the test run")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if zfpy is None:
+        # Every tensor would fail on its own in the workers
+        parser.error("the ZFP Python bindings are missing (pip install zfpy)")
+
+    grid = TEST_PARAMETERS if args.test else PARAMETERS
+    unknown = [mode for mode in args.modes if mode not in grid]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+
+    models, tensors = simulate(args.path, {mode: grid[mode] for mode in args.modes}, args.dims, args.workers)
+    write_table(models, "zfp_simulation")
+    write_table(tensors, "zfp_simulation_tensors")
+
+    models = pareto_table(models, {"bits_per_weight": "min", "rmse": "min"}, max_rank=1)
+    columns = ["model_name", "bits_per_weight", "size", "rmse", "maxerr", "pareto_front"]
+    if table_path("all_data").exists():
+        measured = load_table("all_data", columns=["model_name", "bits_per_weight", "rmse"],
+                              filters=[("imat", "==", False)])
+        # Older results are named ..._NOI
+        measured["model_name"] = measured["model_name"].astype(str).str.replace(r"_NOI$", "+NOI", regex=True)
+        models = models.merge(measured, on="model_name", how="left", suffixes=("", "_measured"))
+        columns += ["bits_per_weight_measured", "rmse_measured"]
+
+    print(models.sort_values(["quant_type", "dim", "bits_per_weight"])[columns].to_string(index=False))
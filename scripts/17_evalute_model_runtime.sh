@@ -141,9 +141,13 @@ sync \${temp_file}
 #prompt_eval_time=\$(grep "prompt eval time" "\$temp_file" | awk '{print \$16}' | tr -d '\n' )
 #eval_time=\$(grep "eval time" "\$temp_file" | awk '{print \$15}' | tr -d '\n' )
 
+# Fingerprint of the binary, so runtimes of different llama.cpp builds can be told apart
+BUILD=\$(sha256sum "${EXECUTABLE_CLI}" | cut -c1-12)
+
 # Output to CSV (append mode)
-echo "${RESULT_NAME},ncores,${NCPUS},iteration,${i},node,\${NODE_NAME}" > "${RESULT_FILE}"
-grep "eval time" "\$temp_file" >> "${RESULT_FILE}"
+echo "${RESULT_NAME},ncores,${NCPUS},iteration,${i},node,\${NODE_NAME},build,\${BUILD}" > "${RESULT_FILE}"
+# The full log, load time, buffer sizes and all llama_perf lines are parsed from it
+cat "\$temp_file" >> "${RESULT_FILE}"
 
 rm "\$temp_file" && echo "Temporary file deleted."
 
@@ -0,0 +1,162 @@
+#!/bin/env bash
+
+set -euo pipefail
+
+SCRIPT_DIR=$( cd -- "$( dirname -- "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )
+ROOT_DIR=${SCRIPT_DIR}/..
+
+cd $ROOT_DIR
+
+# Load latency benchmark on top of 17_evalute_model_runtime.sh: every job runs one GGUF
+# with and without mmap, each with a cold and a warm page cache, and keeps the llama-cli
+# log together with the peak RSS and page faults of /usr/bin/time. The page cache of the
+# GGUF is dropped with page_cache.py (posix_fadvise), which needs no root.
+
+# Approx. 154 Tokens, identical to 17_evalute_model_runtime.sh
+CLI_PROMPT="How much wood would a woodchuck chuck if a woodchuck could chuck wood? This age-old tongue twister has puzzled many, but let’s explore it from multiple angles. Scientifically, a woodchuck (or groundhog) doesn’t actually chuck wood, but if it could, we might estimate its capabilities based on its burrowing behavior. \
+            According to a study, a woodchuck moves roughly 700 pounds of dirt when digging a burrow. If we equate this to wood, we might assume a woodchuck could chuck a similar amount. However, the physics of woodchucking would depend on its bite force, jaw strength, and endurance. Could it sustain wood-chucking for long durations, or would it tire quickly?"
+
+# A few decode tokens are enough for the time to first token
+NPREDICT=16
+
+if [[ "${1:-}" == "test" ]]; then
+    models=( "3.1-8B" )
+    modes=(
+        Q8_0+NOI
+    )
+    cores=( 96 )
+    iterations=1
+else
+    models=( "3.1-8B" )
+    cores=( 96 )
+    iterations=3
+    modes=(
+        ZFPrate4.00:4.00_2_NOI
+        ZFPrate4.00:4.00_3_NOI
+        ZFPrate4.00:4.00_4_NOI
+        ZFPrate6.00:6.00_2_NOI
+        ZFPrate6.00:6.00_3_NOI
+        ZFPrate6.00:6.00_4_NOI
+        ZFPrate8.00:8.00_2_NOI
+        ZFPrate8.00:8.00_3_NOI
+        ZFPrate8.00:8.00_4_NOI
+        Q4_0+NOI
+        Q6_K+NOI
+        Q8_0+NOI
+    )
+fi
+
+
+for model in "${models[@]}" ; do
+
+    MODEL_SOURCE_DIR="${ROOT_DIR}/llm_experiment_weights/Meta-Llama-${model}/weights"
+    MODEL_PREFIX="Meta-Llama-${model}"
+
+    for INPUT_WEIGHTS in "${modes[@]}" ; do
+
+        RESULT_NAME="${MODEL_PREFIX}-${INPUT_WEIGHTS}"
+
+        GGUF_FILE=${MODEL_SOURCE_DIR}/${RESULT_NAME}.gguf
+        if [ ! -f ${GGUF_FILE} ]; then
+            echo "File ${GGUF_FILE} not found!"
+            exit 2
+        fi
+
+        mkdir -p ${ROOT_DIR}/{job_scripts,job_logs,job_results}/${MODEL_PREFIX}/load_performance
+
+        if [[ "${RESULT_NAME}" =~ .*_2_.* ]]; then
+            EXECUTABLE_CLI="${ROOT_DIR}/llama.cpp-cpu/bin/llama-cli.rate.no_imat.dim_2"
+        elif [[ "${RESULT_NAME}" =~ .*_3_.* ]]; then
+            EXECUTABLE_CLI="${ROOT_DIR}/llama.cpp-cpu/bin/llama-cli.rate.no_imat.dim_3"
+        elif [[ "${RESULT_NAME}" =~ .*_4_.* ]]; then
+            EXECUTABLE_CLI="${ROOT_DIR}/llama.cpp-cpu/bin/llama-cli.rate.no_imat.dim_4"
+        else
+            EXECUTABLE_CLI="${ROOT_DIR}/llama.cpp-cpu/bin/llama-cli"
+        fi
+        echo "Create for ${RESULT_NAME}"
+
+        for NCPUS in "${cores[@]}" ; do
+            for i in $(seq 1 ${iterations}); do
+                JOB_SCRIPT="${ROOT_DIR}/job_scripts/${MODEL_PREFIX}/load_performance/${RESULT_NAME}_n${NCPUS}_i${i}.sbatch"
+                LOG_PATH="${ROOT_DIR}/job_logs/${MODEL_PREFIX}/load_performance/${RESULT_NAME}_n${NCPUS}_i${i}.out"
+                RESULT_DIR="${ROOT_DIR}/job_results/${MODEL_PREFIX}/load_performance"
+
+                cat > "$JOB_SCRIPT" << EOF
+#!/bin/bash
+
+#SBATCH -N 1
+#SBATCH -n 1
+#SBATCH -c 104
+#SBATCH --mem=200G
+#SBATCH -A p_darwin
+#SBATCH --job-name=${RESULT_NAME}-load
+#SBATCH --output=${LOG_PATH}
+#SBATCH --error=${LOG_PATH}
+#SBATCH --time=02:00:00
+#SBATCH --hint=nomultithread
+#SBATCH --exclusive
+#SBATCH --constraint=no_monitoring
+#SBATCH --cpu-freq=2000000
+
+cat \$0
+
+module purge
+source ${ROOT_DIR}/source_env.cpp_cpu
+
+export OMP_NUM_THREADS=${NCPUS}
+
+NODE_NAME=\$(srun hostname)
+echo "Node: \${NODE_NAME}"
+
+# Fingerprint of the binary, so runtimes of different llama.cpp builds can be told apart
+BUILD=\$(sha256sum "${EXECUTABLE_CLI}" | cut -c1-12)
+
+for MMAP in nommap mmap; do
+    if [[ \${MMAP} == nommap ]]; then
+        MMAP_FLAG="--no-mmap"
+    else
+        MMAP_FLAG=""
+    fi
+
+    for CACHE in cold warm; do
+        RESULT_FILE="${RESULT_DIR}/${RESULT_NAME}_\${MMAP}_\${CACHE}_n${NCPUS}_i${i}.out"
+        temp_file=\$(mktemp) || { echo "Failed to create temp file" >&2; exit 1; }
+
+        if [[ \${CACHE} == cold ]]; then
+            RESIDENT=\$(srun python3 "${ROOT_DIR}/scripts/page_cache.py" evict "${GGUF_FILE}" | awk '{print \$2}')
+        else
+            RESIDENT=\$(srun python3 "${ROOT_DIR}/scripts/page_cache.py" warm "${GGUF_FILE}" | awk '{print \$2}')
+        fi
+        echo "\${MMAP} \${CACHE}: cached fraction of ${GGUF_FILE} \${RESIDENT}"
+
+        time srun --cpu-bind=cores -c 104 -- \
+            /usr/bin/time -v \
+            "${EXECUTABLE_CLI}" \
+            -s 1 \
+            -t ${NCPUS} \
+            --ctx-size 4096 \
+            -m "${GGUF_FILE}" \
+            --repeat_penalty 1.0 \
+            --prompt "${CLI_PROMPT}" \
+            --predict ${NPREDICT} \
+            --ignore-eos \
+            \${MMAP_FLAG} \
+            2>&1 | tee \${temp_file}
+
+        sync \${temp_file}
+
+        echo "${RESULT_NAME},ncores,${NCPUS},iteration,${i},node,\${NODE_NAME},build,\${BUILD},mmap,\${MMAP},cache,\${CACHE},cached,\${RESIDENT}" > "\${RESULT_FILE}"
+        # The full log, followed by the resource usage of /usr/bin/time -v
+        cat "\$temp_file" >> "\${RESULT_FILE}"
+
+        rm "\$temp_file" && echo "Temporary file deleted."
+    done
+done
+
+EOF
+            sync
+            #sbatch "$JOB_SCRIPT"
+            done #iteration
+        done # cores
+    done # gguf-file
+done # model
@@ -0,0 +1,164 @@
+#!/bin/env bash
+
+set -euo pipefail
+
+SCRIPT_DIR=$( cd -- "$( dirname -- "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )
+ROOT_DIR=${SCRIPT_DIR}/..
+
+cd $ROOT_DIR
+
+# Score-P variant of 17_evalute_model_runtime.sh: the same llama-cli runs with an instrumented
+# build, every run writes its Score-P experiment directory to
+#
+#     job_results/<model>/scorep/<RESULT_NAME>_n<ncore>_i<iteration>/
+#
+# which postprocessing/scorep_ingest.py reads. The instrumented binaries are expected in
+# llama.cpp-cpu-scorep/bin with the names of llama.cpp-cpu/bin. They are built like
+# 04_Makefile-install_llama.cpp_cpu, with the compiler wrappers of 02_install_scorep.sh
+# (on the PATH after source_env.cpp_cpu) and the install prefix changed:
+#
+#     SCOREP_WRAPPER=off cmake ... -DCMAKE_C_COMPILER=scorep-clang -DCMAKE_CXX_COMPILER=scorep-clang++ \
+#                                  --install-prefix=${ROOT_DIR}/llama.cpp-cpu-scorep
+#
+# The runtimes of instrumented runs are not comparable, the job writes no runtime_performance
+# result. scorep_ingest.py joins the ops to the runs of 17_evalute_model_runtime.sh with the
+# same configuration, ncore and iteration.
+
+# Approx. 154 Tokens, identical to 17_evalute_model_runtime.sh
+CLI_PROMPT="How much wood would a woodchuck chuck if a woodchuck could chuck wood? This age-old tongue twister has puzzled many, but let’s explore it from multiple angles. Scientifically, a woodchuck (or groundhog) doesn’t actually chuck wood, but if it could, we might estimate its capabilities based on its burrowing behavior. \
+            According to a study, a woodchuck moves roughly 700 pounds of dirt when digging a burrow. If we equate this to wood, we might assume a woodchuck could chuck a similar amount. However, the physics of woodchucking would depend on its bite force, jaw strength, and endurance. Could it sustain wood-chucking for long durations, or would it tire quickly?"
+
+# The profile (profile.cubex) has times, visits and counters. The trace (traces.otf2) is only
+# read when a run has no profile, and it grows with the number of threads.
+ENABLE_PROFILING=true
+ENABLE_TRACING=false
+# Comma separated PAPI counters of the profile, e.g. PAPI_TOT_CYC,PAPI_TOT_INS. Empty without PAPI.
+PAPI_METRICS=""
+
+if [[ "${1:-}" == "test" ]]; then
+    models=( "3.1-8B" )
+    modes=(
+        Q8_0+NOI
+    )
+    cores=( 96 )
+    iterations=1
+else
+    models=( "3.1-8B" )
+    cores=( 1 24 48 72 96 )
+    iterations=1
+    modes=(
+        ZFPrate4.00:4.00_2_NOI
+        ZFPrate4.00:4.00_3_NOI
+        ZFPrate4.00:4.00_4_NOI
+        ZFPrate6.00:6.00_2_NOI
+        ZFPrate6.00:6.00_3_NOI
+        ZFPrate6.00:6.00_4_NOI
+        ZFPrate8.00:8.00_2_NOI
+        ZFPrate8.00:8.00_3_NOI
+        ZFPrate8.00:8.00_4_NOI
+        Q4_0+NOI
+        Q6_K+NOI
+        Q8_0+NOI
+    )
+fi
+
+
+for model in "${models[@]}" ; do
+
+    MODEL_SOURCE_DIR="${ROOT_DIR}/llm_experiment_weights/Meta-Llama-${model}/weights"
+    MODEL_PREFIX="Meta-Llama-${model}"
+
+    for INPUT_WEIGHTS in "${modes[@]}" ; do
+
+        RESULT_NAME="${MODEL_PREFIX}-${INPUT_WEIGHTS}"
+
+        GGUF_FILE=${MODEL_SOURCE_DIR}/${RESULT_NAME}.gguf
+        if [ ! -f ${GGUF_FILE} ]; then
+            echo "File ${GGUF_FILE} not found!"
+            exit 2
+        fi
+
+        mkdir -p ${ROOT_DIR}/{job_scripts,job_logs,job_results}/${MODEL_PREFIX}/scorep
+
+        if [[ "${RESULT_NAME}" =~ .*_2_.* ]]; then
+            EXECUTABLE_CLI="${ROOT_DIR}/llama.cpp-cpu-scorep/bin/llama-cli.rate.no_imat.dim_2"
+        elif [[ "${RESULT_NAME}" =~ .*_3_.* ]]; then
+            EXECUTABLE_CLI="${ROOT_DIR}/llama.cpp-cpu-scorep/bin/llama-cli.rate.no_imat.dim_3"
+        elif [[ "${RESULT_NAME}" =~ .*_4_.* ]]; then
+            EXECUTABLE_CLI="${ROOT_DIR}/llama.cpp-cpu-scorep/bin/llama-cli.rate.no_imat.dim_4"
+        else
+            EXECUTABLE_CLI="${ROOT_DIR}/llama.cpp-cpu-scorep/bin/llama-cli"
+        fi
+        echo "Create for ${RESULT_NAME}"
+
+        for NCPUS in "${cores[@]}" ; do
+
+            # Same prompt as the runtime runs the ops are joined to
+            if [[ $NCPUS = 1 ]] && [[ "$INPUT_WEIGHTS" =~ ^ZFP.* ]]; then
+                CLI_PROMPT_COPY=${CLI_PROMPT:0:13}
+                NPREDICT=3
+            else
+                CLI_PROMPT_COPY=${CLI_PROMPT}
+                NPREDICT=200
+            fi
+
+            for i in $(seq 1 ${iterations}); do
+                JOB_SCRIPT="${ROOT_DIR}/job_scripts/${MODEL_PREFIX}/scorep/${RESULT_NAME}_n${NCPUS}_i${i}.sbatch"
+                LOG_PATH="${ROOT_DIR}/job_logs/${MODEL_PREFIX}/scorep/${RESULT_NAME}_n${NCPUS}_i${i}.out"
+                EXPERIMENT_DIR="${ROOT_DIR}/job_results/${MODEL_PREFIX}/scorep/${RESULT_NAME}_n${NCPUS}_i${i}"
+
+                cat > "$JOB_SCRIPT" << EOF
+#!/bin/bash
+
+#SBATCH -N 1
+#SBATCH -n 1
+#SBATCH -c 104
+#SBATCH --mem=200G
+#SBATCH -A p_darwin
+#SBATCH --job-name=${RESULT_NAME}-scorep
+#SBATCH --output=${LOG_PATH}
+#SBATCH --error=${LOG_PATH}
+#SBATCH --time=08:00:00
+#SBATCH --hint=nomultithread
+#SBATCH --exclusive
+#SBATCH --constraint=no_monitoring
+#SBATCH --cpu-freq=2000000
+
+cat \$0
+
+module purge
+source ${ROOT_DIR}/source_env.cpp_cpu
+
+export OMP_NUM_THREADS=${NCPUS}
+
+export SCOREP_EXPERIMENT_DIRECTORY="${EXPERIMENT_DIR}"
+export SCOREP_OVERWRITE_EXPERIMENT_DIRECTORY=true
+export SCOREP_ENABLE_PROFILING=${ENABLE_PROFILING}
+export SCOREP_ENABLE_TRACING=${ENABLE_TRACING}
+export SCOREP_METRIC_PAPI="${PAPI_METRICS}"
+export SCOREP_TOTAL_MEMORY=1G
+
+NODE_NAME=\$(srun hostname)
+echo "Node: \${NODE_NAME}"
+
+time srun --cpu-bind=cores -c 104 -- \
+    "${EXECUTABLE_CLI}" \
+    -s 1 \
+    -t ${NCPUS} \
+    --ctx-size 4096 \
+    -m "${GGUF_FILE}" \
+    --repeat_penalty 1.0 \
+    --prompt "${CLI_PROMPT_COPY}" \
+    --predict ${NPREDICT} \
+    --ignore-eos \
+    --no-mmap
+
+ls -l "${EXPERIMENT_DIR}"
+
+EOF
+            sync
+            #sbatch "$JOB_SCRIPT"
+            done #iteration
+        done # cores
+    done # gguf-file
+done # model
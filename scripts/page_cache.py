@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Page cache control of single files, for cold and warm load benchmarks without root.
+
+    python page_cache.py evict  FILE...   # drops the cached pages of the files (posix_fadvise DONTNEED)
+    python page_cache.py warm   FILE...   # reads the files once, so their pages are cached
+    python page_cache.py status FILE...   # prints the cached fraction of every file
+
+Every command prints "<file> <cached fraction>" afterwards, measured with mincore.
+Eviction only drops clean pages that no other process has mapped, and network
+file systems may keep their own client cache, so the fraction shows whether a
+"cold" run really started cold. Where mincore is unavailable the fraction is "nan".
+"""
+import ctypes
+import ctypes.util
+import mmap
+import os
+import sys
+
+READ_BLOCK = 16 * 1024 ** 2
+
+
+def cached_fraction(path) -> float:
+    """Fraction of the pages of path in the page cache."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return 1.0
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return float("nan")
+    libc.mmap.restype = ctypes.c_void_p
+    libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+    libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+
+    pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+    vector = (ctypes.c_ubyte * pages)()
+    with open(path, "rb") as f:
+        # Mapping the file does not read any of its pages, mincore only looks at the cache
+        address = libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, f.fileno(), 0)
+        if address is None or address == ctypes.c_void_p(-1).value:
+            return float("nan")
+        try:
+            if libc.mincore(address, size, vector) != 0:
+                return float("nan")
+        finally:
+            libc.munmap(address, size)
+    return sum(byte & 1 for byte in vector) / pages
+
+
+def evict(path):
+    with open(path, "rb") as f:
+        # Dirty pages are not dropped, a freshly written file has to reach the disk first
+        os.fdatasync(f.fileno())
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def warm(path):
+    with open(path, "rb", buffering=0) as f:
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        buffer = bytearray(READ_BLOCK)
+        while f.readinto(buffer):
+            pass
+
+
+COMMANDS = {"evict": evict, "warm": warm, "status": lambda path: None}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in COMMANDS:
+        raise SystemExit(__doc__.strip())
+    for path in sys.argv[2:]:
+        COMMANDS[sys.argv[1]](path)
+        print(f"{path} {cached_fraction(path):.4f}")
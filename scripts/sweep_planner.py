@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+"""
+Plans the experiment sweep as SLURM job arrays.
+
+The parameter space of 10_create_weights_zfp.sh, 11_create_weights_native.sh,
+15_evaluate_model_performance.sh, 16_evaluate_tensor_derivation.sh and
+17_evalute_model_runtime.sh is declared in SWEEP (TEST_SWEEP for "test"). Every
+stage is expanded into tasks. Tasks whose results in job_results are already
+accepted by the postprocessing parsers are dropped, and the remaining tasks of a
+stage and model become a single array job:
+
+    job_scripts/<model>/<category>/array_<stage>.sbatch   # reads its task from the line SLURM_ARRAY_TASK_ID
+    job_scripts/<model>/<category>/array_<stage>.tasks    # one tab separated task per line
+
+Every task still logs to job_logs/<model>/<category>/<result name>.out and writes
+the same result files as the per-configuration scripts.
+
+    python sweep_planner.py                         # all stages but tensor_comparison_numpy, writes the arrays
+    python sweep_planner.py zfp native --submit     # selected stages, submits with sbatch
+    python sweep_planner.py --test                  # the "test" parameter space
+
+tensor_comparison and model_performance work on the F16 weights that exist when
+the planner runs, as their shell scripts do. Rerun the planner once the
+quantization arrays have finished. tensor_comparison_numpy writes the same
+results with postprocessing/gguf_compare.py instead of llama-compare-tensors,
+it is only planned when named and never together with tensor_comparison. It
+runs with the interpreter of --python (default: PYTHON), which needs numpy.
+"""
+import argparse
+import string
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# The postprocessing parsers decide whether a result is complete
+sys.path.insert(0, str(ROOT_DIR / "postprocessing"))
+from model_parser import parse_stem  # noqa: E402
+
+SOURCE_TYPE = "F16"
+ACCOUNT = "p_darwin"
+
+# find -size +14G in the shell scripts, smaller F16 files are still being written
+MIN_F16_SIZE = 14 * 1024 ** 3
+
+HELLASWAG_NTASK = 4000
+
+# Interpreter of the Python stages, after source_env.* the plain "python" may be missing or a Python 2
+PYTHON = "python3"
+
+# Approx. 154 Tokens, identical to 17_evalute_model_runtime.sh
+CLI_PROMPT = (
+    "How much wood would a woodchuck chuck if a woodchuck could chuck wood? This age-old tongue twister has "
+    "puzzled many, but let’s explore it from multiple angles. Scientifically, a woodchuck (or groundhog) doesn’t "
+    "actually chuck wood, but if it could, we might estimate its capabilities based on its burrowing behavior."
+    "             According to a study, a woodchuck moves roughly 700 pounds of dirt when digging a burrow. If we "
+    "equate this to wood, we might assume a woodchuck could chuck a similar amount. However, the physics of "
+    "woodchucking would depend on its bite force, jaw strength, and endurance. Could it sustain wood-chucking for "
+    "long durations, or would it tire quickly?"
+)
+
+SWEEP = {
+    "models": ["3.1-8B", "3.1-70B"],
+    "imatrices": ["wi_imat", "no_imat"],
+    "zfp": {
+        "modes": ["rate", "prec", "accu"],
+        "dims": [4, 3, 2, 1],
+        # Strings, they end up verbatim in the result names
+        "parameters": {
+            "rate": ["3.00", "3.50", "4.00", "4.50", "5.00", "6.00", "8.00"],
+            "prec": ["05", "06", "07", "08", "09", "10"],  # 08 ~ 6pbw
+            "accu": ["0.01", "0.05", "0.10", "0.12", "0.13", "0.14"],  # 0.001 ~ 10bpw # 0.14 ~ 3bpw
+        },
+    },
+    "native": {
+        "modes": ["Q4_0", "Q4_1", "Q5_0", "Q5_1", "IQ2_M", "TQ1_0", "TQ2_0", "Q2_K", "Q2_K_S", "IQ3_XXS", "IQ3_S",
+                  "IQ3_M", "IQ3_XS", "Q3_K_S", "Q3_K_M", "Q3_K_L", "IQ4_NL", "IQ4_XS", "Q4_K_S", "Q4_K_M", "Q5_K_S",
+                  "Q5_K_M", "Q6_K", "Q8_0", "F16", "BF16", "IQ1_S", "IQ1_M", "IQ2_S", "IQ2_XXS", "IQ2_XS"],
+    },
+    "runtime": {
+        "models": ["3.1-8B"],
+        "cores": [1, 24, 48, 72, 96],
+        "iterations": 5,
+        "weights": ["ZFPrate4.00:4.00_2_NOI", "ZFPrate4.00:4.00_3_NOI", "ZFPrate4.00:4.00_4_NOI",
+                    "ZFPrate6.00:6.00_2_NOI", "ZFPrate6.00:6.00_3_NOI", "ZFPrate6.00:6.00_4_NOI",
+                    "ZFPrate8.00:8.00_2_NOI", "ZFPrate8.00:8.00_3_NOI", "ZFPrate8.00:8.00_4_NOI",
+                    "Q4_0+NOI", "Q4_1+NOI", "Q4_K_M+NOI", "Q4_K_S+NOI", "Q6_K+NOI", "Q8_0+NOI"],
+    },
+}
+
+TEST_SWEEP = {
+    "models": ["3.1-8B"],
+    "imatrices": ["wi_imat", "no_imat"],
+    "zfp": {
+        "modes": ["rate"],
+        "dims": [3],
+        "parameters": {"rate": ["4.00", "6.00"]},
+    },
+    "native": {"modes": ["Q4_0"]},
+    "runtime": {"models": ["3.1-8B"], "cores": [96], "iterations": 5, "weights": ["Q8_0+NOI"]},
+}
+
+
+class ScriptTemplate(string.Template):
+    # "$" belongs to bash
+    delimiter = "@"
+
+
+HEADER = ScriptTemplate("""#!/bin/bash
+
+#SBATCH -N 1
+#SBATCH -n 1
+#SBATCH -c @{cpus}
+#SBATCH --mem=@{mem}
+#SBATCH -A @{account}
+#SBATCH --job-name=@{job_name}
+#SBATCH --output=@{log_dir}/array_%A_%a.out
+#SBATCH --error=@{log_dir}/array_%A_%a.out
+#SBATCH --time=@{time}
+#SBATCH --array=0-@{last_task}@{throttle}
+@{options}
+
+TASK=$(sed -n "$((SLURM_ARRAY_TASK_ID + 1))p" "@{task_file}")
+IFS=$'\\t' read -r @{fields} <<< "${TASK}"
+
+exec > "@{log_dir}/${RESULT_NAME}.out" 2>&1
+cat $0
+echo "Task ${SLURM_ARRAY_TASK_ID}: ${TASK}"
+
+module purge
+source @{root}/source_env.@{env}
+
+set -euo pipefail
+""")
+
+ZFP_BODY = ScriptTemplate("""
+MODEL_SOURCE_DIR="@{root}/llm_unmodified_weights/@{prefix}"
+INPUT_WEIGHTS="${MODEL_SOURCE_DIR}/@{prefix}-@{source_type}.gguf"
+OUTPUT_WEIGHTS="@{root}/llm_experiment_weights/@{prefix}/weights/${RESULT_NAME}.gguf"
+OUTPUT_WEIGHTS_F16="@{root}/llm_experiment_weights/@{prefix}/weights_F16/${RESULT_NAME_F16}.gguf"
+RESULT_FILE="@{result_dir}/${RESULT_NAME}.out"
+EXECUTABLE="@{root}/llama.cpp-cpu/bin/llama-quantize.${MODE}.${IMATRIX}.dim_${DIM}"
+
+if [[ "${IMATRIX}" == "wi_imat" ]]; then
+    IMATRIX_OPTION="--imatrix ${MODEL_SOURCE_DIR}/imatrix.dat"
+
+    export ZFP_RATE_MIN=${VALUE_MIN}
+    export ZFP_RATE_MAX=${VALUE_MAX}
+
+    export ZFP_PREC_MIN=${VALUE_MIN}
+    export ZFP_PREC_MAX=${VALUE_MAX}
+
+    export ZFP_TOL_MIN=${VALUE_MIN}
+    export ZFP_TOL_MAX=${VALUE_MAX}
+else
+    IMATRIX_OPTION=""
+
+    export ZFP_RATE=${VALUE_MIN}
+
+    export ZFP_PREC=${VALUE_MIN}
+
+    export ZFP_TOL=${VALUE_MAX}
+fi
+
+time srun "${EXECUTABLE}" \\
+    ${IMATRIX_OPTION} \\
+    "${INPUT_WEIGHTS}" \\
+    "${OUTPUT_WEIGHTS}" \\
+    ZFP \\
+    ${SLURM_CPUS_PER_TASK} \\
+    | tee >( grep "^ZFP_RESULT" > "${RESULT_FILE}")
+
+time srun "${EXECUTABLE}" \\
+    --allow-requantize \\
+    "${OUTPUT_WEIGHTS}" \\
+    "${OUTPUT_WEIGHTS_F16}" \\
+    "@{source_type}" \\
+    ${SLURM_CPUS_PER_TASK}
+""")
+
+NATIVE_BODY = ScriptTemplate("""
+MODEL_SOURCE_DIR="@{root}/llm_unmodified_weights/@{prefix}"
+INPUT_WEIGHTS="${MODEL_SOURCE_DIR}/@{prefix}-@{source_type}.gguf"
+OUTPUT_WEIGHTS="@{root}/llm_experiment_weights/@{prefix}/weights/${RESULT_NAME}.gguf"
+OUTPUT_WEIGHTS_F16="@{root}/llm_experiment_weights/@{prefix}/weights_F16/${RESULT_NAME_F16}.gguf"
+RESULT_FILE="@{result_dir}/${RESULT_NAME}.out"
+EXECUTABLE="@{root}/llama.cpp-cpu/bin/llama-quantize"
+
+if [[ "${IMATRIX}" == "wi_imat" ]]; then
+    IMATRIX_OPTION="--imatrix ${MODEL_SOURCE_DIR}/imatrix.dat"
+else
+    IMATRIX_OPTION=""
+fi
+
+time srun "${EXECUTABLE}" \\
+    ${IMATRIX_OPTION} \\
+    "${INPUT_WEIGHTS}" \\
+    "${OUTPUT_WEIGHTS}" \\
+    ${MODE} \\
+    ${SLURM_CPUS_PER_TASK} \\
+    | tee >( grep "^QUANT_RESULT" > "${RESULT_FILE}")
+
+time srun "${EXECUTABLE}" \\
+    --allow-requantize \\
+    "${OUTPUT_WEIGHTS}" \\
+    "${OUTPUT_WEIGHTS_F16}" \\
+    "@{source_type}" \\
+    ${SLURM_CPUS_PER_TASK}
+""")
+
+TENSOR_COMPARISON_BODY = ScriptTemplate("""
+srun "@{root}/llama.cpp-cpu/bin/llama-compare-tensors" \\
+     --histogram --per-layer-stats \\
+     --model-a "@{root}/llm_unmodified_weights/@{prefix}/@{prefix}-@{source_type}.gguf" \\
+     --model-b "@{root}/llm_experiment_weights/@{prefix}/weights_F16/${RESULT_NAME}.gguf" \\
+     2>&1 | tee "@{result_dir}/${RESULT_NAME}.out"
+""")
+
+# postprocessing/gguf_compare.py writes the same output on all cores of the task
+TENSOR_COMPARISON_NUMPY_BODY = ScriptTemplate("""
+srun --cpu-bind=cores -c ${SLURM_CPUS_PER_TASK} -- \\
+     "@{python}" "@{root}/postprocessing/gguf_compare.py" \\
+     "@{root}/llm_unmodified_weights/@{prefix}/@{prefix}-@{source_type}.gguf" \\
+     "@{root}/llm_experiment_weights/@{prefix}/weights_F16/${RESULT_NAME}.gguf" \\
+     "@{result_dir}/${RESULT_NAME}.out" \\
+     ${SLURM_CPUS_PER_TASK}
+""")
+
+MODEL_PERFORMANCE_BODY = ScriptTemplate("""
+INPUT_WEIGHTS="@{root}/llm_experiment_weights/@{prefix}/weights_F16/${RESULT_NAME}.gguf"
+RESULT_FILE="@{result_dir}/${RESULT_NAME}"
+SETTINGS="-ngl 300 -s 1 -t @{cpus} --ctx-size 4096 "
+
+srun "@{root}/llama.cpp-gpu/bin/llama-cli" \\
+     ${SETTINGS} \\
+     -m "${INPUT_WEIGHTS}" \\
+     --repeat_penalty 1.0 \\
+     --prompt "How much wood would a woodchuck chuck if a woodchuck could chuck wood?" \\
+     --predict 200 \\
+     2>&1 | tee "${RESULT_FILE}.cli"
+
+srun "@{root}/llama.cpp-gpu/bin/llama-perplexity" \\
+     ${SETTINGS} \\
+     --hellaswag \\
+     -f "@{root}/datasets/hellaswag_val_full.txt" \\
+     --hellaswag-tasks @{hellaswag_ntask} \\
+     -m "${INPUT_WEIGHTS}" \\
+     2>&1 | tee "${RESULT_FILE}.hellaswag"
+
+srun "@{root}/llama.cpp-gpu/bin/llama-perplexity" \\
+     ${SETTINGS} \\
+     --perplexity \\
+     --file "@{root}/datasets/wiki.train.raw" \\
+     -m "${INPUT_WEIGHTS}" \\
+     2>&1 | tee "${RESULT_FILE}.ppl"
+""")
+
+RUNTIME_BODY = ScriptTemplate("""
+CLI_PROMPT="@{prompt}"
+if [[ ${PROMPT_CHARS} -gt 0 ]]; then
+    CLI_PROMPT=${CLI_PROMPT:0:${PROMPT_CHARS}}
+fi
+
+GGUF_FILE="@{root}/llm_experiment_weights/@{prefix}/weights/${WEIGHTS}.gguf"
+RESULT_FILE="@{result_dir}/${RESULT_NAME}.out"
+
+export OMP_NUM_THREADS=${NCPUS}
+
+temp_file=$(mktemp) || { echo "Failed to create temp file" >&2; exit 1; }
+
+NODE_NAME=$(srun hostname)
+echo "Node: ${NODE_NAME}"
+
+time srun --cpu-bind=cores -c @{cpus} -- \\
+    "@{root}/llama.cpp-cpu/bin/${EXECUTABLE_CLI}" \\
+    -s 1 \\
+    -t ${NCPUS} \\
+    --ctx-size 4096 \\
+    -m "${GGUF_FILE}" \\
+    --repeat_penalty 1.0 \\
+    --prompt "${CLI_PROMPT}" \\
+    --predict ${NPREDICT} \\
+    --ignore-eos \\
+    --no-mmap \\
+    2>&1 | tee ${temp_file}
+
+sync ${temp_file}
+
+# Fingerprint of the binary, so runtimes of different llama.cpp builds can be told apart
+BUILD=$(sha256sum "@{root}/llama.cpp-cpu/bin/${EXECUTABLE_CLI}" | cut -c1-12)
+echo "@{prefix}-${WEIGHTS},ncores,${NCPUS},iteration,${ITERATION},node,${NODE_NAME},build,${BUILD}" > "${RESULT_FILE}"
+# The full log, load time, buffer sizes and all llama_perf lines are parsed from it
+cat "${temp_file}" >> "${RESULT_FILE}"
+
+rm "${temp_file}" && echo "Temporary file deleted."
+""")
+
+
+def imatrix_tag(imatrix):
+    return "WII" if imatrix == "wi_imat" else "NOI"
+
+
+def zfp_values(mode, imatrix, parameter):
+    """(VALUE_MIN, VALUE_MAX) as in 10_create_weights_zfp.sh, None for skipped combinations."""
+    if imatrix == "no_imat":
+        return parameter, parameter
+    if mode == "rate":
+        return f"{float(parameter):.2f}", "8.00"
+    # Do not create importance matrix values other than RATE
+    return None
+
+
+def checked_name(name):
+    # Names the parsers cannot read would never count as completed
+    parse_stem(name)
+    return name
+
+
+def expand_zfp(sweep, model):
+    prefix = f"Meta-Llama-{model}"
+    tasks = []
+    for mode in sweep["zfp"]["modes"]:
+        for imatrix in sweep["imatrices"]:
+            for dim in sweep["zfp"]["dims"]:
+                for parameter in sweep["zfp"]["parameters"][mode]:
+                    values = zfp_values(mode, imatrix, parameter)
+                    if values is None:
+                        continue
+                    suffix = f"ZFP{mode}{values[0]}:{values[1]}_{dim}+{imatrix_tag(imatrix)}"
+                    tasks.append({
+                        "RESULT_NAME": checked_name(f"{prefix}-{suffix}"),
+                        "RESULT_NAME_F16": checked_name(f"{prefix}-{SOURCE_TYPE}@{suffix}"),
+                        "MODE": mode,
+                        "IMATRIX": imatrix,
+                        "DIM": str(dim),
+                        "VALUE_MIN": values[0],
+                        "VALUE_MAX": values[1],
+                    })
+    return tasks
+
+
+def expand_native(sweep, model):
+    prefix = f"Meta-Llama-{model}"
+    tasks = []
+    for mode in sweep["native"]["modes"]:
+        for imatrix in sweep["imatrices"]:
+            suffix = f"{mode}+{imatrix_tag(imatrix)}"
+            tasks.append({
+                "RESULT_NAME": checked_name(f"{prefix}-{suffix}"),
+                "RESULT_NAME_F16": checked_name(f"{prefix}-{SOURCE_TYPE}@{suffix}"),
+                "MODE": mode,
+                "IMATRIX": imatrix,
+            })
+    return tasks
+
+
+def expand_f16_weights(sweep, model):
+    """Every complete F16 weight file of model, like the find in 15_ and 16_."""
+    weights_dir = ROOT_DIR / "llm_experiment_weights" / f"Meta-Llama-{model}" / "weights_F16"
+    return [{"RESULT_NAME": path.stem}
+            for path in sorted(weights_dir.glob("*.gguf")) if path.stat().st_size > MIN_F16_SIZE]
+
+
+def runtime_executable(prefix, weights):
+    """The llama-cli build matching the ZFP mode, importance matrix and dim of weights."""
+    setup = parse_stem(f"{prefix}-{weights}")
+    if setup["dim"] is None:
+        return "llama-cli"
+    return f"llama-cli.{setup['quant_type']}.{'wi_imat' if setup['imat'] else 'no_imat'}.dim_{setup['dim']}"
+
+
+def expand_runtime(sweep, model):
+    if model not in sweep["runtime"]["models"]:
+        return []
+    prefix = f"Meta-Llama-{model}"
+    tasks = []
+    for weights in sweep["runtime"]["weights"]:
+        executable = runtime_executable(prefix, weights)
+        for ncpus in sweep["runtime"]["cores"]:
+            # ZFP is too slow on one core for the full prompt
+            short = ncpus == 1 and weights.startswith("ZFP")
+            for i in range(1, sweep["runtime"]["iterations"] + 1):
+                tasks.append({
+                    "RESULT_NAME": f"{prefix}-{weights}_n{ncpus}_i{i}",
+                    "WEIGHTS": weights,
+                    "NCPUS": str(ncpus),
+                    "ITERATION": str(i),
+                    "EXECUTABLE_CLI": executable,
+                    "NPREDICT": "3" if short else "200",
+                    "PROMPT_CHARS": "13" if short else "0",
+                })
+    return tasks
+
+
+def quantization_complete(result_dir, task):
+    from merge_all_data import parse_file_quantization
+    parse_file_quantization(result_dir / f"{task['RESULT_NAME']}.out")
+    return True
+
+
+def tensor_comparison_complete(result_dir, task):
+    from merge_all_data import parse_file_tf_difference
+    return len(parse_file_tf_difference(result_dir / f"{task['RESULT_NAME']}.out")["layer"]) > 0
+
+
+def model_performance_complete(result_dir, task):
+    from perplexity_log import HellaswagTracker, PerplexityTracker
+    stem = result_dir / task["RESULT_NAME"]
+    ppl = PerplexityTracker(f"{stem}.ppl")
+    ppl.update()
+    hellaswag = HellaswagTracker(f"{stem}.hellaswag", n_tasks=HELLASWAG_NTASK)
+    hellaswag.update()
+    return ppl.final is not None and hellaswag.final is not None
+
+
+def runtime_complete(result_dir, task):
+    from create_runtime_csv import parse_info
+    with open(result_dir / f"{task['RESULT_NAME']}.out") as f:
+        return parse_info(f.read()).get("eval_time") is not None
+
+
+def is_complete(check, result_dir, task):
+    try:
+        return check(result_dir, task)
+    except (OSError, ValueError, IndexError, KeyError, TypeError):
+        return False
+
+
+def model_resources(resources, model):
+    """Resources of a stage, with the "70B" overrides applied for 70B models."""
+    return {**resources, **(resources.get("70B", {}) if "70B" in model else {})}
+
+
+STAGES = {
+    "zfp": {
+        "category": "quantization",
+        "expand": expand_zfp,
+        "complete": quantization_complete,
+        "body": ZFP_BODY,
+        "resources": {"cpus": 1, "mem": "10G", "time": "05:00:00", "env": "cpp_cpu",
+                      "options": ["--hint=multithread"]},
+    },
+    "native": {
+        "category": "quantization",
+        "expand": expand_native,
+        "complete": quantization_complete,
+        "body": NATIVE_BODY,
+        "resources": {"cpus": 8, "mem": "40G", "time": "05:00:00", "env": "cpp_cpu",
+                      "options": ["--hint=multithread"]},
+    },
+    "tensor_comparison": {
+        "category": "tensor_comparison",
+        "expand": expand_f16_weights,
+        "complete": tensor_comparison_complete,
+        "body": TENSOR_COMPARISON_BODY,
+        "resources": {"cpus": 1, "mem": "20G", "time": "12:00:00", "env": "cpp_cpu",
+                      "options": ["--hint=nomultithread"], "70B": {"mem": "30G"}},
+    },
+    "tensor_comparison_numpy": {
+        "category": "tensor_comparison",
+        "expand": expand_f16_weights,
+        "complete": tensor_comparison_complete,
+        "body": TENSOR_COMPARISON_NUMPY_BODY,
+        "resources": {"cpus": 32, "mem": "20G", "time": "01:00:00", "env": "cpp_cpu",
+                      "options": ["--hint=nomultithread"]},
+    },
+    "model_performance": {
+        "category": "model_performance",
+        "expand": expand_f16_weights,
+        "complete": model_performance_complete,
+        "body": MODEL_PERFORMANCE_BODY,
+        "resources": {"cpus": 8, "mem": "185G", "time": "08:00:00", "env": "cpp_gpu",
+                      "options": ["--hint=nomultithread", "--gres=gpu:1"],
+                      "70B": {"options": ["--hint=nomultithread", "--gres=gpu:2"]}},
+    },
+    "runtime_performance": {
+        "category": "runtime_performance",
+        "expand": expand_runtime,
+        "complete": runtime_complete,
+        "body": RUNTIME_BODY,
+        "resources": {"cpus": 104, "mem": "200G", "time": "04:00:00", "env": "cpp_cpu",
+                      "options": ["--hint=nomultithread", "--exclusive", "--constraint=no_monitoring",
+                                  "--cpu-freq=2000000"]},
+    },
+}
+
+# Alternative stages write the results of another stage, they are only planned on request
+# and never together with the stage they replace
+ALTERNATIVE_STAGES = {"tensor_comparison_numpy": "tensor_comparison"}
+DEFAULT_STAGES = [stage for stage in STAGES if stage not in ALTERNATIVE_STAGES]
+
+
+def plan_stage(stage, sweep, model):
+    """(pending tasks, number of completed tasks) of stage for model."""
+    definition = STAGES[stage]
+    result_dir = ROOT_DIR / "job_results" / f"Meta-Llama-{model}" / definition["category"]
+    tasks = definition["expand"](sweep, model)
+    pending = [task for task in tasks if not is_complete(definition["complete"], result_dir, task)]
+    return pending, len(tasks) - len(pending)
+
+
+def write_array(stage, model, tasks, max_parallel=None, python=PYTHON) -> Path:
+    """Writes the task list and array script of stage for model and returns the script."""
+    definition = STAGES[stage]
+    category = definition["category"]
+    prefix = f"Meta-Llama-{model}"
+    resources = model_resources(definition["resources"], model)
+
+    for kind in ["job_scripts", "job_logs", "job_results"]:
+        (ROOT_DIR / kind / prefix / category).mkdir(parents=True, exist_ok=True)
+
+    script = ROOT_DIR / "job_scripts" / prefix / category / f"array_{stage}.sbatch"
+    task_file = script.with_suffix(".tasks")
+    fields = list(tasks[0])
+    with open(task_file, "w") as f:
+        for task in tasks:
+            f.write("\t".join(task[field] for field in fields) + "\n")
+
+    values = {
+        **resources,
+        "root": ROOT_DIR,
+        "prefix": prefix,
+        "source_type": SOURCE_TYPE,
+        "account": ACCOUNT,
+        "job_name": f"{prefix}-{stage}",
+        "log_dir": ROOT_DIR / "job_logs" / prefix / category,
+        "result_dir": ROOT_DIR / "job_results" / prefix / category,
+        "task_file": task_file,
+        "last_task": len(tasks) - 1,
+        "throttle": f"%{max_parallel}" if max_parallel else "",
+        "options": "\n".join(f"#SBATCH {option}" for option in resources["options"]),
+        "fields": " ".join(fields),
+        "hellaswag_ntask": HELLASWAG_NTASK,
+        "prompt": CLI_PROMPT,
+        "python": python,
+    }
+    script.write_text(HEADER.substitute(values) + definition["body"].substitute(values))
+    return script
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("stages", nargs="*",
+                        help=f"Stages to plan, one of {', '.join(STAGES)}, default: {', '.join(DEFAULT_STAGES)}")
+    parser.add_argument("--test", action="store_true", help="Plan the small test parameter space")
+    parser.add_argument("--submit", action="store_true", help="Submit the arrays with sbatch")
+    parser.add_argument("--max-parallel", type=int, default=None, help="Limit of concurrently running array tasks")
+    parser.add_argument("--python", default=PYTHON, help=f"Interpreter of the Python stages, default: {PYTHON}")
+    args = parser.parse_args(argv)
+    unknown = [stage for stage in args.stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+    for alternative, stage in ALTERNATIVE_STAGES.items():
+        if alternative in args.stages and stage in args.stages:
+            parser.error(f"{alternative} and {stage} write the same results, plan only one of them")
+
+    sweep = TEST_SWEEP if args.test else SWEEP
+    for stage in args.stages or DEFAULT_STAGES:
+        for model in sweep["models"]:
+            pending, completed = plan_stage(stage, sweep, model)
+            print(f"{stage} Meta-Llama-{model}: {len(pending)} pending, {completed} completed")
+            if not pending:
+                continue
+
+            script = write_array(stage, model, pending, args.max_parallel, args.python)
+            if args.submit:
+                subprocess.run(["sbatch", str(script)], check=True)
+            else:
+                print(f"    sbatch {script}")
+
+
+if __name__ == "__main__":
+    main()